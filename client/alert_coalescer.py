@@ -0,0 +1,231 @@
+# alert_coalescer.py
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from alert_store import MonitoringAlert
+
+import _shared_path  # noqa: F401
+from shared.lexicon import LEXICON, matching_messages
+from shared.text_normalizer import canonical
+
+logger = logging.getLogger(__name__)
+
+# Categories the analyzer is asked to name in its explanation
+CATEGORY_PATTERNS = [
+    ("Self Harm", re.compile(r"self[\s-]*harm", re.IGNORECASE)),
+    ("Sexual", re.compile(r"\bsexual", re.IGNORECASE)),
+    ("Harassment", re.compile(r"\bharass", re.IGNORECASE)),
+    ("Bullying", re.compile(r"\bbull(y|ied|ying)", re.IGNORECASE)),
+    ("Profanity", re.compile(r"\bprofan", re.IGNORECASE)),
+    ("Teasing", re.compile(r"\bteas", re.IGNORECASE)),
+    ("Inappropriate", re.compile(r"\binappropriate", re.IGNORECASE)),
+]
+
+SEVERITY = {"POSITIVE": 0, "CAUTIONARY": 1, "NEGATIVE": 2}
+
+
+def alert_category(alert: MonitoringAlert) -> str:
+    """Categories named in the explanation, or the sentiment when there are none"""
+    found = [name for name, pattern in CATEGORY_PATTERNS if pattern.search(alert.explanation)]
+    return "+".join(found) if found else alert.sentiment.upper()
+
+
+def alert_severity(alert: MonitoringAlert) -> int:
+    return SEVERITY.get(alert.sentiment.upper(), 0) * 2 + int(alert.alert_needed)
+
+
+def triggering_messages(alert: MonitoringAlert, category: str) -> Tuple[List[str], bool]:
+    """Messages of the window that triggered the alert, and whether they were identified.
+
+    The server does not say which messages it objected to, so the lexicon
+    picks the ones that match the alert's categories (any category when the
+    alert names none). When nothing matches, the whole window is returned.
+    """
+    texts = [chat.get("message", "") for chat in alert.chats]
+    names = set(category.split("+")) & set(LEXICON)
+    hits = matching_messages(texts, names or None)
+    if hits:
+        return [texts[i] for i in hits], True
+    return texts or [alert.explanation], False
+
+
+def message_digests(texts: List[str]) -> Set[str]:
+    """Digests of the canonical form of the messages"""
+    return {hashlib.blake2b(canonical(text).encode(), digest_size=8).hexdigest()
+            for text in texts}
+
+
+@dataclass
+class AlertGroup:
+    fingerprint: str
+    child_name: str
+    category: str
+    severity: int
+    first_seen: float
+    last_seen: float
+    latest: MonitoringAlert
+    digests: Set[str] = field(default_factory=set)  # Triggering messages of the first alert
+    count: int = 1  # Alerts merged into the group's current row
+    reported: int = 1  # Count last sent on
+
+
+class AlertCoalescer:
+    """Merges repeated alerts before they reach the alert queue.
+
+    Overlapping windows re-analyze the same messages, so one worrying
+    message can produce an alert per window. An alert for the same child
+    and category within `window` seconds is a repeat when all of its
+    triggering messages were among the group's (or, when they could not be
+    identified, when its window shares a message with the group's). The
+    group's messages are those of its first alert and never grow, so new
+    offending messages always raise a new alert. The first alert of a
+    group is forwarded at once, repeats only raise a count,
+    and the merged alert is re-sent with its `repeat_count` at most every
+    `update_interval` seconds. The store and dashboard update the existing
+    row for that fingerprint instead of adding one. An alert more severe
+    than its group is always forwarded immediately.
+
+    `push` is an engine sink and runs on the engine's loop.
+    """
+
+    def __init__(self, forward: Callable[[MonitoringAlert], None],
+                 window: float = 120.0, update_interval: float = 5.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.forward = forward
+        self.window = window
+        self.update_interval = update_interval
+        self.clock = clock
+
+        self.groups: Dict[str, AlertGroup] = {}
+        # (child, category, message digest) -> fingerprints of the groups holding it
+        self.index: Dict[Tuple[str, str, str], Set[str]] = {}
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        self.last_prune = clock()
+        self.stats = {"received": 0, "forwarded": 0, "merged": 0, "escalated": 0}
+
+    def push(self, alert: MonitoringAlert):
+        now = self.clock()
+        self.stats["received"] += 1
+        if now - self.last_prune > self.window:
+            self._prune()  # Groups that never repeated are dropped here
+        category = alert_category(alert)
+        texts, identified = triggering_messages(alert, category)
+        digests = message_digests(texts)
+        group = self._find_group(alert.child_name, category, digests, identified, now)
+
+        if group is None:
+            fingerprint = hashlib.blake2b(
+                f"{alert.child_name}|{category}|{'|'.join(sorted(digests))}".encode(),
+                digest_size=8).hexdigest()
+            self._drop(fingerprint)  # An expired group with the same messages
+            group = AlertGroup(fingerprint, alert.child_name, category,
+                               alert_severity(alert), now, now, alert, digests)
+            self.groups[fingerprint] = group
+            self._index(group)
+            self._send(group, alert, 1)
+            return
+
+        group.last_seen = now
+        severity = alert_severity(alert)
+        if severity > group.severity:
+            # Escalations start a new row right away; earlier repeats are reported first
+            self._report(group)
+            group.severity = severity
+            group.count = 1
+            group.latest = alert
+            self.stats["escalated"] += 1
+            self._send(group, alert, 1)
+            return
+
+        group.count += 1
+        group.latest = alert
+        self.stats["merged"] += 1
+        self._schedule_flush()
+
+    def flush(self, force: bool = False):
+        """Send pending counts and forget groups that have gone quiet"""
+        self.flush_handle = None
+        self._prune(force)
+        if any(group.count > group.reported for group in self.groups.values()):
+            self._schedule_flush()
+
+    def _prune(self, force: bool = False):
+        now = self.clock()
+        self.last_prune = now
+        for fingerprint, group in list(self.groups.items()):
+            self._report(group)
+            if force or now - group.last_seen > self.window:
+                self._drop(fingerprint)
+
+    def _find_group(self, child_name: str, category: str, digests: Set[str],
+                    identified: bool, now: float) -> Optional[AlertGroup]:
+        candidates = set()
+        for digest in digests:
+            candidates |= self.index.get((child_name, category, digest), set())
+        for fingerprint in sorted(candidates):
+            group = self.groups.get(fingerprint)
+            if group is None:
+                continue
+            if now - group.last_seen > self.window:
+                self._report(group)
+                self._drop(fingerprint)
+                continue
+            # Candidates share a message; identified triggers must all be old ones
+            if not identified or digests <= group.digests:
+                return group
+        return None
+
+    def _index(self, group: AlertGroup):
+        for digest in group.digests:
+            self.index.setdefault((group.child_name, group.category, digest),
+                                  set()).add(group.fingerprint)
+
+    def _drop(self, fingerprint: str):
+        group = self.groups.pop(fingerprint, None)
+        if group:
+            for digest in group.digests:
+                key = (group.child_name, group.category, digest)
+                fingerprints = self.index.get(key)
+                if fingerprints is not None:
+                    fingerprints.discard(fingerprint)
+                    if not fingerprints:
+                        del self.index[key]
+
+    def _report(self, group: AlertGroup):
+        if group.count > group.reported:
+            self._send(group, group.latest, group.count)
+
+    def _send(self, group: AlertGroup, alert: MonitoringAlert, count: int):
+        group.reported = count
+        self.stats["forwarded"] += 1
+        self.forward(replace(alert, fingerprint=group.fingerprint, repeat_count=count))
+
+    def _schedule_flush(self):
+        if self.flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Without a loop the caller flushes explicitly
+        self.flush_handle = loop.call_later(self.update_interval, self.flush)
+
+    def reset(self):
+        """Forget all groups without reporting them"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        self.groups.clear()
+        self.index.clear()
+
+    def close(self):
+        """Send every pending count; call before shutting down"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        self.flush(force=True)
+        logger.info(f"AlertCoalescer closed: {self.stats}")
@@ -0,0 +1,438 @@
+# alert_store.py
+import glob
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from paths import logs_path
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MonitoringAlert:
+    timestamp: str
+    child_name: str
+    sentiment: str
+    explanation: str
+    alert_needed: bool
+    message_range: str = ""
+    created_at: float = field(default_factory=time.time)
+    alert_id: Optional[int] = None
+    chats: List[Dict[str, str]] = field(default_factory=list)  # The analyzed window
+    trace_ids: List[str] = field(default_factory=list)  # Not persisted
+    fingerprint: str = ""  # Shared by alerts merged into one row
+    repeat_count: int = 1
+
+    def to_dict(self):
+        return {
+            "timestamp": self.timestamp,
+            "child_name": self.child_name,
+            "sentiment": self.sentiment,
+            "explanation": self.explanation,
+            "alert_needed": self.alert_needed,
+            "message_range": self.message_range,
+            "created_at": self.created_at,
+            "chats": self.chats,
+            "fingerprint": self.fingerprint,
+            "repeat_count": self.repeat_count
+        }
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    day TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    child_name TEXT NOT NULL,
+    sentiment TEXT NOT NULL,
+    alert_needed INTEGER NOT NULL,
+    explanation TEXT NOT NULL,
+    message_range TEXT NOT NULL DEFAULT '',
+    chats TEXT NOT NULL DEFAULT '[]',
+    fingerprint TEXT NOT NULL DEFAULT '',
+    repeat_count INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_child ON alerts(child_name, created_at);
+CREATE INDEX IF NOT EXISTS idx_alerts_created ON alerts(created_at);
+CREATE INDEX IF NOT EXISTS idx_alerts_sentiment ON alerts(sentiment, created_at);
+CREATE INDEX IF NOT EXISTS idx_alerts_day ON alerts(day);
+CREATE TABLE IF NOT EXISTS child_status (
+    child_name TEXT PRIMARY KEY,
+    sentiment TEXT NOT NULL,
+    alert_needed INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS legacy_imports (
+    source TEXT PRIMARY KEY,
+    alerts INTEGER NOT NULL,
+    imported_at REAL NOT NULL
+);
+"""
+
+REBUILD_STATUS = """
+DELETE FROM child_status;
+INSERT INTO child_status (child_name, sentiment, alert_needed, updated_at)
+SELECT a.child_name, a.sentiment, a.alert_needed, a.created_at
+FROM alerts a
+JOIN (SELECT child_name, MAX(id) AS id FROM alerts GROUP BY child_name) latest
+ON a.id = latest.id;
+"""
+
+_COLUMNS = ("id, created_at, timestamp, child_name, sentiment, "
+            "alert_needed, explanation, message_range, chats, fingerprint, repeat_count")
+
+# Columns added after the first release: name -> definition
+_MIGRATIONS = {
+    "chats": "TEXT NOT NULL DEFAULT '[]'",
+    "fingerprint": "TEXT NOT NULL DEFAULT ''",
+    "repeat_count": "INTEGER NOT NULL DEFAULT 1",
+}
+
+# Indexes on migrated columns, created once the columns exist
+_MIGRATED_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_alerts_fingerprint ON alerts(fingerprint) WHERE fingerprint != '';
+"""
+
+
+def _row_to_alert(row) -> MonitoringAlert:
+    return MonitoringAlert(
+        alert_id=row[0],
+        created_at=row[1],
+        timestamp=row[2],
+        child_name=row[3],
+        sentiment=row[4],
+        alert_needed=bool(row[5]),
+        explanation=row[6],
+        message_range=row[7],
+        chats=json.loads(row[8]) if row[8] else [],
+        fingerprint=row[9],
+        repeat_count=row[10]
+    )
+
+
+class AlertStore:
+    """Append-only alert log backed by SQLite in WAL mode.
+
+    Writes are handed to a background thread which drains everything that
+    is pending and commits it in one transaction (group commit), so the
+    caller never waits on disk and each alert costs a single indexed
+    insert. Reads use their own connection and never block the writer.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        db_path = db_path or logs_path("alerts.db")
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        writer = self._connect()
+        writer.executescript(SCHEMA)
+        existing = {row[1] for row in writer.execute("PRAGMA table_info(alerts)")}
+        for column, definition in _MIGRATIONS.items():
+            if column not in existing:
+                writer.execute(f"ALTER TABLE alerts ADD COLUMN {column} {definition}")
+        writer.executescript(_MIGRATED_INDEXES)
+        # Stores created before the status summary existed need it filled once
+        if (writer.execute("SELECT COUNT(*) FROM child_status").fetchone()[0] == 0
+                and writer.execute("SELECT 1 FROM alerts LIMIT 1").fetchone()):
+            writer.executescript(REBUILD_STATUS)
+        writer.commit()
+
+        self.read_conn = self._connect()
+        self.read_lock = threading.Lock()
+
+        self.pending = queue.Queue()
+        self.closed = False
+        self.writer_thread = threading.Thread(
+            target=self._writer_loop, args=(writer,), daemon=True)
+        self.writer_thread.start()
+        logger.info(f"AlertStore opened at {db_path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    # Writing
+
+    def append(self, alert: MonitoringAlert):
+        """Queue an alert for durable storage"""
+        self.pending.put(("insert", alert))
+
+    def append_many(self, alerts: List[MonitoringAlert]):
+        """Queue several alerts; they are committed in the same transaction, but an
+        alert that cannot be written is skipped without losing the others"""
+        self.pending.put(("insert_many", list(alerts)))
+
+    def clear_day(self, day: Optional[str] = None):
+        """Remove all alerts stored for `day` (YYYYMMDD, default today)"""
+        self.pending.put(("clear_day", day or datetime.now().strftime("%Y%m%d")))
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything queued so far has been committed"""
+        if self.closed:
+            return True
+        done = threading.Event()
+        self.pending.put(("barrier", done))
+        return done.wait(timeout)
+
+    def _writer_loop(self, conn: sqlite3.Connection):
+        running = True
+        while running:
+            ops = [self.pending.get()]
+            while True:
+                try:
+                    ops.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Control ops are taken out first so a failed write cannot hide them
+            barriers = [arg for op, arg in ops if op == "barrier"]
+            running = not any(op == "stop" for op, _ in ops)
+            writes = []
+            for op, arg in ops:
+                if op == "insert_many":
+                    writes.extend(("insert", alert) for alert in arg)
+                elif op in ("insert", "clear_day", "import_legacy"):
+                    writes.append((op, arg))
+            try:
+                with conn:
+                    conn.execute("BEGIN")
+                    for op, arg in writes:
+                        # One savepoint per write: a bad row is dropped, not the batch
+                        conn.execute("SAVEPOINT write")
+                        try:
+                            self._write(conn, op, arg)
+                        except Exception as e:
+                            conn.execute("ROLLBACK TO write")
+                            if op == "insert":
+                                arg.alert_id = None
+                            logger.error(f"AlertStore {op} failed: {e}")
+                        conn.execute("RELEASE write")
+            except Exception as e:
+                logger.error(f"AlertStore write failed for {len(writes)} operations: {e}")
+            finally:
+                for barrier in barriers:
+                    barrier.set()
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, op: str, arg):
+        if op == "insert":
+            self._insert(conn, arg)
+        elif op == "clear_day":
+            conn.execute("DELETE FROM alerts WHERE day = ?", (arg,))
+            for statement in REBUILD_STATUS.strip().split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+        elif op == "import_legacy":
+            # The file's alerts and its marker commit together, so it is imported once
+            source, alerts = arg
+            if conn.execute("SELECT 1 FROM legacy_imports WHERE source = ?",
+                            (source,)).fetchone():
+                return
+            for alert in alerts:
+                self._insert(conn, alert)
+            conn.execute("INSERT INTO legacy_imports (source, alerts, imported_at) "
+                         "VALUES (?, ?, ?)", (source, len(alerts), time.time()))
+
+    def _insert(self, conn: sqlite3.Connection, alert: MonitoringAlert):
+        if alert.repeat_count > 1 and alert.fingerprint and self._merge(conn, alert):
+            return
+        cursor = conn.execute(
+            "INSERT INTO alerts (created_at, day, timestamp, child_name, sentiment, "
+            "alert_needed, explanation, message_range, chats, fingerprint, repeat_count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                alert.created_at,
+                datetime.fromtimestamp(alert.created_at).strftime("%Y%m%d"),
+                alert.timestamp,
+                alert.child_name,
+                alert.sentiment.upper(),
+                int(alert.alert_needed),
+                alert.explanation,
+                alert.message_range,
+                json.dumps(alert.chats),
+                alert.fingerprint,
+                alert.repeat_count
+            )
+        )
+        alert.alert_id = cursor.lastrowid
+        # Keep the per-child summary current so startup never scans history
+        conn.execute(
+            "INSERT INTO child_status (child_name, sentiment, alert_needed, updated_at) "
+            "VALUES (?, ?, ?, ?) ON CONFLICT(child_name) DO UPDATE SET "
+            "sentiment = excluded.sentiment, alert_needed = excluded.alert_needed, "
+            "updated_at = excluded.updated_at WHERE excluded.updated_at >= child_status.updated_at",
+            (alert.child_name, alert.sentiment.upper(), int(alert.alert_needed), alert.created_at)
+        )
+
+    def _merge(self, conn: sqlite3.Connection, alert: MonitoringAlert) -> bool:
+        """Update the newest row with the alert's fingerprint to its repeat count"""
+        row = conn.execute(
+            "SELECT MAX(id) FROM alerts WHERE fingerprint = ?", (alert.fingerprint,)
+        ).fetchone()
+        if row[0] is None:
+            return False
+        conn.execute(
+            "UPDATE alerts SET repeat_count = ?, timestamp = ?, explanation = ?, "
+            "message_range = ?, chats = ? WHERE id = ?",
+            (alert.repeat_count, alert.timestamp, alert.explanation,
+             alert.message_range, json.dumps(alert.chats), row[0])
+        )
+        alert.alert_id = row[0]
+        return True
+
+    # Reading
+
+    def query(self, child_name: Optional[str] = None, sentiment: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None,
+              before: Optional[Tuple[float, int]] = None, limit: Optional[int] = 100,
+              newest_first: bool = True) -> List[MonitoringAlert]:
+        """Return alerts matching the filters.
+
+        `before` is an exclusive (created_at, alert_id) cursor used for paging
+        backwards; the id keeps alerts with the same timestamp from being skipped.
+        """
+        return list(self.iter_alerts(child_name, sentiment, since, until,
+                                     before, limit, newest_first))
+
+    def iter_alerts(self, child_name: Optional[str] = None, sentiment: Optional[str] = None,
+                    since: Optional[float] = None, until: Optional[float] = None,
+                    before: Optional[Tuple[float, int]] = None, limit: Optional[int] = None,
+                    newest_first: bool = False) -> Iterator[MonitoringAlert]:
+        """Stream matching alerts without materializing the whole result"""
+        where, params = self._where(child_name, sentiment, since, until, before)
+        sql = f"SELECT {_COLUMNS} FROM alerts{where}"
+        order = "DESC" if newest_first else "ASC"
+        sql += f" ORDER BY created_at {order}, id {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        # A dedicated connection lets long scans run alongside UI reads
+        conn = self._connect()
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(500)
+                if not rows:
+                    break
+                for row in rows:
+                    yield _row_to_alert(row)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _where(child_name=None, sentiment=None, since=None, until=None, before=None):
+        clauses = []
+        params = []
+        if child_name:
+            clauses.append("child_name = ?")
+            params.append(child_name)
+        if sentiment:
+            clauses.append("sentiment = ?")
+            params.append(sentiment.upper())
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if before is not None:
+            clauses.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            params.extend([before[0], before[0], before[1]])
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return where, params
+
+    def key_of(self, alert_id: int) -> Optional[Tuple[float, int]]:
+        """The (created_at, id) paging key of a stored alert"""
+        with self.read_lock:
+            row = self.read_conn.execute(
+                "SELECT created_at, id FROM alerts WHERE id = ?", (alert_id,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def latest_status(self) -> Dict[str, Tuple[str, bool]]:
+        """Latest (sentiment, alert_needed) per child from the summary table"""
+        with self.read_lock:
+            rows = self.read_conn.execute(
+                "SELECT child_name, sentiment, alert_needed FROM child_status").fetchall()
+        return {row[0]: (row[1], bool(row[2])) for row in rows}
+
+    def count(self, child_name: Optional[str] = None, sentiment: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None) -> int:
+        where, params = self._where(child_name, sentiment, since, until)
+        with self.read_lock:
+            return self.read_conn.execute(
+                f"SELECT COUNT(*) FROM alerts{where}", params).fetchone()[0]
+
+    def bucket_counts(self, width: int, since: float) -> List[Tuple[str, str, int, int]]:
+        """(child, sentiment, bucket number, alerts) per `width`-second bucket since `since`,
+        counted by SQLite so the rows returned do not grow with the alerts"""
+        with self.read_lock:
+            return self.read_conn.execute(
+                "SELECT child_name, sentiment, CAST(created_at / ? AS INTEGER) AS bucket, "
+                "COUNT(*) FROM alerts WHERE created_at >= ? "
+                "GROUP BY child_name, sentiment, bucket", (width, since)).fetchall()
+
+    def import_legacy_json(self, logs_dir: str) -> int:
+        """One-time import of the old alerts_YYYYMMDD.json files.
+
+        Each file is written in one transaction together with a marker in
+        legacy_imports, and renamed to *.json.imported only once that has
+        been committed. A file that failed is kept and tried again on the
+        next start; one already committed is never imported twice.
+        """
+        imported = 0
+        for path in sorted(glob.glob(os.path.join(logs_dir, "alerts_*.json"))):
+            source = os.path.basename(path)
+            try:
+                if not self._legacy_imported(source):
+                    with open(path, 'r') as f:
+                        alerts = json.load(f)
+                    day = source[len("alerts_"):-len(".json")]
+                    batch = []
+                    for alert_data in alerts:
+                        alert_data = dict(alert_data)
+                        if "created_at" not in alert_data:
+                            alert_data["created_at"] = datetime.strptime(
+                                f"{day} {alert_data.get('timestamp', '00:00:00')}",
+                                "%Y%m%d %H:%M:%S"
+                            ).timestamp()
+                        batch.append(MonitoringAlert(**alert_data))
+                    self.pending.put(("import_legacy", (source, batch)))
+                    if not self.flush(timeout=60) or not self._legacy_imported(source):
+                        logger.error(f"Legacy alert file {path} was not imported; "
+                                     f"it is kept for the next start")
+                        continue
+                    imported += len(batch)
+                os.replace(path, path + ".imported")
+            except Exception as e:
+                logger.error(f"Could not import legacy alert file {path}: {e}")
+        if imported:
+            logger.info(f"Imported {imported} alerts from legacy JSON files")
+        return imported
+
+    def _legacy_imported(self, source: str) -> bool:
+        with self.read_lock:
+            return self.read_conn.execute(
+                "SELECT 1 FROM legacy_imports WHERE source = ?", (source,)).fetchone() is not None
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.pending.put(("stop", None))
+        self.writer_thread.join(timeout=5)
+        with self.read_lock:
+            self.read_conn.close()
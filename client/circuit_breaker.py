@@ -0,0 +1,101 @@
+# circuit_breaker.py
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of attempting a request while the circuit is open"""
+
+
+class CircuitBreaker:
+    """Fails fast while a dependency is down.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    requests are refused without being attempted. Once `reset_timeout`
+    seconds have passed a single probe is let through (half-open): success
+    closes the circuit, failure opens it again with the timeout doubled,
+    up to `max_reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 10.0,
+                 max_reset_timeout: float = 120.0,
+                 on_state_change: Optional[Callable[[str, str], None]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.on_state_change = on_state_change
+        self.clock = clock
+
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """Whether a request may be attempted now; a True in half-open state is the probe"""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        """Seconds until a request could be attempted (0 when it could now)"""
+        with self.lock:
+            if self.state == OPEN:
+                return max(0.0, self.opened_at + self.reset_timeout - self.clock())
+            if self.state == HALF_OPEN and self.probe_in_flight:
+                return self.base_reset_timeout
+            return 0.0
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.probe_in_flight = False
+            self.reset_timeout = self.base_reset_timeout
+            if self.state != CLOSED:
+                self._set_state(CLOSED)
+
+    def release_probe(self):
+        """Free the probe slot of a request that ended without an answer (e.g. cancelled)"""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self.probe_in_flight = False
+                self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+                self._open()
+            elif self.state == CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.opened_at = self.clock()
+        self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        previous, self.state = self.state, state
+        logger.warning(f"Circuit {previous} -> {state}"
+                       + (f" (retry in {self.reset_timeout:.0f}s)" if state == OPEN else ""))
+        if self.on_state_change:
+            try:
+                self.on_state_change(previous, state)
+            except Exception as e:
+                logger.error(f"Circuit state callback failed: {e}")
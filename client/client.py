@@ -1,63 +1,228 @@
 # client.py
-import httpx
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable
 from dataclasses import dataclass
-from datetime import datetime
 import asyncio
 import logging
-import json
+import os
+from retry_queue import OfflineRetryQueue, PendingRequest
+from circuit_breaker import CLOSED, CircuitBreaker, CircuitOpenError
+from tracing import TRACE_HEADER, tracer
+
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class Chat:
     sender: str
     message: str
+    correlation_id: Optional[str] = None  # Set for traced messages
 
 @dataclass
 class SentimentResponse:
     sentiment: str
     alert_needed: bool
     explanation: str
+    provisional: bool = False  # A lexicon verdict: the local fallback's or the server's local tier
+    tier: str = "full"  # Server tier that produced it; lower when the family's budget runs low
+    stride_hint: int = 0  # Smallest stride the server asks for; 0 means no limit
+
+# Called with (context, results) for every analysis recovered from the retry queue
+ReplayCallback = Callable[[Dict[str, Any], SentimentResponse], None]
+
+
+class RejectedRequestError(Exception):
+    """The server refused the request itself (a 4xx other than 429); resending cannot help"""
+
 
 class ChatMonitorClient:
-    def __init__(self, server_url: str = "http://localhost:8000"):
+    def __init__(self, server_url: str = "http://localhost:8000",
+                 retry_queue: Optional[OfflineRetryQueue] = None,
+                 on_replayed: Optional[ReplayCallback] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 local_fallback: bool = True,
+                 token: Optional[str] = None):
         self.server_url = server_url
-        self.client = httpx.AsyncClient(timeout=30.0)
-        self.message_cache = []
-        logging.info(f"ChatMonitorClient initialized with server: {server_url}")
+        # The parent account's API token; the server only analyzes that parent's children
+        self.token = token or os.getenv("WATCHPOINT_API_TOKEN")
+        # Built on first use (or by warm_up) so importing httpx stays off the startup path
+        self.client = None
+        # An empty queue is falsy (it has __len__), so test for None explicitly
+        self.retry_queue = retry_queue if retry_queue is not None else OfflineRetryQueue()
+        self.on_replayed = on_replayed
+
+        # Fail fast while the server is down; windows are scored locally meanwhile
+        self.breaker = breaker or CircuitBreaker()
+        self.breaker.on_state_change = self._on_circuit_change
+        self.fallback = None
+        if local_fallback:
+            from local_classifier import classify_chats
+            self.fallback = classify_chats
+
+        # Batching configuration
+        self.flush_interval = 0.2  # Seconds to gather windows before sending
+        self.max_batch_size = 16
+        self.pending_batch = []
+        self.flush_handle = None
+
+        # Replay configuration
+        self.replay_batch_size = 64
+        self.replay_concurrency = 4
+        self.replay_interval = 5.0
+
+        logger.info(f"ChatMonitorClient initialized with server: {server_url}")
 
-    async def analyze_chats(self, username: str, chats: List[Chat]) -> Optional[SentimentResponse]:
+    def _http(self):
+        if self.client is None:
+            import httpx
+            # A down server is noticed at connect time instead of after the full timeout
+            self.client = httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=3.0))
+        return self.client
+
+    async def warm_up(self):
+        """Build the HTTP client and open a pooled connection before the first window"""
+        try:
+            response = await self._http().get(f"{self.server_url}/health")
+            logger.info(f"Connected to analysis server ({response.status_code})")
+        except Exception as e:
+            # Not fatal: the breaker and retry queue handle a server that is down
+            logger.warning(f"Could not reach analysis server during warm-up: {e}")
+
+    async def analyze_chats(self, username: str, chats: List[Chat],
+                            context: Optional[Dict[str, Any]] = None,
+                            child_id: Optional[int] = None) -> Optional[SentimentResponse]:
         """
-        Send chats for analysis and get sentiment response
+        Send chats for analysis and get sentiment response.
+        Windows from all conversations are gathered for `flush_interval`
+        seconds and sent together to the batch endpoint. Failed requests are
+        queued on disk together with `context` so the replayed result can be
+        routed back to the caller.
         """
+        payload = {
+            "username": username,
+            "chats": [{"sender": chat.sender, "message": chat.message} for chat in chats]
+        }
+        if child_id is not None:
+            payload["child_id"] = child_id
+        trace_ids = [chat.correlation_id for chat in chats if chat.correlation_id]
+        if trace_ids:
+            payload["trace_ids"] = trace_ids
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending_batch.append((payload, context, future))
+        logger.debug(f"Queued analysis request for {username} with {len(chats)} messages")
+
+        if len(self.pending_batch) >= self.max_batch_size:
+            self._flush_batch()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.flush_interval, self._flush_batch)
+
+        return await future
+
+    def _flush_batch(self):
+        """Send everything gathered so far as one batch request"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch = self.pending_batch
+        self.pending_batch = []
+        if batch:
+            asyncio.get_running_loop().create_task(self._send_batch(batch))
+
+    async def _send_batch(self, batch):
+        payloads = [payload for payload, _, _ in batch]
+        rejected = False
         try:
-            payload = {
-                "username": username,
-                "chats": [{"sender": chat.sender, "message": chat.message} for chat in chats]
-            }
-
-            logging.debug(f"Sending analysis request for {username} with {len(chats)} messages")
-            response = await self.client.post(
-                f"{self.server_url}/analyze_chats",
-                json=payload
+            results = await self._post_batch(payloads)
+        except RejectedRequestError as e:
+            # Not queued: the same request would be rejected on every replay
+            logger.error(f"{e}; dropping {len(batch)} windows")
+            rejected = True
+            results = [None] * len(batch)
+        except CircuitOpenError:
+            logger.debug(f"Circuit open, scoring {len(batch)} windows locally")
+            results = [None] * len(batch)
+        except Exception as e:
+            logger.error(f"Batch request error: {e}")
+            results = [None] * len(batch)
+
+        if len(results) != len(batch):
+            # zip() would leave the unmatched callers waiting forever
+            error = RuntimeError(f"Batch response has {len(results)} results for {len(batch)} windows")
+            logger.error(str(error))
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for (payload, context, future), result in zip(batch, results):
+            if result is None:
+                if not rejected:
+                    self.retry_queue.push(payload, context)
+                result = self._fallback(payload)
+            if not future.done():
+                future.set_result(result)
+
+    async def _post_batch(self, payloads: List[Dict[str, Any]]) -> List[Optional[SentimentResponse]]:
+        """
+        POST payloads to the batch endpoint. Returns one entry per payload,
+        None for items the server could not analyze.
+        """
+        logger.debug(f"Sending batch of {len(payloads)} analysis requests")
+        trace_ids = [trace_id for payload in payloads for trace_id in payload.get("trace_ids", ())]
+        headers = {}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if trace_ids:
+            headers[TRACE_HEADER] = ",".join(trace_ids)
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("analysis server circuit is open")
+        import httpx
+        tracer.mark(trace_ids, "client.sent", batch=len(payloads))
+        try:
+            response = await self._http().post(
+                f"{self.server_url}/analyze_chats/batch",
+                json=payloads,
+                headers=headers
             )
-            
-            if response.status_code == 200:
-                data = response.json()
-                logging.debug(f"Received analysis response: {data}")
-                return SentimentResponse(**data)
-            else:
-                logging.error(f"Server error: {response.status_code}")
-                self.message_cache.append(payload)
-                return None
-
-        except httpx.RequestError as e:
-            logging.error(f"Request error: {e}")
-            self.message_cache.append(payload)
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled, or failed without reaching the server: a held probe must be freed
+            self.breaker.release_probe()
+            raise
+        tracer.mark(trace_ids, "client.received", status=response.status_code)
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            raise RejectedRequestError(f"Server rejected the batch: {response.status_code}")
+        if response.status_code != 200:
+            logger.error(f"Server error: {response.status_code}")
+            response.raise_for_status()
+
+        data = response.json()
+        logger.debug(f"Received batch analysis response: {data}")
+        return [SentimentResponse(**item) if item else None for item in data]
+
+    def _fallback(self, payload: Dict[str, Any]) -> Optional[SentimentResponse]:
+        """Provisional local verdict for a window the server could not score"""
+        if self.fallback is None:
             return None
+        try:
+            result = self.fallback([Chat(**chat) for chat in payload["chats"]])
+            result.provisional = True
+            return result
         except Exception as e:
-            logging.error(f"Unexpected error in analyze_chats: {e}")
+            logger.error(f"Local fallback failed: {e}")
             return None
 
+    def _on_circuit_change(self, previous: str, state: str):
+        if state == CLOSED:
+            # Windows scored locally during the outage get their real verdict now
+            self.retry_queue.retry_now()
+
     def display_results(self, results: Optional[SentimentResponse]) -> str:
         """
         Format analysis results for display
@@ -79,30 +244,95 @@ Explanation: {results.explanation}
         Close the HTTP client
         """
         try:
-            await self.client.aclose()
-            logging.info("ChatMonitorClient closed")
+            if self.client is not None:
+                await self.client.aclose()
+            self.retry_queue.close()
+            logger.info("ChatMonitorClient closed")
         except Exception as e:
-            logging.error(f"Error closing client: {e}")
+            logger.error(f"Error closing client: {e}")
 
-    async def retry_cached_messages(self):
+    async def retry_cached_messages(self) -> List[SentimentResponse]:
         """
-        Retry sending cached messages
+        Replay one batch of due requests from the retry queue. The batch is
+        split into chunks that are sent concurrently through the batch
+        endpoint. Successful results are handed to `on_replayed`; failures
+        are rescheduled with backoff.
         """
-        if not self.message_cache:
-            return
+        if self.breaker.retry_in() > 0:
+            return []
+        # While the server is down only one chunk is sent, as the probe
+        limit = self.replay_batch_size if self.breaker.state == CLOSED else self.max_batch_size
+        pending = self.retry_queue.due(limit)
+        if not pending:
+            return []
+
+        logger.info(f"Attempting to send {len(pending)} cached requests")
+        chunks = [
+            pending[i:i + self.max_batch_size]
+            for i in range(0, len(pending), self.max_batch_size)
+        ]
+        semaphore = asyncio.Semaphore(self.replay_concurrency)
+
+        skipped = set()
+        rejected = set()
+
+        async def replay(chunk: List[PendingRequest]) -> List[Optional[SentimentResponse]]:
+            async with semaphore:
+                try:
+                    return await self._post_batch([entry.payload for entry in chunk])
+                except CircuitOpenError:
+                    # Not attempted, so the entries keep their backoff
+                    skipped.update(entry.id for entry in chunk)
+                    return [None] * len(chunk)
+                except RejectedRequestError as e:
+                    logger.error(f"{e}; dropping {len(chunk)} cached requests")
+                    rejected.update(entry.id for entry in chunk)
+                    return [None] * len(chunk)
+                except Exception as e:
+                    logger.error(f"Error retrying cached requests: {e}")
+                    return [None] * len(chunk)
+
+        chunk_results = await asyncio.gather(*(replay(chunk) for chunk in chunks))
+        results = [result for chunk in chunk_results for result in chunk]
 
-        logging.info(f"Attempting to send {len(self.message_cache)} cached messages")
-        retry_cache = self.message_cache.copy()
-        self.message_cache.clear()
+        delivered = []
+        failed = []
+        for entry, result in zip(pending, results):
+            if result is None:
+                if entry.id not in skipped and entry.id not in rejected:
+                    failed.append(entry)
+                continue
+            delivered.append(result)
+            if self.on_replayed:
+                try:
+                    self.on_replayed(entry.context, result)
+                except Exception as e:
+                    logger.error(f"Error handling replayed result: {e}")
 
-        for payload in retry_cache:
+        self.retry_queue.complete([
+            entry.id for entry, result in zip(pending, results)
+            if result is not None or entry.id in rejected
+        ])
+        self.retry_queue.reschedule(failed)
+        logger.info(f"Replayed {len(delivered)} cached requests, {len(failed)} still pending")
+        return delivered
+
+    async def run_retry_loop(self):
+        """
+        Keep draining the retry queue until cancelled
+        """
+        while True:
             try:
-                response = await self.client.post(
-                    f"{self.server_url}/analyze_chats",
-                    json=payload
-                )
-                if response.status_code != 200:
-                    self.message_cache.append(payload)
+                replayed = await self.retry_cached_messages()
             except Exception as e:
-                self.message_cache.append(payload)
-                logging.error(f"Error retrying cached message: {e}")
\ No newline at end of file
+                logger.error(f"Retry loop error: {e}")
+                replayed = []
+
+            # Go straight to the next batch while replays keep succeeding
+            if replayed:
+                continue
+            wait = self.retry_queue.next_due_in()
+            if wait is None:
+                wait = self.replay_interval
+            wait = max(wait, self.breaker.retry_in())
+            await asyncio.sleep(min(max(wait, 0.1), self.replay_interval))
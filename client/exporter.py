@@ -0,0 +1,137 @@
+# exporter.py
+import csv
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from alert_store import AlertStore, MonitoringAlert
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "jsonl": ".jsonl",
+    "csv": ".csv",
+    "txt.gz": ".txt.gz",
+}
+
+CSV_FIELDS = ["created_at", "timestamp", "child_name", "sentiment",
+              "alert_needed", "message_range", "repeat_count", "explanation"]
+
+
+@dataclass
+class ExportRequest:
+    path: str
+    fmt: str = "jsonl"
+    child_name: Optional[str] = None
+    sentiment: Optional[str] = None
+    since: Optional[float] = None
+    until: Optional[float] = None
+
+
+def default_export_path(fmt: str) -> str:
+    return f"monitoring_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}{EXPORT_FORMATS[fmt]}"
+
+
+def format_text_alert(alert: MonitoringAlert) -> str:
+    return (
+        f"Time: {alert.timestamp}\n"
+        f"Child: {alert.child_name}\n"
+        f"Message Range: {alert.message_range}\n"
+        f"Sentiment: {alert.sentiment}\n"
+        f"Alert Needed: {'Yes' if alert.alert_needed else 'No'}\n"
+        f"Analysis: {alert.explanation}\n"
+        + "-" * 50 + "\n\n"
+    )
+
+
+class ExportJob:
+    """Streams alerts from the store to a file on a background thread.
+
+    Alerts still queued for the store are flushed first, on the same thread.
+
+    Progress is reported on `events` as ("progress", done, total), then one
+    of ("done", path, count), ("cancelled", path, count) or ("error", path, message).
+    The file is written under a temporary name and only renamed into place
+    when the export completes.
+    """
+
+    progress_every = 500
+
+    def __init__(self, store: AlertStore, request: ExportRequest):
+        if request.fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {request.fmt}")
+        self.store = store
+        self.request = request
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.finished = False
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _open(self, path: str):
+        if self.request.fmt == "txt.gz":
+            return gzip.open(path, "wt", encoding="utf-8")
+        return open(path, "w", encoding="utf-8", newline="")
+
+    def _run(self):
+        request = self.request
+        tmp_path = request.path + ".part"
+        filters = dict(child_name=request.child_name, sentiment=request.sentiment,
+                       since=request.since, until=request.until)
+        done = 0
+        try:
+            # Everything already queued should be part of the export
+            self.store.flush()
+            total = self.store.count(**filters)
+            self.events.put(("progress", 0, total))
+
+            with self._open(tmp_path) as f:
+                if request.fmt == "csv":
+                    writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+                    writer.writeheader()
+                elif request.fmt == "txt.gz":
+                    f.write("Chat Monitoring Logs\n")
+                    f.write("=" * 50 + "\n\n")
+
+                for alert in self.store.iter_alerts(**filters):
+                    if self.cancel_event.is_set():
+                        break
+                    if request.fmt == "jsonl":
+                        f.write(json.dumps(alert.to_dict()) + "\n")
+                    elif request.fmt == "csv":
+                        writer.writerow(alert.to_dict())
+                    else:
+                        f.write(format_text_alert(alert))
+                    done += 1
+                    if done % self.progress_every == 0:
+                        self.events.put(("progress", done, total))
+
+            if self.cancel_event.is_set():
+                os.remove(tmp_path)
+                self.events.put(("cancelled", request.path, done))
+                logger.info(f"Export to {request.path} cancelled after {done} alerts")
+            else:
+                os.replace(tmp_path, request.path)
+                self.events.put(("progress", done, total))
+                self.events.put(("done", request.path, done))
+                logger.info(f"Exported {done} alerts to {request.path}")
+        except Exception as e:
+            logger.error(f"Export to {request.path} failed: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            self.events.put(("error", request.path, str(e)))
+        finally:
+            self.finished = True
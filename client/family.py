@@ -0,0 +1,96 @@
+# family.py
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from paths import FAMILY_PATH
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ChildProfile:
+    """Client-side view of a server ChildAccount"""
+    id: int
+    name: str
+    parent_id: Optional[int] = None
+
+
+@dataclass
+class Family:
+    """Client-side view of a server ParentAccount and its children"""
+    parent_id: int
+    parent_name: str
+    children: List[ChildProfile] = field(default_factory=list)
+    # Groups of child names that chat with each other
+    conversations: List[List[str]] = field(default_factory=list)
+
+    def child_names(self) -> List[str]:
+        return [child.name for child in self.children]
+
+    def child_id(self, name: str) -> Optional[int]:
+        for child in self.children:
+            if child.name == name:
+                return child.id
+        return None
+
+    def contacts_of(self, name: str) -> List[str]:
+        """Everyone `name` shares a conversation with"""
+        contacts = []
+        for members in self.conversations:
+            if name in members:
+                contacts.extend(member for member in members
+                                if member != name and member not in contacts)
+        return contacts
+
+    def conversations_of(self, name: str) -> List[List[str]]:
+        """Member lists of every conversation `name` takes part in"""
+        return [members for members in self.conversations if name in members]
+
+
+DEMO_FAMILY = {
+    "parent": {"id": 1, "name": "Parent", "account_type": "parent", "children": [2, 3]},
+    "children": [
+        {"id": 2, "name": "Alice", "account_type": "child", "parent_id": 1},
+        {"id": 3, "name": "Bob", "account_type": "child", "parent_id": 1},
+    ],
+    "conversations": [["Alice", "Bob"]],
+}
+
+
+def family_from_dict(data: Dict) -> Family:
+    """Build a Family from ParentAccount / ChildAccount shaped dictionaries"""
+    parent = data["parent"]
+    child_ids = set(parent.get("children", []))
+    children = [
+        ChildProfile(id=child["id"], name=child["name"], parent_id=child.get("parent_id"))
+        for child in data.get("children", [])
+        if child["id"] in child_ids or child.get("parent_id") == parent["id"]
+    ]
+    conversations = data.get("conversations")
+    if conversations is None:
+        # Pair children up in order when no conversations are configured
+        names = [child.name for child in children]
+        conversations = [names[i:i + 2] for i in range(0, len(names) - 1, 2)]
+    return Family(
+        parent_id=parent["id"],
+        parent_name=parent.get("name", ""),
+        children=children,
+        conversations=[list(members) for members in conversations]
+    )
+
+
+def load_family(path: Optional[str] = None) -> Family:
+    """Load the monitored family, falling back to the Alice/Bob demo"""
+    path = path or FAMILY_PATH
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                family = family_from_dict(json.load(f))
+            logger.info(f"Loaded family with {len(family.children)} children from {path}")
+            return family
+        except Exception as e:
+            logger.error(f"Could not load family from {path}: {e}")
+    return family_from_dict(DEMO_FAMILY)
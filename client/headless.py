@@ -0,0 +1,201 @@
+# headless.py
+"""Run the monitoring pipeline without a display.
+
+Messages are read as JSON lines:
+    {"conversation": "Alice|Bob", "sender": "Alice", "message": "hi"}
+("conversation" is optional and defaults to the sender; an optional
+"correlation_id" is traced like a message typed in the UI) from stdin, a file
+or a local socket. Alerts are written to stdout as JSON lines and/or to the
+alert store.
+
+    python headless.py --source stdin --sink stdout
+    python headless.py --source file --path chats.jsonl --sink store
+    python headless.py --source socket --path /tmp/watchpoint.sock --sink stdout store
+    python headless.py --benchmark 2000 --messages 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from alert_coalescer import AlertCoalescer
+from alert_store import AlertStore, MonitoringAlert
+from client import ChatMonitorClient, Chat, SentimentResponse
+from family import load_family
+from logging_config import setup_logging
+from paths import FAMILY_PATH, logs_path
+from monitor_engine import MonitoringEngine
+from tracing import tracer
+from windowing import AnalysisScheduler
+
+logger = logging.getLogger("headless")
+
+
+def feed_line(engine: MonitoringEngine, line: str):
+    line = line.strip()
+    if not line:
+        return
+    try:
+        record = json.loads(line)
+        sender = record["sender"]
+        engine.submit(record.get("conversation") or sender, sender, record["message"],
+                      record.get("correlation_id"))
+    except (ValueError, KeyError) as e:
+        logger.warning(f"Skipping malformed message line: {e}")
+
+
+async def read_stream(engine: MonitoringEngine, reader: asyncio.StreamReader):
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        feed_line(engine, line.decode("utf-8", errors="replace"))
+
+
+async def read_stdin(engine: MonitoringEngine):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    await read_stream(engine, reader)
+
+
+async def read_file(engine: MonitoringEngine, path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            feed_line(engine, line)
+            if i % 1000 == 0:
+                await asyncio.sleep(0)  # Let analyses progress while reading
+
+
+async def serve_socket(engine: MonitoringEngine, path: str):
+    """Accept any number of local clients, each streaming JSON lines"""
+    if os.path.exists(path):
+        os.remove(path)
+
+    async def handle_client(reader, writer):
+        try:
+            await read_stream(engine, reader)
+        finally:
+            writer.close()
+
+    server = await asyncio.start_unix_server(handle_client, path=path)
+    logger.info(f"Listening for messages on {path}")
+    async with server:
+        await server.serve_forever()
+
+
+def stdout_sink(alert: MonitoringAlert):
+    sys.stdout.write(json.dumps(alert.to_dict()) + "\n")
+    sys.stdout.flush()
+    # stdout is the headless "dashboard"
+    tracer.mark(alert.trace_ids, "alert.displayed")
+
+
+async def benchmark_analyzer(username: str, chats: List[Chat],
+                             context: Dict[str, Any]) -> Optional[SentimentResponse]:
+    """Stand-in for the server with a small fixed latency"""
+    await asyncio.sleep(0.005)
+    return SentimentResponse(sentiment="POSITIVE", alert_needed=False,
+                             explanation="benchmark")
+
+
+async def run_benchmark(conversations: int, messages: int, window_size: int):
+    engine = MonitoringEngine(
+        scheduler=AnalysisScheduler(window_size=window_size, idle_timeout=0.5),
+        analyzer=benchmark_analyzer,
+        idle_check_interval=0.1
+    )
+    await engine.start()
+    started = time.perf_counter()
+    for i in range(messages):
+        for c in range(conversations):
+            engine.submit(f"conv{c}", random.choice(("a", "b")), f"message {i}")
+        await asyncio.sleep(0)
+    await asyncio.sleep(1.0)  # Let idle flushes run
+    await engine.stop()
+    elapsed = time.perf_counter() - started
+    total = conversations * messages
+    print(f"{conversations} conversations, {total} messages, "
+          f"{engine.stats['windows']} windows in {elapsed:.2f}s "
+          f"({total / elapsed:.0f} messages/s)")
+
+
+async def main(args):
+    family = load_family(args.family)
+    engine = MonitoringEngine(
+        client=ChatMonitorClient(server_url=args.server),
+        scheduler=AnalysisScheduler(window_size=args.window_size,
+                                    idle_timeout=args.idle_timeout),
+        child_id_for=family.child_id
+    )
+
+    sinks = []
+    store = None
+    if "stdout" in args.sink:
+        sinks.append(stdout_sink)
+    if "store" in args.sink:
+        store = AlertStore(args.store)
+        sinks.append(store.append)
+
+    def forward(alert: MonitoringAlert):
+        for sink in sinks:
+            sink(alert)
+
+    coalescer = None
+    if args.coalesce_window > 0:
+        coalescer = AlertCoalescer(forward, window=args.coalesce_window)
+        engine.add_sink(coalescer.push)
+    else:
+        engine.add_sink(forward)
+
+    await engine.start()
+    try:
+        if args.source == "stdin":
+            await read_stdin(engine)
+        elif args.source == "file":
+            await read_file(engine, args.path)
+        else:
+            await serve_socket(engine, args.path)
+        # Anything left in partial windows is analyzed before exit
+        await asyncio.sleep(args.idle_timeout + engine.idle_check_interval)
+    finally:
+        await engine.stop()
+        if coalescer:
+            coalescer.close()
+        if store:
+            store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless WatchPoint monitoring engine")
+    parser.add_argument("--source", choices=["stdin", "file", "socket"], default="stdin")
+    parser.add_argument("--path", help="Input file or socket path")
+    parser.add_argument("--sink", nargs="+", choices=["stdout", "store"], default=["stdout"])
+    parser.add_argument("--store", default=logs_path("alerts.db"))
+    parser.add_argument("--server", default="http://localhost:8000")
+    parser.add_argument("--family", default=FAMILY_PATH,
+                        help="Family configuration used to map senders to child accounts")
+    parser.add_argument("--window-size", type=int, default=3)
+    parser.add_argument("--idle-timeout", type=float, default=10.0)
+    parser.add_argument("--coalesce-window", type=float, default=120.0,
+                        help="Seconds within which repeated alerts are merged (0 disables)")
+    parser.add_argument("--benchmark", type=int, metavar="CONVERSATIONS",
+                        help="Measure engine throughput with a stub analyzer")
+    parser.add_argument("--messages", type=int, default=20,
+                        help="Messages per conversation in benchmark mode")
+    args = parser.parse_args()
+
+    # Alerts go to stdout, so logs stay off the console
+    setup_logging(console=False)
+
+    if args.benchmark:
+        asyncio.run(run_benchmark(args.benchmark, args.messages, args.window_size))
+    else:
+        if args.source != "stdin" and not args.path:
+            parser.error("--path is required for file and socket sources")
+        asyncio.run(main(args))
@@ -0,0 +1,33 @@
+# local_classifier.py
+"""Keyword classifier used while the analysis server is unreachable.
+
+Its verdicts are provisional: they keep the parent informed during an
+outage, and every window scored here is re-analyzed by the server once it
+is back. The lexicon is shared with the server (../shared/lexicon.py).
+"""
+from typing import List
+
+from client import Chat, SentimentResponse
+
+import _shared_path  # noqa: F401
+from shared.lexicon import match_categories, worst_sentiment
+
+
+def classify_chats(chats: List[Chat]) -> SentimentResponse:
+    """Score a window by the most severe category any message matches"""
+    matched = match_categories(chat.message for chat in chats)
+    if not matched:
+        return SentimentResponse(
+            sentiment="POSITIVE",
+            alert_needed=False,
+            explanation="Provisional local check: no concerning language found."
+        )
+
+    sentiment = worst_sentiment(matched)
+    categories = ", ".join(category for category, _ in matched)
+    return SentimentResponse(
+        sentiment=sentiment,
+        alert_needed=sentiment == "NEGATIVE",
+        explanation=f"Provisional local check matched: {categories}. "
+                    f"Pending re-analysis by the server."
+    )
@@ -1,27 +1,119 @@
 # logging_config.py
+import atexit
 import logging
+import logging.handlers
 import os
-from datetime import datetime
-
-def setup_logging():
-    # Create logs directory if it doesn't exist
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
-
-    # Configure logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            # File handler with daily rotation
-            logging.FileHandler(
-                f'logs/chat_app_{datetime.now().strftime("%Y%m%d")}.log'
-            ),
-            # Console handler
-            logging.StreamHandler()
-        ]
-    )
-
-    # Set specific levels for different components
-    logging.getLogger('httpx').setLevel(logging.WARNING)
-    logging.getLogger('asyncio').setLevel(logging.WARNING)
\ No newline at end of file
+import queue
+from typing import Dict, Optional
+
+try:
+    from pythonjsonlogger import jsonlogger
+except ImportError:  # Plain text logs when python-json-logger is missing
+    jsonlogger = None
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+JSON_FORMAT = '%(asctime)s %(name)s %(levelname)s %(threadName)s %(message)s'
+
+# Default level per component (logger name)
+COMPONENT_LEVELS = {
+    'httpx': logging.WARNING,
+    'httpcore': logging.WARNING,
+    'asyncio': logging.WARNING,
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_levels(spec: str) -> Dict[str, int]:
+    """Parse 'windowing=DEBUG,client=WARNING' into a level mapping.
+
+    Unknown level names are skipped with a warning.
+    """
+    levels = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        name, level = item.split('=', 1)
+        level = level.strip().upper()
+        # getLevelName maps unknown names to the string "Level X"
+        value = int(level) if level.isdigit() else logging.getLevelName(level)
+        if not isinstance(value, int):
+            logger.warning(f"Ignoring unknown log level {level!r} for {name.strip()!r}")
+            continue
+        levels[name.strip()] = value
+    return levels
+
+
+def _file_handler(path: str, rotate_when: Optional[str], max_bytes: int,
+                  backup_count: int) -> logging.Handler:
+    if rotate_when:
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when=rotate_when, backupCount=backup_count, encoding='utf-8')
+    return logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+
+
+def setup_logging(log_dir: str = 'logs', level: int = logging.INFO,
+                  component_levels: Optional[Dict[str, int]] = None,
+                  json_output: bool = True, console: bool = True,
+                  rotate_when: Optional[str] = None,
+                  max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5):
+    """Configure logging for the whole client.
+
+    Every logger feeds a QueueHandler; a QueueListener thread does the
+    formatting and disk I/O, so the Tk and analysis threads never block on
+    a write. The file is JSON (when python-json-logger is installed) and
+    rotates by size, or by time when `rotate_when` is given (e.g.
+    'midnight'). Levels per component can be overridden with the
+    WATCHPOINT_LOG_LEVELS environment variable.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    os.makedirs(log_dir, exist_ok=True)
+    rotate_when = rotate_when or os.getenv('WATCHPOINT_LOG_ROTATE_WHEN') or None
+
+    file_handler = _file_handler(
+        os.path.join(log_dir, 'chat_app.log'), rotate_when, max_bytes, backup_count)
+    if json_output and jsonlogger is not None:
+        file_handler.setFormatter(jsonlogger.JsonFormatter(JSON_FORMAT))
+    else:
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handlers = [file_handler]
+
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    levels = dict(COMPONENT_LEVELS)
+    levels.update(component_levels or {})
+    levels.update(_parse_levels(os.getenv('WATCHPOINT_LOG_LEVELS', '')))
+    for name, component_level in levels.items():
+        logging.getLogger(name).setLevel(component_level)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -1,26 +1,26 @@
 # messenger_chat.py
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk
 import asyncio
 import threading
-from queue import Queue
-import queue
-from client import ChatMonitorClient, Chat, SentimentResponse
+from client import ChatMonitorClient
+from windowing import AnalysisScheduler
+from monitor_engine import MonitoringEngine
+from alert_coalescer import AlertCoalescer
+from ui_queue import WakeupQueue, drain_queue
+from family import load_family
+from tracing import new_correlation_id, tracer
 from datetime import datetime
-import uuid
 import nest_asyncio
-from parent_monitor import ParentMonitorWindow, MonitoringAlert, MonitorStyle
+from parent_monitor import ParentMonitorWindow, MonitorStyle
 import signal
 import sys
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+from collections import deque
 import logging
+from logging_config import setup_logging
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename='chat_app.log'
-)
+logger = logging.getLogger("messenger_chat")
 
 # Apply nest_asyncio for nested event loops
 nest_asyncio.apply()
@@ -49,6 +49,11 @@ class MessengerStyle:
     MESSAGE_PADDING = 12
     BUBBLE_RADIUS = 20    # For rounded corners
 
+    # History
+    MAX_RENDERED_MESSAGES = 200  # Messages kept in the text widget
+    HISTORY_LIMIT = 2000         # Messages kept in memory for scroll-back
+    SCROLLBACK_PAGE = 50         # Messages loaded per scroll-back
+
 
 class AsyncTkThread:
     """Handles async operations in a separate thread"""
@@ -58,7 +63,7 @@ class AsyncTkThread:
         self.thread = threading.Thread(target=self._run_loop, daemon=True)
         self.running = True
         self.thread.start()
-        logging.info("AsyncTkThread initialized")
+        logger.info("AsyncTkThread initialized")
 
     def _run_loop(self):
         asyncio.set_event_loop(self.loop)
@@ -66,7 +71,7 @@ class AsyncTkThread:
             try:
                 self.loop.run_forever()
             except Exception as e:
-                logging.error(f"AsyncTkThread error: {e}")
+                logger.error(f"AsyncTkThread error: {e}")
                 if self.running:
                     continue
                 break
@@ -78,14 +83,20 @@ class AsyncTkThread:
         try:
             return future.result(timeout=30)
         except Exception as e:
-            logging.error(f"Async operation error: {e}")
+            logger.error(f"Async operation error: {e}")
+            return None
+
+    def submit(self, coro):
+        """Schedule a coroutine without waiting for its result"""
+        if not self.running:
             return None
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
 
     def stop(self):
         self.running = False
         self.loop.call_soon_threadsafe(self.loop.stop)
         self.thread.join(timeout=5)
-        logging.info("AsyncTkThread stopped")
+        logger.info("AsyncTkThread stopped")
 
 
 class RoundedCanvas(tk.Canvas):
@@ -110,7 +121,7 @@ class RoundedCanvas(tk.Canvas):
 class ChatWindow:
     """Individual chat window for each user"""
 
-    def __init__(self, name: str, other_name: str, client: ChatMonitorClient,
+    def __init__(self, name: str, members: List[str], client: ChatMonitorClient,
                  message_callback, on_close: Optional[callable] = None):
         self.window = tk.Tk()
         self.window.title(f"{name}'s Chat")
@@ -119,29 +130,21 @@ class ChatWindow:
         self.window.configure(bg=MessengerStyle.BG_COLOR)
 
         self.name = name
-        self.other_name = other_name
+        self.members = members  # Everyone in this window's conversation, `name` included
+        self.other_name = ", ".join(member for member in members if member != name) or "nobody"
         self.client = client
         self.message_callback = message_callback
         self.on_close = on_close
 
-        self.update_interval = 1000  # Update every 1000 milliseconds (1 second)
-        self.schedule_updates()
+        # Every message this window has shown, newest last: (is_self, message, timestamp)
+        self.history = deque(maxlen=MessengerStyle.HISTORY_LIMIT)
+        # Line counts of the messages currently in the widget, oldest first
+        self.rendered = deque()
+        self.loading_older = False
 
         self.setup_gui()
         self.window.protocol("WM_DELETE_WINDOW", self.handle_close)
-        logging.info(f"ChatWindow initialized for {name}")
-
-    def schedule_updates(self):
-        """Schedule regular updates to the chat display."""
-        self.update_chat_display()
-        self.window.after(self.update_interval, self.schedule_updates)
-
-    def update_chat_display(self):
-        """Update the chat display with new messages or changes."""
-        # Logic to refresh or update the chat display
-        # For example, check for new messages and display them
-        logging.info("Chat display updated")
-        # ... additional update logic ...
+        logger.info(f"ChatWindow initialized for {name}")
 
     def setup_gui(self):
         # Main container
@@ -182,10 +185,16 @@ class ChatWindow:
         )
         self.chat_display.pack(fill=tk.BOTH, expand=True, side=tk.LEFT)
 
-        # Scrollbar
+        # Scrollbar; reaching the top loads older messages from history
         scrollbar = ttk.Scrollbar(chat_frame)
         scrollbar.pack(fill=tk.Y, side=tk.RIGHT)
-        self.chat_display.configure(yscrollcommand=scrollbar.set)
+
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            if float(first) <= 0.0 and float(last) < 1.0 and self.has_older_messages():
+                self.window.after_idle(self.load_older_messages)
+
+        self.chat_display.configure(yscrollcommand=on_scroll)
         scrollbar.configure(command=self.chat_display.yview)
 
         # Create input frame
@@ -232,9 +241,10 @@ class ChatWindow:
             background=MessengerStyle.SENT_BG,
             foreground=MessengerStyle.SENT_FG,
             spacing1=8,
-            spacing3=8,
+            spacing3=2,
             rmargin=15,
             lmargin1=50,  # Indentation for sent messages
+            lmargin2=50,
         )
         self.chat_display.tag_configure(
             "received",
@@ -242,10 +252,21 @@ class ChatWindow:
             background=MessengerStyle.RECEIVED_BG,
             foreground=MessengerStyle.RECEIVED_FG,
             spacing1=8,
-            spacing3=8,
+            spacing3=2,
             lmargin1=15,
+            lmargin2=15,
             rmargin=50,  # Indentation for received messages
         )
+        for tag, justify in (("timestamp_sent", "right"), ("timestamp_received", "left")):
+            self.chat_display.tag_configure(
+                tag,
+                justify=justify,
+                font=("Helvetica", 9),
+                foreground="#65676B",
+                spacing3=8,
+                lmargin1=15,
+                rmargin=15
+            )
 
         # Bind keys
         self.message_entry.bind(
@@ -268,143 +289,88 @@ class ChatWindow:
         self.message_entry.delete("1.0", tk.END)
         self.message_count += 1
         self.update_counter()
+        correlation_id = new_correlation_id()
+        tracer.mark(correlation_id, "send")
         self.display_message(self.name, message, is_self=True)
-        self.message_callback(self.name, message)
+        self.message_callback(self.name, message, correlation_id, self.members)
         return True
 
     def display_message(self, sender: str, message: str, is_self: bool = False):
-        self.chat_display.config(state=tk.NORMAL)
-        
-        # Add spacing before message
-        self.chat_display.insert(tk.END, "\n")
-        
-        # Create and insert message bubble
-        bubble = self.create_message_bubble(message, is_self)
-        bubble_window = self.chat_display.window_create(
-            tk.END,
-            window=bubble,
-            padx=20,
-            pady=5
-        )
-        
-        # Add timestamp
         timestamp = datetime.now().strftime("%H:%M")
-        self.chat_display.insert(
-            tk.END,
-            f"\n{timestamp}\n",
-            "timestamp"
-        )
-        
-        # Configure timestamp tag
-        self.chat_display.tag_configure(
-            "timestamp",
-            justify='right' if is_self else 'left',
-            font=("Helvetica", 9),
-            foreground="#65676B"
-        )
-        
-        # Align message to right or left
-        if is_self:
-            bubble.pack(anchor='e')
-        else:
-            bubble.pack(anchor='w')
-        
-        self.chat_display.see(tk.END)
+        self.history.append((is_self, message, timestamp))
+
+        chunks, lines = self.render_chunks(is_self, message, timestamp)
+        # Follow new messages only if the user is not reading older history;
+        # the render cap is applied once they are back at the bottom
+        following = is_self or self.chat_display.yview()[1] >= 1.0
+        self.chat_display.config(state=tk.NORMAL)
+        self.chat_display.insert(tk.END, *chunks)
+        self.rendered.append(lines)
+        if following:
+            self.trim_rendered()
+            self.chat_display.see(tk.END)
         self.chat_display.config(state=tk.DISABLED)
 
+    @staticmethod
+    def render_chunks(is_self: bool, message: str, timestamp: str):
+        """Text/tag pairs for one message bubble and its line count"""
+        bubble_tag = "sent" if is_self else "received"
+        timestamp_tag = "timestamp_sent" if is_self else "timestamp_received"
+        chunks = (f" {message} \n", bubble_tag, f"{timestamp}\n", timestamp_tag)
+        return chunks, message.count("\n") + 2
+
+    def trim_rendered(self):
+        """Drop the oldest messages from the widget beyond the render cap"""
+        excess = len(self.rendered) - MessengerStyle.MAX_RENDERED_MESSAGES
+        if excess <= 0:
+            return
+        lines = sum(self.rendered.popleft() for _ in range(excess))
+        self.chat_display.delete("1.0", f"{lines + 1}.0")
+
+    def has_older_messages(self) -> bool:
+        return len(self.rendered) < len(self.history)
+
+    def load_older_messages(self):
+        """Insert the previous page of history above the rendered messages"""
+        if self.loading_older or not self.has_older_messages():
+            return
+        self.loading_older = True
+        try:
+            end = len(self.history) - len(self.rendered)
+            start = max(0, end - MessengerStyle.SCROLLBACK_PAGE)
+            chunks = []
+            line_counts = []
+            for i in range(start, end):
+                entry_chunks, lines = self.render_chunks(*self.history[i])
+                chunks.extend(entry_chunks)
+                line_counts.append(lines)
+
+            self.chat_display.config(state=tk.NORMAL)
+            self.chat_display.insert("1.0", *chunks)
+            self.chat_display.config(state=tk.DISABLED)
+            self.rendered.extendleft(reversed(line_counts))
+
+            # Keep the previously first message at the top of the view
+            self.chat_display.yview(f"{sum(line_counts) + 1}.0")
+        finally:
+            self.loading_older = False
+
     def clear_chat(self):
         self.chat_display.config(state=tk.NORMAL)
         self.chat_display.delete(1.0, tk.END)
         self.chat_display.config(state=tk.DISABLED)
+        self.history.clear()
+        self.rendered.clear()
         self.message_entry.delete(1.0, tk.END)
         self.message_count = 0
         self.update_counter()
-        logging.info(f"Chat cleared for {self.name}")
+        logger.info(f"Chat cleared for {self.name}")
 
     def handle_close(self):
         if self.on_close:
             self.on_close()
         self.window.destroy()
-        logging.info(f"ChatWindow closed for {self.name}")
-
-    def create_rounded_rect(self, x1, y1, x2, y2, radius, **kwargs):
-        """Create a rounded rectangle"""
-        points = [
-            x1 + radius, y1,
-            x2 - radius, y1,
-            x2, y1,
-            x2, y1 + radius,
-            x2, y2 - radius,
-            x2, y2,
-            x2 - radius, y2,
-            x1 + radius, y2,
-            x1, y2,
-            x1, y2 - radius,
-            x1, y1 + radius,
-            x1, y1
-        ]
-        return self.chat_display.create_polygon(points, smooth=True, **kwargs)
-
-    def create_message_bubble(self, message, is_self=False):
-        """Create a message bubble with rounded corners"""
-        frame = tk.Frame(
-            self.chat_display,
-            bg=MessengerStyle.BG_COLOR,  # Set to background color
-            padx=MessengerStyle.MESSAGE_PADDING,
-            pady=MessengerStyle.MESSAGE_PADDING // 2
-        )
-        
-        # Create the rounded rectangle first
-        shape = RoundedCanvas(
-            frame,
-            width=250,  # Adjust width as needed
-            height=50,  # Adjust height as needed
-            bg=MessengerStyle.BG_COLOR,
-            highlightthickness=0
-        )
-        shape.create_rounded_rectangle(
-            2, 2, 248, 48,  # Adjust dimensions to fit the frame
-            radius=MessengerStyle.BUBBLE_RADIUS,
-            fill=MessengerStyle.SENT_BG if is_self else MessengerStyle.RECEIVED_BG
-        )
-        shape.pack(expand=True, fill=tk.BOTH)
-        
-        # Create the text label
-        label = tk.Label(
-            frame,
-            text=message,
-            wraplength=230,  # Adjust wrap length as needed
-            justify=tk.LEFT,
-            bg=MessengerStyle.SENT_BG if is_self else MessengerStyle.RECEIVED_BG,
-            fg=MessengerStyle.SENT_FG if is_self else MessengerStyle.RECEIVED_FG,
-            font=MessengerStyle.MESSAGE_FONT
-        )
-        label.place(x=10, y=10)  # Adjust position as needed
-        
-        return frame
-
-    def update_message_bubble(self, frame, is_self):
-        """Update the message bubble shape"""
-        frame.update_idletasks()
-        width = frame.winfo_width()
-        height = frame.winfo_height()
-        
-        if not hasattr(frame, "shape"):
-            frame.shape = RoundedCanvas(
-                frame,
-                width=width,
-                height=height,
-                bg=MessengerStyle.BG_COLOR,
-                highlightthickness=0
-            )
-            frame.shape.place(x=0, y=0)
-        
-        frame.shape.delete("all")
-        frame.shape.create_rounded_rectangle(
-            2, 2, width-2, height-2,
-            radius=MessengerStyle.BUBBLE_RADIUS,
-            fill=MessengerStyle.SENT_BG if is_self else MessengerStyle.RECEIVED_BG
-        )
+        logger.info(f"ChatWindow closed for {self.name}")
 
     def update_input_container(self, container):
         """Update the input container shape"""
@@ -432,206 +398,142 @@ class ChatWindow:
 
 
 class MessengerChat:
-    """Main chat application controller"""
+    """Tk front end: chat windows and the parent dashboard on top of MonitoringEngine"""
 
     def __init__(self):
         self.async_handler = AsyncTkThread()
         self.client = ChatMonitorClient()
-        self.message_queue = Queue()
-        self.alert_queue = queue.Queue()
-        self.current_chat = []
+        self.alert_queue = WakeupQueue()
         self.running = True
 
         # Sliding window configuration
         self.window_size = 3  # Size of analysis window
-        self.last_analyzed_index = -1  # Track last analyzed message
-        self.messages_since_analysis = 0  # Counter for messages since last analysis
-
-        # Create windows
+        self.idle_timeout = 10.0  # Seconds of silence before a partial window is analyzed
+
+        # Children and conversations come from the family configuration
+        self.family = load_family()
+
+        # All analysis runs in the headless engine on the async thread;
+        # its alerts reach the dashboard through the alert queue
+        self.engine = MonitoringEngine(
+            client=self.client,
+            scheduler=AnalysisScheduler(
+                window_size=self.window_size,
+                idle_timeout=self.idle_timeout
+            ),
+            child_id_for=self.family.child_id
+        )
+        # Repeats from overlapping windows are merged before they reach the dashboard
+        self.coalescer = AlertCoalescer(self.alert_queue.put)
+        self.engine.add_sink(self.coalescer.push)
+        # Started without waiting: calls made from Tk meanwhile are queued
+        # on the same loop behind start()
+        self.engine.loop = self.async_handler.loop
+        self.async_handler.submit(self.engine.start())
+
+        # The dashboard is shown first; the chat windows are built once it is up
         self.parent_window = ParentMonitorWindow(
             self.alert_queue,
-            reset_callback=self.reset_chat
-        )
-        self.alice_window = ChatWindow(
-            "Alice", "Bob",
-            self.client,
-            self.handle_message,
-            self.stop_application
-        )
-        self.bob_window = ChatWindow(
-            "Bob", "Alice",
-            self.client,
-            self.handle_message,
-            self.stop_application
+            reset_callback=self.reset_chat,
+            children=self.family.child_names()
         )
+        # One window per child and conversation, keyed by (name, conversation id)
+        self.chat_windows: Dict[Tuple[str, str], ChatWindow] = {}
+        self.pending_chat_windows = [(name, members) for name in self.family.child_names()
+                                     for members in self.family.conversations_of(name) or [[name]]]
 
         # Setup signal handlers
         signal.signal(signal.SIGINT, self.signal_handler)
         signal.signal(signal.SIGTERM, self.signal_handler)
 
         self.position_windows()
-        self.start_analysis_checker()
-        logging.info(f"MessengerChat initialized with sliding window size: {
+        self.parent_window.window.after_idle(self.open_next_chat_window)
+        logger.info(f"MessengerChat initialized with sliding window size: {
                      self.window_size}")
 
-    def get_analysis_window(self) -> List[Chat]:
-        """Get the current sliding window of messages"""
-        if len(self.current_chat) <= self.window_size:
-            return self.current_chat
-        return self.current_chat[-self.window_size:]
-
-    def should_analyze(self) -> bool:
-        """Determine if analysis should be performed"""
-        total_messages = len(self.current_chat)
-
-        # First analysis when we reach window_size
-        if total_messages == self.window_size and self.last_analyzed_index == -1:
-            return True
-
-        # After first window, only analyze when we have window_size new messages
-        if self.messages_since_analysis >= self.window_size:
-            return True
-
-        return False
+    def open_next_chat_window(self):
+        """Build one chat window per idle turn so the dashboard stays responsive"""
+        if not self.running or not self.pending_chat_windows:
+            return
+        name, members = self.pending_chat_windows.pop(0)
+        self.chat_windows[(name, self.conversation_id(*members))] = ChatWindow(
+            name, members,
+            self.client,
+            self.handle_message,
+            self.stop_application
+        )
+        if self.pending_chat_windows:
+            self.parent_window.window.after_idle(self.open_next_chat_window)
+        else:
+            self.position_windows()
 
     def position_windows(self):
-        screen_width = self.alice_window.window.winfo_screenwidth()
-        screen_height = self.alice_window.window.winfo_screenheight()
+        screen_width = self.parent_window.window.winfo_screenwidth()
+        screen_height = self.parent_window.window.winfo_screenheight()
 
         chat_width = MessengerStyle.WINDOW_WIDTH
         chat_height = MessengerStyle.WINDOW_HEIGHT
         monitor_width = MonitorStyle.WINDOW_WIDTH
         monitor_height = MonitorStyle.WINDOW_HEIGHT
 
-        alice_x = (screen_width // 4) - (chat_width // 2)
-        alice_y = (screen_height // 2) - (chat_height // 2)
-        self.alice_window.window.geometry(
-            f"{chat_width}x{chat_height}+{alice_x}+{alice_y}")
-
-        bob_x = (3 * screen_width // 4) - (chat_width // 2)
-        bob_y = alice_y
-        self.bob_window.window.geometry(
-            f"{chat_width}x{chat_height}+{bob_x}+{bob_y}")
+        # Spread chat windows evenly across the screen, cascading when crowded
+        chat_windows = list(self.chat_windows.values())
+        count = max(len(chat_windows), 1)
+        chat_y = (screen_height // 2) - (chat_height // 2)
+        for i, chat_window in enumerate(chat_windows):
+            center_x = (2 * i + 1) * screen_width // (2 * count)
+            chat_x = max(0, min(center_x - chat_width // 2, screen_width - chat_width))
+            chat_window.window.geometry(
+                f"{chat_width}x{chat_height}+{chat_x}+{chat_y + 20 * (i % 5)}")
 
         parent_x = (screen_width - monitor_width) // 2
         self.parent_window.window.geometry(
             f"{monitor_width}x{monitor_height}+{parent_x}+0")
 
         # Raise windows
-        for window in [self.parent_window.window, self.alice_window.window, self.bob_window.window]:
+        for window in [self.parent_window.window] + [w.window for w in chat_windows]:
             window.lift()
             window.focus_force()
 
-    def handle_message(self, sender: str, message: str):
-        """Handle new message from a chat window"""
-        self.current_chat.append(Chat(sender=sender, message=message))
-        self.messages_since_analysis += 1
-
-        # Display in other window
-        if sender == "Alice":
-            self.bob_window.display_message("Alice", message, is_self=False)
-            self.bob_window.message_count += 1
-            self.bob_window.update_counter()
-        else:
-            self.alice_window.display_message("Bob", message, is_self=False)
-            self.alice_window.message_count += 1
-            self.alice_window.update_counter()
-
-        # Log message stats
-        logging.debug(f"Messages: total={len(self.current_chat)}, since_analysis={
-                      self.messages_since_analysis}")
-
-        # Analyze if needed
-        if self.should_analyze():
-            def analyze_wrapper():
-                try:
-                    analysis_window = self.get_analysis_window()
-                    logging.info(f"Analyzing window of {
-                                 len(analysis_window)} messages")
-
-                    results = self.async_handler.run(
-                        self.client.analyze_chats(
-                            username=f"{sender}_demo",
-                            chats=analysis_window
-                        )
-                    )
-
-                    if results:
-                        self.message_queue.put((sender, results))
-                        self.last_analyzed_index = len(self.current_chat) - 1
-                        self.messages_since_analysis = 0
-                        logging.info(f"Analysis complete. Next analysis after {
-                                     self.window_size} more messages")
-
-                except Exception as e:
-                    logging.error(f"Analysis error: {e}")
-
-            threading.Thread(target=analyze_wrapper, daemon=True).start()
+    @staticmethod
+    def conversation_id(*participants: str) -> str:
+        """Stable id for the conversation between the given participants"""
+        return "|".join(sorted(participants))
+
+    def handle_message(self, sender: str, message: str, correlation_id: Optional[str],
+                       members: List[str]):
+        """Handle a new message sent from the chat window of conversation `members`"""
+        tracer.mark(correlation_id, "routed")
+        conversation_id = self.conversation_id(*members)
+        # Display in the windows of everyone else in the conversation
+        for member in members:
+            chat_window = self.chat_windows.get((member, conversation_id))
+            if member == sender or chat_window is None:
+                continue
+            chat_window.display_message(sender, message, is_self=False)
+            chat_window.message_count += 1
+            chat_window.update_counter()
+
+        self.engine.submit_threadsafe(conversation_id, sender, message, correlation_id)
 
     def reset_chat(self):
         """Reset chat and analysis state"""
-        self.current_chat = []
-        self.last_analyzed_index = -1
-        self.messages_since_analysis = 0
+        self.engine.loop.call_soon_threadsafe(self.engine.reset)
+        self.engine.loop.call_soon_threadsafe(self.coalescer.reset)
 
         # Clear chat windows
-        self.alice_window.clear_chat()
-        self.bob_window.clear_chat()
+        for chat_window in self.chat_windows.values():
+            chat_window.clear_chat()
 
         # Clear queues
-        while not self.message_queue.empty():
-            try:
-                self.message_queue.get_nowait()
-            except queue.Empty:
-                break
-
-        while not self.alert_queue.empty():
-            try:
-                self.alert_queue.get_nowait()
-            except queue.Empty:
-                break
-
-        logging.info("Chat system reset")
+        drain_queue(self.alert_queue)
 
-    def start_analysis_checker(self):
-        """Start the analysis checking loop"""
-        def check_analysis():
-            try:
-                sender, results = self.message_queue.get_nowait()
-                if results:
-                    # Calculate the exact message range that was analyzed
-                    if len(self.current_chat) <= self.window_size:
-                        start_msg = 1
-                    else:
-                        start_msg = len(self.current_chat) - \
-                            self.window_size + 1
-                    end_msg = len(self.current_chat)
-
-                    alert = MonitoringAlert(
-                        timestamp=datetime.now().strftime("%H:%M:%S"),
-                        child_name=sender,
-                        sentiment=results.sentiment,
-                        explanation=results.explanation,
-                        alert_needed=results.alert_needed,
-                        message_range=f"Messages {
-                            start_msg} - {end_msg} (Window of {self.window_size})"
-                    )
-                    self.alert_queue.put(alert)
-                    logging.info(f"Analysis results for messages {
-                                 start_msg}-{end_msg}: {results.sentiment}")
-
-            except queue.Empty:
-                pass
-            finally:
-                if self.running:
-                    self.alice_window.window.after(100, check_analysis)
-
-        self.alice_window.window.after(100, check_analysis)
+        logger.info("Chat system reset")
 
     def signal_handler(self, signum, frame):
         """Handle system signals"""
         print("\nReceived signal to terminate. Cleaning up...")
-        logging.info(f"Received signal {signum}")
+        logger.info(f"Received signal {signum}")
         self.stop_application()
 
     def stop_application(self):
@@ -640,27 +542,34 @@ class MessengerChat:
             return
 
         self.running = False
-        logging.info("Stopping application")
+        logger.info("Stopping application")
 
         if self.async_handler:
+            # Pending repeat counts are sent before the engine stops
+            self.engine.loop.call_soon_threadsafe(self.coalescer.close)
+            self.async_handler.run(self.engine.stop(drain=False))
             self.async_handler.stop()
 
-        for window in [self.parent_window.window, self.bob_window.window, self.alice_window.window]:
+        self.parent_window.drain_alerts()
+        self.parent_window.close_store()
+
+        windows = [self.parent_window.window] + [w.window for w in self.chat_windows.values()]
+        for window in windows:
             try:
                 window.destroy()
             except:
                 pass
 
-        logging.info("Application stopped")
+        logger.info("Application stopped")
         sys.exit(0)
 
     def run(self):
         """Start the application"""
         try:
-            logging.info("Starting application")
+            logger.info("Starting application")
             self.parent_window.window.mainloop()
         except Exception as e:
-            logging.error(f"Application error: {e}")
+            logger.error(f"Application error: {e}")
         finally:
             self.stop_application()
 
@@ -668,20 +577,13 @@ class MessengerChat:
 if __name__ == "__main__":
     try:
         # Configure logging
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('chat_app.log'),
-                logging.StreamHandler()
-            ]
-        )
+        setup_logging()
 
         # Start the application
-        logging.info("Starting Chat Application")
+        logger.info("Starting Chat Application")
         chat_app = MessengerChat()
         chat_app.run()
 
     except Exception as e:
-        logging.error(f"Application failed to start: {e}")
+        logger.error(f"Application failed to start: {e}")
         sys.exit(1)
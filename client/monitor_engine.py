@@ -0,0 +1,194 @@
+# monitor_engine.py
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from alert_store import MonitoringAlert
+from client import ChatMonitorClient, Chat, SentimentResponse
+from tracing import tracer
+from windowing import AnalysisScheduler, AnalysisWindow
+
+logger = logging.getLogger(__name__)
+
+# Receives every alert the engine produces
+AlertSink = Callable[[MonitoringAlert], None]
+# (username, chats, context) -> verdict or None
+Analyzer = Callable[[str, List[Chat], Dict[str, Any]], Awaitable[Optional[SentimentResponse]]]
+
+
+def demo_username(sender: str) -> str:
+    return f"{sender}_demo"
+
+
+def trace_ids_of(chats: List[Chat]) -> List[str]:
+    return [chat.correlation_id for chat in chats if chat.correlation_id]
+
+
+class MonitoringEngine:
+    """Headless monitoring pipeline: windowing, analysis dispatch and alert creation.
+
+    The engine runs entirely on one asyncio event loop. Each window is
+    analyzed in its own task, so thousands of conversations can be
+    monitored in a single process without a thread per analysis. Alerts
+    are handed to every registered sink; sinks are called on the engine's
+    loop and must not block.
+    """
+
+    def __init__(self, client: Optional[ChatMonitorClient] = None,
+                 scheduler: Optional[AnalysisScheduler] = None,
+                 analyzer: Optional[Analyzer] = None,
+                 username_for: Callable[[str], str] = demo_username,
+                 child_id_for: Callable[[str], Optional[int]] = lambda sender: None,
+                 idle_check_interval: float = 1.0):
+        self.client = client
+        self.scheduler = scheduler or AnalysisScheduler()
+        self.analyzer = analyzer
+        self.username_for = username_for
+        self.child_id_for = child_id_for  # Lets the server file verdicts per child account
+        self.idle_check_interval = idle_check_interval
+
+        self.sinks: List[AlertSink] = []
+        self.tasks: Set[asyncio.Task] = set()
+        self.background: List[asyncio.Task] = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+        if self.client is None and self.analyzer is None:
+            self.client = ChatMonitorClient()
+        if self.client is not None:
+            self.client.on_replayed = self.handle_replayed_analysis
+        if self.analyzer is None:
+            self.analyzer = self._analyze_with_client
+
+        self.stats = {"messages": 0, "windows": 0, "alerts": 0}
+
+    def add_sink(self, sink: AlertSink):
+        self.sinks.append(sink)
+
+    async def start(self):
+        """Start the idle flusher and, with a server client, the retry loop;
+        the client connects in the background"""
+        self.loop = asyncio.get_running_loop()
+        self.background.append(asyncio.create_task(self._idle_loop()))
+        if self.client is not None:
+            self.background.append(asyncio.create_task(self.client.warm_up()))
+            self.background.append(asyncio.create_task(self.client.run_retry_loop()))
+        logger.info("MonitoringEngine started")
+
+    async def stop(self, drain: bool = True):
+        """Stop background loops; optionally wait for in-flight analyses"""
+        if drain and self.tasks:
+            await asyncio.gather(*list(self.tasks), return_exceptions=True)
+        for task in self.background:
+            task.cancel()
+        await asyncio.gather(*self.background, return_exceptions=True)
+        self.background.clear()
+        if self.client is not None:
+            await self.client.close()
+        logger.info(f"MonitoringEngine stopped: {self.stats}")
+
+    # Input
+
+    def submit(self, conversation_id: str, sender: str, message: str,
+               correlation_id: Optional[str] = None):
+        """Feed one message; must be called on the engine's loop"""
+        self.stats["messages"] += 1
+        tracer.mark(correlation_id, "engine.received")
+        window = self.scheduler.add_message(
+            conversation_id, Chat(sender=sender, message=message, correlation_id=correlation_id))
+        if window:
+            self._dispatch(window)
+
+    def submit_threadsafe(self, conversation_id: str, sender: str, message: str,
+                          correlation_id: Optional[str] = None):
+        """Feed one message from another thread (e.g. the Tk thread)"""
+        self.loop.call_soon_threadsafe(self.submit, conversation_id, sender, message,
+                                       correlation_id)
+
+    def reset(self, conversation_id: Optional[str] = None):
+        self.scheduler.reset(conversation_id)
+
+    # Analysis
+
+    def _dispatch(self, window: AnalysisWindow):
+        self.stats["windows"] += 1
+        task = asyncio.create_task(self._analyze(window))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _analyze_with_client(self, username: str, chats: List[Chat],
+                                   context: Dict[str, Any]) -> Optional[SentimentResponse]:
+        return await self.client.analyze_chats(username=username, chats=chats, context=context,
+                                               child_id=context.get("child_id"))
+
+    async def _analyze(self, window: AnalysisWindow):
+        """Analyze a window, then any window coalesced while it was in flight"""
+        current = window
+        while current:
+            tracer.mark(trace_ids_of(current.chats), "window.dispatched")
+            try:
+                logger.debug(f"Analyzing {current.conversation_id} {current.message_range}")
+                results = await self.analyzer(
+                    self.username_for(current.sender),
+                    current.chats,
+                    {"sender": current.sender, "message_range": current.message_range,
+                     "child_id": self.child_id_for(current.sender),
+                     "chats": [{"sender": chat.sender, "message": chat.message}
+                               for chat in current.chats]}
+                )
+                if results:
+                    self.scheduler.record_verdict(current.conversation_id, results.sentiment,
+                                                  results.stride_hint)
+                    # Provisional verdicts come from a lexicon; the local fallback's
+                    # are replaced by a "[replayed]" alert later
+                    message_range = current.message_range
+                    if results.provisional:
+                        message_range += " [provisional]"
+                    self.emit(current.sender, message_range, results, current.chats)
+            except Exception as e:
+                logger.error(f"Analysis error: {e}")
+            finally:
+                current = self.scheduler.complete(current.conversation_id)
+
+    async def _idle_loop(self):
+        while True:
+            await asyncio.sleep(self.idle_check_interval)
+            try:
+                for window in self.scheduler.flush_idle():
+                    self._dispatch(window)
+                self.scheduler.evict_idle()
+            except Exception as e:
+                logger.error(f"Idle flush error: {e}")
+
+    def handle_replayed_analysis(self, context: Dict[str, Any], results: SentimentResponse):
+        """Route an analysis recovered from the retry queue into the alert path"""
+        sender = context.get("sender")
+        if not sender:
+            return
+        message_range = context.get("message_range", "")
+        chats = [Chat(**chat) for chat in context.get("chats", [])]
+        self.emit(sender, f"{message_range} [replayed]", results, chats)
+        logger.info(f"Replayed analysis for {sender}: {results.sentiment}")
+
+    # Output
+
+    def emit(self, sender: str, message_range: str, results: SentimentResponse,
+             chats: Optional[List[Chat]] = None):
+        alert = MonitoringAlert(
+            timestamp=datetime.now().strftime("%H:%M:%S"),
+            child_name=sender,
+            sentiment=results.sentiment,
+            explanation=results.explanation,
+            alert_needed=results.alert_needed,
+            message_range=message_range,
+            chats=[{"sender": chat.sender, "message": chat.message} for chat in chats or []],
+            trace_ids=trace_ids_of(chats or [])
+        )
+        tracer.mark(alert.trace_ids, "alert.emitted")
+        self.stats["alerts"] += 1
+        logger.info(f"Analysis results for {message_range}: {results.sentiment}")
+        for sink in self.sinks:
+            try:
+                sink(alert)
+            except Exception as e:
+                logger.error(f"Alert sink error: {e}")
@@ -2,11 +2,21 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
-from typing import Optional, Callable
+from typing import Optional, Callable, Dict, List, Tuple, Iterable
 from dataclasses import dataclass
 import queue
-import json
 import os
+from alert_store import AlertStore, MonitoringAlert
+from ui_queue import drain_queue, schedule_drain
+from risk_aggregates import WINDOWS as RISK_WINDOWS, RiskAggregates
+from exporter import EXPORT_FORMATS, ExportJob, ExportRequest, default_export_path
+from tracing import tracer
+from paths import LOGS_DIR
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 
 class MonitorStyle:
@@ -29,27 +39,44 @@ class MonitorStyle:
 
 
 @dataclass
-class MonitoringAlert:
-    timestamp: str
-    child_name: str
-    sentiment: str
-    explanation: str
-    alert_needed: bool
-    message_range: str = ""
-
-    def to_dict(self):
-        return {
-            "timestamp": self.timestamp,
-            "child_name": self.child_name,
-            "sentiment": self.sentiment,
-            "explanation": self.explanation,
-            "alert_needed": self.alert_needed,
-            "message_range": self.message_range
-        }
+class ChildStatus:
+    name: str
+    sentiment: str = "POSITIVE"
+    alert_needed: bool = False
+    updated: str = ""
+
+
+class ChildStatusRegistry:
+    """Latest status per monitored child, keyed by name"""
+
+    def __init__(self):
+        self.children: Dict[str, ChildStatus] = {}
+
+    def register(self, name: str) -> bool:
+        """Add a child; returns False if it was already registered"""
+        if name in self.children:
+            return False
+        self.children[name] = ChildStatus(name=name)
+        return True
+
+    def update(self, name: str, sentiment: str, alert_needed: bool, updated: str = "") -> bool:
+        """Record a status; returns True if anything visible changed"""
+        self.register(name)
+        status = self.children[name]
+        if (status.sentiment, status.alert_needed, status.updated) == (sentiment, alert_needed, updated):
+            return False
+        status.sentiment = sentiment
+        status.alert_needed = alert_needed
+        status.updated = updated
+        return True
+
+    def names(self) -> List[str]:
+        return list(self.children)
 
 
 class ParentMonitorWindow:
-    def __init__(self, alert_queue: queue.Queue, reset_callback: Optional[Callable] = None):
+    def __init__(self, alert_queue: queue.Queue, reset_callback: Optional[Callable] = None,
+                 children: Iterable[str] = ()):
         self.window = tk.Tk()
         self.window.title("Parent Monitoring Dashboard")
         self.window.geometry(f"{MonitorStyle.WINDOW_WIDTH}x{
@@ -57,16 +84,41 @@ class ParentMonitorWindow:
         self.window.configure(bg=MonitorStyle.BG_COLOR)
 
         self.alert_queue = alert_queue
-        self.alerts = []
         self.monitoring_active = True
         self.reset_callback = reset_callback
-
-        # Create logs directory
-        self.logs_dir = "monitoring_logs"
+        self.status_registry = ChildStatusRegistry()
+
+        # Alert view paging: the widget never holds more than max_alert_rows rows
+        self.alert_page_size = 50
+        self.max_alert_rows = 300
+        self.export_job: Optional[ExportJob] = None
+        self.row_alerts: Dict[str, MonitoringAlert] = {}
+        self.row_order: List[str] = []  # Row ids, newest first
+        self.row_fingerprints: Dict[str, str] = {}  # Fingerprint -> newest row showing it
+        self.loaded_filter: Tuple[Optional[str], Optional[str]] = (None, None)
+        self.view_is_live = True  # Top row is the newest alert
+        self.has_older = False
+        self.loading_older = False
+
+        # Create logs directory and open the alert store
+        self.logs_dir = LOGS_DIR
         os.makedirs(self.logs_dir, exist_ok=True)
+        self.alert_store = AlertStore(os.path.join(self.logs_dir, "alerts.db"))
+        self.alert_store.import_legacy_json(self.logs_dir)
+
+        # Rolling risk counters, restored from their last snapshot
+        self.risk_snapshot_path = os.path.join(self.logs_dir, "risk_snapshot.json")
+        # Background and closing saves share the snapshot's .tmp file
+        self.snapshot_lock = threading.Lock()
+        self.snapshot_saved_at = 0.0
+        self.risk = self.load_risk_aggregates()
+        self.trend_child: Optional[str] = None
 
         self.setup_gui()
+        for name in children:
+            self.register_child(name)
         self.start_alert_checker()
+        self.start_risk_refresher()
         self.load_previous_alerts()
 
         # Handle window closing
@@ -134,12 +186,52 @@ class ParentMonitorWindow:
         )
         monitoring_frame.pack(fill=tk.BOTH, pady=(0, 15))
 
-        # Status indicators
-        self.alice_status = self.create_child_status(monitoring_frame, "Alice")
-        self.alice_status.pack(fill=tk.X, pady=(0, 10))
-
-        self.bob_status = self.create_child_status(monitoring_frame, "Bob")
-        self.bob_status.pack(fill=tk.X)
+        # Status indicators: one Treeview row per child, so only visible rows are drawn
+        status_columns = ("child", "sentiment", "updated", "hour", "day", "week")
+        self.status_display = ttk.Treeview(
+            monitoring_frame,
+            columns=status_columns,
+            show="headings",
+            height=4,
+            selectmode="browse"
+        )
+        for column, heading, width in (
+            ("child", "Child", 110),
+            ("sentiment", "Current Sentiment", 130),
+            ("updated", "Last Analysis", 100),
+            ("hour", "Last Hour", 80),
+            ("day", "Last Day", 80),
+            ("week", "Last Week", 80),
+        ):
+            self.status_display.heading(column, text=heading)
+            self.status_display.column(column, width=width)
+        self.status_display.pack(fill=tk.BOTH, expand=True, side=tk.LEFT)
+
+        status_scrollbar = ttk.Scrollbar(
+            monitoring_frame, command=self.status_display.yview)
+        status_scrollbar.pack(fill=tk.Y, side=tk.RIGHT)
+        self.status_display.configure(yscrollcommand=status_scrollbar.set)
+
+        self.status_display.tag_configure("negative", foreground=MonitorStyle.ALERT_BG)
+        self.status_display.tag_configure("cautionary", foreground=MonitorStyle.WARNING_BG)
+        self.status_display.tag_configure("positive", foreground=MonitorStyle.SAFE_BG)
+        self.status_display.bind("<<TreeviewSelect>>", self.on_status_selected)
+
+        # Trend strip: hourly NEGATIVE / CAUTIONARY counts for the selected child
+        self.trend_label = ttk.Label(
+            main_frame,
+            text="Risk trend (last 24 hours)",
+            font=MonitorStyle.TEXT_FONT
+        )
+        self.trend_label.pack(anchor="w")
+        self.trend_canvas = tk.Canvas(
+            main_frame,
+            height=40,
+            bg=MonitorStyle.BG_COLOR,
+            highlightthickness=0
+        )
+        self.trend_canvas.pack(fill=tk.X, pady=(0, 5))
+        self.trend_canvas.bind("<Configure>", lambda e: self.draw_trend())
 
         # Alerts Section
         alerts_header_frame = ttk.Frame(main_frame)
@@ -157,80 +249,110 @@ class ParentMonitorWindow:
             command=self.export_logs
         ).pack(side=tk.RIGHT)
 
+        # Filters
+        self.child_filter = ttk.Combobox(
+            alerts_header_frame,
+            values=["All"],
+            state="readonly",
+            width=10
+        )
+        self.child_filter.set("All")
+        self.child_filter.pack(side=tk.RIGHT, padx=(0, 10))
+        self.child_filter.bind("<<ComboboxSelected>>", self.on_filter_changed)
+
+        self.sentiment_filter = ttk.Combobox(
+            alerts_header_frame,
+            values=["All", "NEGATIVE", "CAUTIONARY", "POSITIVE"],
+            state="readonly",
+            width=12
+        )
+        self.sentiment_filter.set("All")
+        self.sentiment_filter.pack(side=tk.RIGHT, padx=(0, 10))
+        self.sentiment_filter.bind("<<ComboboxSelected>>", self.on_filter_changed)
+
+        self.latest_button = ttk.Button(
+            alerts_header_frame,
+            text="Show Latest",
+            command=self.reload_alerts
+        )
+
         # Alerts display
         alerts_frame = ttk.Frame(main_frame)
         alerts_frame.pack(fill=tk.BOTH, expand=True)
 
-        self.alerts_display = tk.Text(
+        columns = ("time", "child", "sentiment", "alert", "count", "range", "analysis")
+        self.alerts_display = ttk.Treeview(
             alerts_frame,
-            wrap=tk.WORD,
-            font=MonitorStyle.TEXT_FONT,
+            columns=columns,
+            show="headings",
             height=15,
-            padx=15,
-            pady=10
+            selectmode="browse"
         )
+        for column, heading, width in (
+            ("time", "Time", 70),
+            ("child", "Child", 70),
+            ("sentiment", "Sentiment", 95),
+            ("alert", "Alert", 50),
+            ("count", "Repeats", 60),
+            ("range", "Analysis Range", 140),
+            ("analysis", "Analysis", 300),
+        ):
+            self.alerts_display.heading(column, text=heading)
+            self.alerts_display.column(column, width=width, stretch=(column == "analysis"))
         self.alerts_display.pack(fill=tk.BOTH, expand=True, side=tk.LEFT)
+        self.alerts_display.bind("<<TreeviewSelect>>", self.show_alert_details)
 
-        # Scrollbar
+        # Scrollbar; reaching the bottom pages in older alerts from the store
         scrollbar = ttk.Scrollbar(
             alerts_frame, command=self.alerts_display.yview)
         scrollbar.pack(fill=tk.Y, side=tk.RIGHT)
-        self.alerts_display.configure(yscrollcommand=scrollbar.set)
+
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            if float(last) >= 1.0 and float(first) > 0.0 and self.has_older:
+                self.window.after_idle(self.load_older_alerts)
+
+        self.alerts_display.configure(yscrollcommand=on_scroll)
 
         # Configure tags
         self.alerts_display.tag_configure(
             "negative",
             background=MonitorStyle.ALERT_BG,
-            foreground="white",
-            spacing1=5,
-            spacing3=5
+            foreground="white"
         )
         self.alerts_display.tag_configure(
             "cautionary",
             background=MonitorStyle.WARNING_BG,
-            foreground="black",
-            spacing1=5,
-            spacing3=5
+            foreground="black"
         )
         self.alerts_display.tag_configure(
             "positive",
             background=MonitorStyle.SAFE_BG,
-            foreground="white",
-            spacing1=5,
-            spacing3=5
+            foreground="white"
         )
 
-        self.alerts_display.config(state=tk.DISABLED)
-
-    def create_child_status(self, parent, name):
-        frame = ttk.Frame(parent)
-
-        header = ttk.Label(
-            frame,
-            text=f"{name}'s Chat Status",
-            font=MonitorStyle.TITLE_FONT
-        )
-        header.pack(anchor="w")
-
-        status_frame = ttk.Frame(frame)
-        status_frame.pack(fill=tk.X, pady=5)
-
-        sentiment_label = ttk.Label(
-            status_frame,
-            text="Current Sentiment:",
-            font=MonitorStyle.TEXT_FONT
+        # Full text of the selected alert
+        self.alert_details = ttk.Label(
+            main_frame,
+            text="",
+            font=MonitorStyle.TEXT_FONT,
+            wraplength=MonitorStyle.WINDOW_WIDTH - 60,
+            justify=tk.LEFT
         )
-        sentiment_label.pack(side=tk.LEFT, padx=(0, 5))
+        self.alert_details.pack(fill=tk.X, pady=(10, 0))
 
-        sentiment_value = ttk.Label(
-            status_frame,
-            text="POSITIVE",
-            font=MonitorStyle.TEXT_FONT
+    def register_child(self, name: str):
+        """Add a status row and filter entry for a newly seen child"""
+        if not self.status_registry.register(name):
+            return
+        self.status_display.insert(
+            "", tk.END, iid=name,
+            values=self.status_row_values(name),
+            tags=("positive",)
         )
-        sentiment_value.pack(side=tk.LEFT)
-
-        setattr(self, f"{name.lower()}_sentiment", sentiment_value)
-        return frame
+        self.child_filter.configure(values=["All"] + self.status_registry.names())
+        if self.trend_child is None:
+            self.trend_child = name
 
     def toggle_monitoring(self):
         self.monitoring_active = not self.monitoring_active
@@ -239,6 +361,8 @@ class ParentMonitorWindow:
                 text="Pause Monitoring",
                 bg=MonitorStyle.ALERT_BG
             )
+            # Deliver alerts that queued up while paused
+            self.drain_alerts()
         else:
             self.monitor_button.configure(
                 text="Resume Monitoring",
@@ -254,17 +378,16 @@ class ParentMonitorWindow:
             self.reset_monitoring()
 
     def reset_monitoring(self):
-        # Clear alerts
-        self.alerts = []
-
         # Clear displays
-        self.alerts_display.config(state=tk.NORMAL)
-        self.alerts_display.delete(1.0, tk.END)
-        self.alerts_display.config(state=tk.DISABLED)
+        self.clear_alert_rows()
+        self.has_older = False
+        self.view_is_live = True
+        self.latest_button.pack_forget()
 
         # Reset status indicators
-        self.update_child_status("Alice", "POSITIVE", False)
-        self.update_child_status("Bob", "POSITIVE", False)
+        self.risk.reset()
+        for name in self.status_registry.names():
+            self.update_child_status(name, "POSITIVE", False)
 
         # Save empty state
         self.save_empty_state()
@@ -279,128 +402,501 @@ class ParentMonitorWindow:
         )
 
     def save_empty_state(self):
-        today_file = os.path.join(
-            self.logs_dir,
-            f"alerts_{datetime.now().strftime('%Y%m%d')}.json"
-        )
-        with open(today_file, 'w') as f:
-            json.dump([], f)
-
-    def update_child_status(self, child_name: str, sentiment: str, alert_needed: bool):
-        sentiment_label = getattr(self, f"{child_name.lower()}_sentiment")
-        sentiment_label.configure(text=sentiment)
-
-        color = MonitorStyle.ALERT_BG if alert_needed else (
-            MonitorStyle.WARNING_BG if sentiment == "CAUTIONARY"
-            else MonitorStyle.SAFE_BG
+        self.alert_store.clear_day()
+
+    def update_child_status(self, child_name: str, sentiment: str, alert_needed: bool,
+                            updated: str = ""):
+        """Update one child's row; it is redrawn only when its values changed.
+
+        The registry's changed flag is not enough: the row also shows the
+        rolling risk counts, which move with every alert.
+        """
+        self.register_child(child_name)
+        self.status_registry.update(child_name, sentiment, alert_needed, updated)
+        self.refresh_status_row(child_name)
+
+    def status_row_values(self, child_name: str) -> tuple:
+        status = self.status_registry.children[child_name]
+        now = time.time()
+        risk = []
+        for window in ("hour", "day", "week"):
+            counts = self.risk.counts(child_name, window, now)
+            risk.append(f"N:{counts['NEGATIVE']} C:{counts['CAUTIONARY']}")
+        return (child_name, status.sentiment, status.updated, *risk)
+
+    def refresh_status_row(self, child_name: str):
+        status = self.status_registry.children[child_name]
+        tag = "negative" if status.alert_needed else (
+            "cautionary" if status.sentiment == "CAUTIONARY" else "positive"
         )
-        sentiment_label.configure(foreground=color)
-
-    def add_alert(self, alert: MonitoringAlert):
-        self.alerts.append(alert)
-        self.save_alert(alert)
-
-        if not self.monitoring_active:
+        values = self.status_row_values(child_name)
+        if tuple(self.status_display.item(child_name, "values")) == tuple(str(v) for v in values):
             return
-
-        self.alerts_display.config(state=tk.NORMAL)
-
-        alert_text = (
+        self.status_display.item(child_name, values=values, tags=(tag,))
+
+    def on_status_selected(self, event=None):
+        selection = self.status_display.selection()
+        if selection:
+            self.trend_child = selection[0]
+            self.draw_trend()
+
+    def draw_trend(self):
+        """Draw 24 hourly bars for the selected child, NEGATIVE over CAUTIONARY"""
+        canvas = self.trend_canvas
+        canvas.delete("all")
+        if not self.trend_child:
+            return
+        self.trend_label.configure(
+            text=f"Risk trend for {self.trend_child} (last 24 hours)")
+
+        trend = self.risk.trend(self.trend_child, "day")
+        negative = trend["NEGATIVE"]
+        cautionary = trend["CAUTIONARY"]
+        peak = max([n + c for n, c in zip(negative, cautionary)] + [1])
+
+        width = max(canvas.winfo_width(), 1)
+        height = int(canvas.cget("height"))
+        bar_width = width / len(negative)
+        for i, (n, c) in enumerate(zip(negative, cautionary)):
+            x1 = i * bar_width + 1
+            x2 = (i + 1) * bar_width - 1
+            neg_height = height * n / peak
+            caut_height = height * c / peak
+            if n:
+                canvas.create_rectangle(x1, height - neg_height, x2, height,
+                                        fill=MonitorStyle.ALERT_BG, width=0)
+            if c:
+                canvas.create_rectangle(x1, height - neg_height - caut_height,
+                                        x2, height - neg_height,
+                                        fill=MonitorStyle.WARNING_BG, width=0)
+
+    def load_risk_aggregates(self) -> RiskAggregates:
+        """Restore counters from the snapshot, catching up on alerts stored since.
+
+        Without a snapshot the whole week is rebuilt the same way. Alerts are
+        counted per bucket in SQLite, so neither case replays them one by one.
+        """
+        risk = RiskAggregates.load(self.risk_snapshot_path) or RiskAggregates()
+        now = time.time()
+        for window, (width, size) in RISK_WINDOWS.items():
+            since = max(now - width * size, risk.saved_at)
+            for child_name, sentiment, bucket, count in self.alert_store.bucket_counts(width, since):
+                risk.add(child_name, sentiment, window, bucket * width, count)
+        return risk
+
+    def save_risk_snapshot(self, background: bool = True):
+        snapshot = self.risk.to_dict()
+        if background:
+            threading.Thread(
+                target=self.write_risk_snapshot,
+                args=(snapshot,),
+                daemon=True
+            ).start()
+        else:
+            self.write_risk_snapshot(snapshot)
+
+    def write_risk_snapshot(self, snapshot: Dict):
+        with self.snapshot_lock:
+            # A background save that lost the race must not overwrite a newer snapshot
+            if snapshot["saved_at"] < self.snapshot_saved_at:
+                return
+            try:
+                self.risk.save(self.risk_snapshot_path, snapshot)
+                self.snapshot_saved_at = snapshot["saved_at"]
+            except Exception as e:
+                logger.error(f"Could not save risk snapshot: {e}")
+
+    def start_risk_refresher(self):
+        """Age the rolling counts on screen and snapshot them once a minute"""
+        def refresh():
+            try:
+                for name in self.status_registry.names():
+                    self.refresh_status_row(name)
+                self.draw_trend()
+                self.save_risk_snapshot()
+            except Exception as e:
+                logger.error(f"Risk refresh failed: {e}")
+            self.window.after(60000, refresh)
+
+        self.window.after(60000, refresh)
+
+    def format_alert(self, alert: MonitoringAlert) -> str:
+        return (
             f"[{alert.timestamp}] {alert.child_name}\n"
             f"Analysis Range: {alert.message_range}\n"
             f"Sentiment: {alert.sentiment}\n"
             f"Alert Needed: {'Yes' if alert.alert_needed else 'No'}\n"
-            f"Analysis: {alert.explanation}\n"
-            f"{'-' * 50}\n\n"
+            + (f"Repeated: {alert.repeat_count} times\n" if alert.repeat_count > 1 else "")
+            + f"Analysis: {alert.explanation}"
         )
 
-        tag = alert.sentiment.lower()
+    def current_filter(self) -> Tuple[Optional[str], Optional[str]]:
+        child = self.child_filter.get()
+        sentiment = self.sentiment_filter.get()
+        return (
+            None if child == "All" else child,
+            None if sentiment == "All" else sentiment
+        )
 
-        self.alerts_display.insert("1.0", alert_text, tag)
-        self.alerts_display.see("1.0")
-        self.alerts_display.config(state=tk.DISABLED)
+    @staticmethod
+    def alert_matches(alert: MonitoringAlert, alert_filter) -> bool:
+        child, sentiment = alert_filter
+        return ((child is None or alert.child_name == child) and
+                (sentiment is None or alert.sentiment.upper() == sentiment))
 
-        self.update_child_status(
+    @staticmethod
+    def alert_row_values(alert: MonitoringAlert) -> Tuple:
+        return (
+            alert.timestamp,
             alert.child_name,
             alert.sentiment,
-            alert.alert_needed
+            "Yes" if alert.alert_needed else "No",
+            f"x{alert.repeat_count}" if alert.repeat_count > 1 else "",
+            alert.message_range,
+            alert.explanation.replace("\n", " ")
         )
 
-    def save_alert(self, alert: MonitoringAlert):
-        filename = os.path.join(
-            self.logs_dir,
-            f"alerts_{datetime.now().strftime('%Y%m%d')}.json"
+    def insert_alert_row(self, alert: MonitoringAlert, at_top: bool) -> str:
+        """Add one row; rows outside the current filter are kept detached"""
+        iid = self.alerts_display.insert(
+            "",
+            0 if at_top else tk.END,
+            values=self.alert_row_values(alert),
+            tags=(alert.sentiment.lower(),)
         )
+        self.row_alerts[iid] = alert
+        if alert.fingerprint and (at_top or alert.fingerprint not in self.row_fingerprints):
+            self.row_fingerprints[alert.fingerprint] = iid
+        if at_top:
+            self.row_order.insert(0, iid)
+        else:
+            self.row_order.append(iid)
+        if not self.alert_matches(alert, self.current_filter()):
+            self.alerts_display.detach(iid)
+        return iid
+
+    def trim_alert_rows(self, from_top: bool):
+        """Drop rows beyond max_alert_rows from one end of the view"""
+        excess = len(self.row_order) - self.max_alert_rows
+        if excess <= 0:
+            return
+        if from_top:
+            dropped = self.row_order[:excess]
+            self.row_order = self.row_order[excess:]
+            self.view_is_live = False
+            self.latest_button.pack(side=tk.RIGHT, padx=(0, 10))
+        else:
+            dropped = self.row_order[-excess:]
+            self.row_order = self.row_order[:-excess]
+            self.has_older = True
+        self.alerts_display.delete(*dropped)
+        for iid in dropped:
+            alert = self.row_alerts.pop(iid, None)
+            if alert and self.row_fingerprints.get(alert.fingerprint) == iid:
+                del self.row_fingerprints[alert.fingerprint]
+
+    def update_merged_row(self, alert: MonitoringAlert) -> bool:
+        """Show a merged repeat on the row it was merged into, if that row is loaded"""
+        iid = self.row_fingerprints.get(alert.fingerprint)
+        if iid is None:
+            return False
+        stored = self.row_alerts[iid]
+        # Updated in place, as the store's _merge does: the row keeps its severity,
+        # creation time and id (set by the writer once the row is committed)
+        for name in ("repeat_count", "timestamp", "explanation", "message_range", "chats"):
+            setattr(stored, name, getattr(alert, name))
+        self.alerts_display.item(iid, values=self.alert_row_values(stored))
+        return True
+
+    def clear_alert_rows(self):
+        if self.row_order:
+            self.alerts_display.delete(*self.row_order)
+        self.row_order = []
+        self.row_alerts = {}
+        self.row_fingerprints = {}
+
+    def reload_alerts(self):
+        """Show the newest page of stored alerts for the current filter"""
+        self.clear_alert_rows()
+        alert_filter = self.current_filter()
+        page = self.alert_store.query(
+            child_name=alert_filter[0],
+            sentiment=alert_filter[1],
+            limit=self.alert_page_size
+        )
+        for alert in page:
+            self.insert_alert_row(alert, at_top=False)
+        self.loaded_filter = alert_filter
+        self.has_older = len(page) == self.alert_page_size
+        self.view_is_live = True
+        self.latest_button.pack_forget()
+
+    def load_older_alerts(self):
+        """Append the next page of older alerts from the store"""
+        if self.loading_older or not self.has_older:
+            return
+        self.loading_older = True
+        try:
+            cursor = self.older_cursor()
+            if self.row_order and cursor is None:
+                self.has_older = False  # None of the loaded rows was stored
+                return
+            page = self.alert_store.query(
+                child_name=self.loaded_filter[0],
+                sentiment=self.loaded_filter[1],
+                before=cursor,
+                limit=self.alert_page_size
+            )
+            self.has_older = len(page) == self.alert_page_size
+            if not page:
+                return
+            first_new = None
+            for alert in page:
+                iid = self.insert_alert_row(alert, at_top=False)
+                first_new = first_new or iid
+            self.trim_alert_rows(from_top=True)
+            # Keep the page boundary in view so scrolling does not cascade
+            if self.alerts_display.exists(first_new):
+                self.alerts_display.see(first_new)
+        finally:
+            self.loading_older = False
+
+    def older_cursor(self) -> Optional[Tuple[float, int]]:
+        """Store key (created_at, id) of the oldest loaded row that was stored.
+
+        Rows shown live only get their id once the writer commits them, so
+        the store is flushed before one is used. The key is read back from
+        the store: a repeat shown as a new row carries its stored row's id
+        but its own creation time.
+        """
+        flushed = False
+        for iid in reversed(self.row_order):
+            alert = self.row_alerts[iid]
+            if alert.alert_id is None and not flushed:
+                self.alert_store.flush()
+                flushed = True
+            if alert.alert_id is not None:
+                key = self.alert_store.key_of(alert.alert_id)
+                if key is not None:
+                    return key
+        return None
+
+    def on_filter_changed(self, event=None):
+        """Apply a filter by detaching rows when possible, else reload one page"""
+        new_filter = self.current_filter()
+        loaded_child, loaded_sentiment = self.loaded_filter
+        narrows = ((loaded_child is None or loaded_child == new_filter[0]) and
+                   (loaded_sentiment is None or loaded_sentiment == new_filter[1]))
+        if not narrows:
+            self.reload_alerts()
+            return
+
+        index = 0
+        for iid in self.row_order:
+            if self.alert_matches(self.row_alerts[iid], new_filter):
+                self.alerts_display.move(iid, "", index)
+                index += 1
+            else:
+                self.alerts_display.detach(iid)
+        if index < self.alert_page_size and self.has_older:
+            self.reload_alerts()
+
+    def show_alert_details(self, event=None):
+        selection = self.alerts_display.selection()
+        alert = self.row_alerts.get(selection[0]) if selection else None
+        self.alert_details.configure(text=self.format_alert(alert) if alert else "")
 
-        existing_alerts = []
-        if os.path.exists(filename):
-            with open(filename, 'r') as f:
-                existing_alerts = json.load(f)
+    def add_alert(self, alert: MonitoringAlert):
+        self.add_alerts([alert])
 
-        existing_alerts.append(alert.to_dict())
+    def add_alerts(self, alerts: List[MonitoringAlert]):
+        """Store and show a batch of alerts with one view and status update"""
+        self.alert_store.append_many(alerts)
+        # Merged repeats update an existing alert rather than adding one
+        new_alerts = [alert for alert in alerts if alert.repeat_count <= 1]
+        for alert in new_alerts:
+            self.risk.record(alert.child_name, alert.sentiment, alert.created_at)
 
-        with open(filename, 'w') as f:
-            json.dump(existing_alerts, f, indent=2)
+        if not self.monitoring_active:
+            return
+
+        for alert in alerts:
+            if alert.repeat_count > 1 and not self.update_merged_row(alert):
+                new_alerts.append(alert)  # Its row is not loaded; show it as new
+
+        # Rows outside the loaded page or filter stay in the store only
+        if self.view_is_live:
+            shown = [a for a in new_alerts if self.alert_matches(a, self.loaded_filter)]
+            for alert in shown:
+                self.insert_alert_row(alert, at_top=True)
+            if shown:
+                self.trim_alert_rows(from_top=False)
+                self.alerts_display.yview_moveto(0)
+
+        # Only the latest new alert per child decides its status
+        latest = {alert.child_name: alert for alert in alerts if alert.repeat_count <= 1}
+        for alert in latest.values():
+            self.update_child_status(
+                alert.child_name,
+                alert.sentiment,
+                alert.alert_needed,
+                alert.timestamp
+            )
+        if self.trend_child in latest:
+            self.draw_trend()
+        for alert in alerts:
+            tracer.mark(alert.trace_ids, "alert.displayed")
+
+    def save_alert(self, alert: MonitoringAlert):
+        self.alert_store.append(alert)
 
     def load_previous_alerts(self):
-        today_file = os.path.join(
-            self.logs_dir,
-            f"alerts_{datetime.now().strftime('%Y%m%d')}.json"
-        )
-        if os.path.exists(today_file):
-            with open(today_file, 'r') as f:
-                alerts = json.load(f)
-                for alert_data in alerts:
-                    alert = MonitoringAlert(**alert_data)
-                    self.add_alert(alert)
+        """Show the most recent stored alerts without writing anything back.
+
+        Only one page is read from the store; child status comes from the
+        store's summary table, so startup cost does not grow with history.
+        """
+        self.reload_alerts()
+
+        for child_name, (sentiment, alert_needed) in self.alert_store.latest_status().items():
+            self.update_child_status(child_name, sentiment, alert_needed)
 
     def export_logs(self):
-        filename = f"monitoring_export_{
-            datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-
-        with open(filename, 'w') as f:
-            f.write("Chat Monitoring Logs\n")
-            f.write("=" * 50 + "\n\n")
-
-            for alert in self.alerts:
-                f.write(f"Time: {alert.timestamp}\n")
-                f.write(f"Child: {alert.child_name}\n")
-                f.write(f"Message Range: {alert.message_range}\n")
-                f.write(f"Sentiment: {alert.sentiment}\n")
-                f.write(f"Alert Needed: {
-                        'Yes' if alert.alert_needed else 'No'}\n")
-                f.write(f"Analysis: {alert.explanation}\n")
-                f.write("-" * 50 + "\n\n")
+        """Open the export dialog; the export itself runs off the UI thread"""
+        if self.export_job and not self.export_job.finished:
+            messagebox.showinfo("Export Running", "An export is already in progress.")
+            return
 
-        messagebox.showinfo(
-            "Export Complete",
-            f"Logs exported to {filename}"
+        dialog = tk.Toplevel(self.window)
+        dialog.title("Export Logs")
+        dialog.transient(self.window)
+        form = ttk.Frame(dialog, padding="15")
+        form.pack(fill=tk.BOTH, expand=True)
+
+        fields = {}
+        rows = (
+            ("From (YYYY-MM-DD)", ttk.Entry(form, width=20)),
+            ("To (YYYY-MM-DD)", ttk.Entry(form, width=20)),
+            ("Child", ttk.Combobox(form, state="readonly", width=18,
+                                   values=["All"] + self.status_registry.names())),
+            ("Sentiment", ttk.Combobox(form, state="readonly", width=18,
+                                       values=["All", "NEGATIVE", "CAUTIONARY", "POSITIVE"])),
+            ("Format", ttk.Combobox(form, state="readonly", width=18,
+                                    values=list(EXPORT_FORMATS))),
         )
+        for row, (label, widget) in enumerate(rows):
+            ttk.Label(form, text=label, font=MonitorStyle.TEXT_FONT).grid(
+                row=row, column=0, sticky="w", pady=3)
+            widget.grid(row=row, column=1, sticky="ew", pady=3)
+            fields[label.split(" ")[0]] = widget
+        fields["Child"].set("All")
+        fields["Sentiment"].set("All")
+        fields["Format"].set("jsonl")
+
+        progress = ttk.Progressbar(form, mode="determinate", length=250)
+        progress.grid(row=len(rows), column=0, columnspan=2, sticky="ew", pady=(10, 3))
+        status = ttk.Label(form, text="", font=MonitorStyle.TEXT_FONT)
+        status.grid(row=len(rows) + 1, column=0, columnspan=2, sticky="w")
+
+        buttons = ttk.Frame(form)
+        buttons.grid(row=len(rows) + 2, column=0, columnspan=2, pady=(10, 0))
+
+        def parse_day(text: str, end: bool = False) -> Optional[float]:
+            text = text.strip()
+            if not text:
+                return None
+            day = datetime.strptime(text, "%Y-%m-%d")
+            return day.timestamp() + (86400 if end else 0)
+
+        def start():
+            try:
+                since = parse_day(fields["From"].get())
+                until = parse_day(fields["To"].get(), end=True)
+            except ValueError:
+                messagebox.showerror("Invalid Date", "Dates must look like 2024-11-09.",
+                                     parent=dialog)
+                return
+            child = fields["Child"].get()
+            sentiment = fields["Sentiment"].get()
+            fmt = fields["Format"].get()
+            self.export_job = ExportJob(self.alert_store, ExportRequest(
+                path=default_export_path(fmt),
+                fmt=fmt,
+                child_name=None if child == "All" else child,
+                sentiment=None if sentiment == "All" else sentiment,
+                since=since,
+                until=until
+            ))
+            self.export_job.start()
+            start_button.configure(state=tk.DISABLED)
+            cancel_button.configure(text="Cancel Export")
+            dialog.after(100, poll)
+
+        def poll():
+            job = self.export_job
+            for event in drain_queue(job.events):
+                kind = event[0]
+                if kind == "progress":
+                    _, done, total = event
+                    progress.configure(maximum=max(total, 1), value=done)
+                    status.configure(text=f"Exported {done} of {total} alerts")
+                elif kind == "done":
+                    messagebox.showinfo("Export Complete",
+                                        f"{event[2]} alerts exported to {event[1]}",
+                                        parent=dialog)
+                elif kind == "cancelled":
+                    status.configure(text=f"Export cancelled after {event[2]} alerts")
+                elif kind == "error":
+                    messagebox.showerror("Export Failed", event[2], parent=dialog)
+            if job.finished and job.events.empty():
+                start_button.configure(state=tk.NORMAL)
+                cancel_button.configure(text="Close")
+            else:
+                dialog.after(100, poll)
+
+        def cancel():
+            if self.export_job and not self.export_job.finished:
+                self.export_job.cancel()
+            else:
+                dialog.destroy()
+
+        start_button = ttk.Button(buttons, text="Start Export", command=start)
+        start_button.pack(side=tk.LEFT, padx=5)
+        cancel_button = ttk.Button(buttons, text="Close", command=cancel)
+        cancel_button.pack(side=tk.LEFT, padx=5)
+        dialog.protocol("WM_DELETE_WINDOW", cancel)
 
     def start_alert_checker(self):
-        def check_alerts():
-            if self.monitoring_active:
-                try:
-                    alert = self.alert_queue.get_nowait()
-                    if alert:
-                        self.add_alert(alert)
-                except queue.Empty:
-                    pass
-            self.window.after(100, check_alerts)
-
-        self.window.after(100, check_alerts)
+        self.drain_alerts = schedule_drain(
+            self.window,
+            self.alert_queue,
+            self.add_alerts,
+            can_drain=lambda: self.monitoring_active
+        )
 
     def on_closing(self):
         if messagebox.askokcancel("Quit", "Do you want to stop monitoring?"):
             self.monitoring_active = False
+            self.close_store()
             self.window.destroy()
 
+    def close_store(self):
+        """Flush pending alerts to disk and close the store"""
+        try:
+            self.save_risk_snapshot(background=False)
+            self.alert_store.flush()
+            self.alert_store.close()
+        except Exception as e:
+            logger.error(f"Could not close the alert store: {e}")
+
     def run(self):
         self.window.mainloop()
 
 
 if __name__ == "__main__":
     # Test code
+    from logging_config import setup_logging
+    setup_logging()
     test_queue = queue.Queue()
     window = ParentMonitorWindow(test_queue)
     window.run()
@@ -0,0 +1,13 @@
+# paths.py
+import os
+
+# Default locations for the client's files. They are resolved relative to this
+# package, not the working directory, so every entry point finds the same stores.
+CLIENT_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGS_DIR = os.getenv("WATCHPOINT_LOGS_DIR", os.path.join(CLIENT_DIR, "monitoring_logs"))
+FAMILY_PATH = os.getenv("WATCHPOINT_FAMILY", os.path.join(CLIENT_DIR, "family.json"))
+
+
+def logs_path(name: str) -> str:
+    """Return the default path of a file in the monitoring logs directory."""
+    return os.path.join(LOGS_DIR, name)
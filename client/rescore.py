@@ -0,0 +1,416 @@
+# rescore.py
+"""Re-score archived conversations after a model or lexicon change.
+
+Two kinds of archive are read, both streamed record by record:
+    *.db     alert stores; every alert that kept its analyzed window is
+             scored again and compared with the stored verdict
+    *.jsonl  conversation logs in the headless input format, windowed the
+             same way the live engine does
+
+Archives are cut into shards (id ranges of a store, byte ranges of a
+log) and scored on a process pool. Shards do not depend on the number of
+workers, and each finished shard leaves a checkpoint in the output
+directory, so an interrupted run picks up where it stopped, with any
+--workers. Verdicts that changed are written to
+changes.jsonl and summarized in report.json.
+
+    python rescore.py monitoring_logs/alerts.db --out rescore_out
+    python rescore.py monitoring_logs chats.jsonl --workers 8 --backend server
+    python rescore.py monitoring_logs --backend local
+    python rescore.py monitoring_logs --out rescore_out --restart
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httpx
+
+from client import Chat, SentimentResponse
+from local_classifier import classify_chats
+from logging_config import setup_logging
+from monitor_engine import demo_username
+from windowing import AnalysisScheduler
+
+logger = logging.getLogger("rescore")
+
+# Bytes of a log read before a shard's range, only as context for its first windows
+LOG_LEAD_IN = 64 * 1024
+
+
+@dataclass
+class Shard:
+    kind: str  # "db" or "log"
+    path: str
+    start: int = 0  # db: first alert id; log: first byte
+    end: int = 0  # db: last alert id; log: end byte (exclusive)
+
+    @property
+    def shard_id(self) -> str:
+        name = os.path.basename(self.path).replace(".", "_")
+        digest = zlib.crc32(os.path.abspath(self.path).encode()) & 0xffff
+        return f"{name}_{digest:04x}_{self.kind}_{self.start}_{self.end}"
+
+
+@dataclass
+class RescoreItem:
+    key: str
+    child_name: str
+    message_range: str
+    chats: List[Dict[str, str]]
+    old_sentiment: Optional[str] = None
+    old_alert_needed: Optional[bool] = None
+
+
+@dataclass
+class ShardTask:
+    shard: Shard
+    out_dir: str
+    backend: str = "server"
+    backend_options: Dict[str, Any] = field(default_factory=dict)
+    batch_size: int = 32
+    window_size: int = 3
+
+
+# Archive readers
+
+def plan_db_shards(path: str, shard_size: int) -> List[Shard]:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        low, high = conn.execute("SELECT MIN(id), MAX(id) FROM alerts").fetchone()
+    finally:
+        conn.close()
+    if low is None:
+        return []
+    return [Shard("db", path, start, min(start + shard_size - 1, high))
+            for start in range(low, high + 1, shard_size)]
+
+
+def plan_log_shards(path: str, shard_bytes: int) -> List[Shard]:
+    size = os.path.getsize(path)
+    return [Shard("log", path, start, min(start + shard_bytes, size))
+            for start in range(0, size, shard_bytes)]
+
+
+def plan_shards(paths: List[str], shard_size: int, log_shard_bytes: int) -> List[Shard]:
+    """Expand files and directories into shards"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.db"))))
+            files.extend(sorted(glob.glob(os.path.join(path, "*.jsonl"))))
+        else:
+            files.append(path)
+
+    shards = []
+    for path in files:
+        if path.endswith(".db"):
+            try:
+                shards.extend(plan_db_shards(path, shard_size))
+            except sqlite3.Error as e:
+                logger.warning(f"Skipping {path}: not an alert store ({e})")
+        elif path.endswith(".jsonl"):
+            shards.extend(plan_log_shards(path, log_shard_bytes))
+        else:
+            logger.warning(f"Skipping {path}: unknown archive type")
+    return shards
+
+
+def iter_db_items(shard: Shard) -> Iterator[RescoreItem]:
+    conn = sqlite3.connect(f"file:{shard.path}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute(
+            "SELECT id, child_name, message_range, sentiment, alert_needed, chats "
+            "FROM alerts WHERE id BETWEEN ? AND ? ORDER BY id",
+            (shard.start, shard.end)
+        )
+        while True:
+            rows = cursor.fetchmany(500)
+            if not rows:
+                break
+            for alert_id, child_name, message_range, sentiment, alert_needed, chats in rows:
+                yield RescoreItem(
+                    key=f"{shard.path}#{alert_id}",
+                    child_name=child_name,
+                    message_range=message_range,
+                    chats=json.loads(chats) if chats else [],
+                    old_sentiment=sentiment,
+                    old_alert_needed=bool(alert_needed)
+                )
+    finally:
+        conn.close()
+
+
+def iter_log_items(shard: Shard, window_size: int) -> Iterator[RescoreItem]:
+    """Window the messages of one byte range of a message log.
+
+    A line belongs to the shard its first byte falls in. The LOG_LEAD_IN
+    bytes before the range are read as well, so the first windows have
+    their context, but only windows closed by a message of the shard are
+    scored; they are keyed by that message's byte offset.
+    """
+    # A fixed stride: verdicts are not fed back, so windows match a fresh run
+    scheduler = AnalysisScheduler(window_size=window_size, idle_timeout=0)
+    last_offset: Dict[str, int] = {}  # Conversation -> offset of its latest message
+
+    def to_item(window, offset: int) -> Optional[RescoreItem]:
+        scheduler.complete(window.conversation_id)
+        if offset < shard.start:
+            return None  # Closed in the lead-in; the previous shard scores it
+        return RescoreItem(
+            key=f"{shard.path}@{offset}#{window.conversation_id}",
+            child_name=window.sender,
+            message_range=window.message_range,
+            chats=[{"sender": chat.sender, "message": chat.message} for chat in window.chats]
+        )
+
+    with open(shard.path, "rb") as f:
+        position = max(0, shard.start - LOG_LEAD_IN)
+        f.seek(position)
+        if position:
+            position += len(f.readline())  # Skip to the first whole line
+        while position < shard.end:
+            line = f.readline()
+            if not line:
+                break
+            offset = position
+            position += len(line)
+            try:
+                record = json.loads(line)
+                sender = record["sender"]
+                conversation_id = record.get("conversation") or sender
+                message = record["message"]
+            except (ValueError, KeyError):
+                continue
+            last_offset[conversation_id] = offset
+            window = scheduler.add_message(conversation_id, Chat(sender=sender, message=message))
+            item = to_item(window, offset) if window else None
+            if item:
+                yield item
+
+    # Trailing partial windows, as the idle flush would release them
+    for window in scheduler.flush_idle(now=float("inf")):
+        item = to_item(window, last_offset[window.conversation_id])
+        if item:
+            yield item
+
+
+def iter_items(shard: Shard, window_size: int) -> Iterator[RescoreItem]:
+    if shard.kind == "db":
+        return iter_db_items(shard)
+    return iter_log_items(shard, window_size)
+
+
+# Analyzer backends
+
+class ServerBackend:
+    """Scores windows through the server's batch endpoint"""
+
+    def __init__(self, server_url: str = "http://localhost:8000", timeout: float = 120.0,
+                 token: Optional[str] = None):
+        self.server_url = server_url
+        token = token or os.getenv("WATCHPOINT_API_TOKEN")
+        self.http = httpx.Client(timeout=timeout,
+                                 headers={"Authorization": f"Bearer {token}"} if token else None)
+
+    def analyze_batch(self, items: List[RescoreItem]) -> List[Optional[SentimentResponse]]:
+        payload = [{"username": demo_username(item.child_name), "chats": item.chats}
+                   for item in items]
+        response = self.http.post(f"{self.server_url}/analyze_chats/batch", json=payload)
+        response.raise_for_status()
+        return [SentimentResponse(**result) if result else None for result in response.json()]
+
+    def close(self):
+        self.http.close()
+
+
+class LocalBackend:
+    """Scores windows with the bundled keyword classifier (no server needed)"""
+
+    def analyze_batch(self, items: List[RescoreItem]) -> List[Optional[SentimentResponse]]:
+        return [classify_chats([Chat(**chat) for chat in item.chats]) for item in items]
+
+    def close(self):
+        pass
+
+
+# name -> factory taking the --backend-option values
+BACKENDS: Dict[str, Callable[..., Any]] = {
+    "server": ServerBackend,
+    "local": LocalBackend,
+}
+
+
+# Scoring
+
+def _batches(items: Iterator[RescoreItem], size: int) -> Iterator[List[RescoreItem]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _scorable(items: Iterator[RescoreItem], stats: Dict[str, Any]) -> Iterator[RescoreItem]:
+    """Drop alerts archived before their windows were stored"""
+    for item in items:
+        if item.chats:
+            yield item
+        else:
+            stats["skipped"] += 1
+
+
+def checkpoint_path(out_dir: str, shard: Shard) -> str:
+    return os.path.join(out_dir, "shards", f"{shard.shard_id}.done.json")
+
+
+def changes_path(out_dir: str, shard: Shard) -> str:
+    return os.path.join(out_dir, "shards", f"{shard.shard_id}.changes.jsonl")
+
+
+def rescore_shard(task: ShardTask) -> Dict[str, Any]:
+    """Score one shard in a worker process and write its changes and checkpoint"""
+    shard = task.shard
+    stats = {"shard": shard.shard_id, "scanned": 0, "skipped": 0, "failed": 0,
+             "changed": 0, "transitions": {}}
+    backend = BACKENDS[task.backend](**task.backend_options)
+    part_path = changes_path(task.out_dir, shard) + ".part"
+    started = time.perf_counter()
+    try:
+        with open(part_path, "w", encoding="utf-8") as out:
+            for batch in _batches(_scorable(iter_items(shard, task.window_size), stats),
+                                  task.batch_size):
+                results = backend.analyze_batch(batch)
+                for item, result in zip(batch, results):
+                    stats["scanned"] += 1
+                    if result is None:
+                        stats["failed"] += 1
+                        continue
+                    new_sentiment = result.sentiment.upper()
+                    if (new_sentiment == item.old_sentiment
+                            and result.alert_needed == item.old_alert_needed):
+                        continue
+                    stats["changed"] += 1
+                    transition = f"{item.old_sentiment or 'UNSCORED'}->{new_sentiment}"
+                    stats["transitions"][transition] = stats["transitions"].get(transition, 0) + 1
+                    out.write(json.dumps({
+                        "key": item.key,
+                        "child_name": item.child_name,
+                        "message_range": item.message_range,
+                        "old": {"sentiment": item.old_sentiment,
+                                "alert_needed": item.old_alert_needed},
+                        "new": {"sentiment": new_sentiment,
+                                "alert_needed": result.alert_needed},
+                        "explanation": result.explanation
+                    }) + "\n")
+    finally:
+        backend.close()
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    os.replace(part_path, changes_path(task.out_dir, shard))
+    # Shards with failed items are left unchecked so a resumed run retries them
+    if not stats["failed"]:
+        with open(checkpoint_path(task.out_dir, shard), "w") as f:
+            json.dump(stats, f)
+    return stats
+
+
+def write_report(out_dir: str, shards: List[Shard]) -> Dict[str, Any]:
+    """Merge per-shard changes and checkpoints into changes.jsonl and report.json"""
+    report = {"shards": len(shards), "completed": 0, "scanned": 0, "skipped": 0,
+              "failed": 0, "changed": 0, "transitions": {}}
+    with open(os.path.join(out_dir, "changes.jsonl"), "w", encoding="utf-8") as merged:
+        for shard in shards:
+            path = checkpoint_path(out_dir, shard)
+            if not os.path.exists(path):
+                continue
+            with open(path, "r") as f:
+                stats = json.load(f)
+            report["completed"] += 1
+            for key in ("scanned", "skipped", "failed", "changed"):
+                report[key] += stats[key]
+            for transition, n in stats["transitions"].items():
+                report["transitions"][transition] = report["transitions"].get(transition, 0) + n
+            with open(changes_path(out_dir, shard), "r", encoding="utf-8") as changes:
+                shutil.copyfileobj(changes, merged)
+
+    with open(os.path.join(out_dir, "report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def run(paths: List[str], out_dir: str, backend: str = "server",
+        backend_options: Optional[Dict[str, Any]] = None, workers: int = 4,
+        shard_size: int = 1000, batch_size: int = 32, window_size: int = 3,
+        restart: bool = False, log_shard_bytes: int = 8 * 1024 * 1024) -> Dict[str, Any]:
+    if restart and os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(os.path.join(out_dir, "shards"), exist_ok=True)
+
+    shards = plan_shards(paths, shard_size, log_shard_bytes)
+    pending = [shard for shard in shards if not os.path.exists(checkpoint_path(out_dir, shard))]
+    logger.info(f"{len(shards)} shards, {len(shards) - len(pending)} already done")
+    print(f"Re-scoring {len(pending)} of {len(shards)} shards with {workers} workers")
+
+    tasks = [ShardTask(shard, out_dir, backend, backend_options or {},
+                       batch_size, window_size) for shard in pending]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(rescore_shard, task): task.shard for task in tasks}
+        for done, future in enumerate(as_completed(futures), 1):
+            shard = futures[future]
+            try:
+                stats = future.result()
+                print(f"[{done}/{len(tasks)}] {shard.shard_id}: {stats['scanned']} scored, "
+                      f"{stats['changed']} changed, {stats['failed']} failed")
+            except Exception as e:
+                logger.error(f"Shard {shard.shard_id} failed: {e}")
+                print(f"[{done}/{len(tasks)}] {shard.shard_id}: error: {e}")
+
+    return write_report(out_dir, shards)
+
+
+def parse_options(values: List[str]) -> Dict[str, Any]:
+    """key=value pairs; values are read as JSON when possible"""
+    options = {}
+    for value in values:
+        key, _, raw = value.partition("=")
+        try:
+            options[key] = json.loads(raw)
+        except ValueError:
+            options[key] = raw
+    return options
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score archived WatchPoint conversations")
+    parser.add_argument("paths", nargs="+", help="Alert stores, conversation logs or directories")
+    parser.add_argument("--out", default="rescore_out")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="server")
+    parser.add_argument("--backend-option", action="append", default=[], metavar="KEY=VALUE",
+                        help="e.g. server_url=http://localhost:8000")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--shard-size", type=int, default=1000, help="Alerts per store shard")
+    parser.add_argument("--log-shard-bytes", type=int, default=8 * 1024 * 1024,
+                        help="Bytes of a conversation log per shard")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--window-size", type=int, default=3)
+    parser.add_argument("--restart", action="store_true", help="Ignore existing checkpoints")
+    args = parser.parse_args()
+
+    setup_logging(console=False)
+
+    report = run(args.paths, args.out, args.backend, parse_options(args.backend_option),
+                 args.workers, args.shard_size, args.batch_size, args.window_size,
+                 args.restart, args.log_shard_bytes)
+    print(json.dumps(report, indent=2))
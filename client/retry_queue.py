@@ -0,0 +1,143 @@
+# retry_queue.py
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from paths import logs_path
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingRequest:
+    id: int
+    payload: Dict[str, Any]
+    context: Dict[str, Any]
+    attempts: int
+
+
+class OfflineRetryQueue:
+    """Disk-backed queue of analysis requests that could not be delivered.
+
+    Entries live in a small SQLite database so they survive restarts. Only
+    one batch is held in memory at a time and the number of pending entries
+    is capped; when the cap is hit the oldest entries are dropped.
+    """
+
+    def __init__(self, db_path: Optional[str] = None,
+                 max_pending: int = 5000, base_delay: float = 1.0,
+                 max_delay: float = 300.0):
+        db_path = db_path or logs_path("retry_queue.db")
+        self.db_path = db_path
+        self.max_pending = max_pending
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pending (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                context TEXT NOT NULL DEFAULT '{}',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_pending_next ON pending(next_attempt)")
+        self.conn.commit()
+        logger.info(f"OfflineRetryQueue opened at {db_path} with {len(self)} pending")
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def push(self, payload: Dict[str, Any], context: Optional[Dict[str, Any]] = None):
+        """Persist a payload for later delivery"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO pending (payload, context, next_attempt, created) VALUES (?, ?, ?, ?)",
+                (json.dumps(payload), json.dumps(context or {}), now, now)
+            )
+            overflow = self.conn.execute(
+                "SELECT COUNT(*) FROM pending").fetchone()[0] - self.max_pending
+            if overflow > 0:
+                self.conn.execute(
+                    "DELETE FROM pending WHERE id IN "
+                    "(SELECT id FROM pending ORDER BY id LIMIT ?)",
+                    (overflow,)
+                )
+                logger.warning(f"Retry queue full, dropped {overflow} oldest entries")
+            self.conn.commit()
+
+    def due(self, limit: int) -> List[PendingRequest]:
+        """Return up to `limit` entries whose backoff has expired"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, payload, context, attempts FROM pending "
+                "WHERE next_attempt <= ? ORDER BY id LIMIT ?",
+                (time.time(), limit)
+            ).fetchall()
+        return [
+            PendingRequest(id=row[0], payload=json.loads(row[1]),
+                           context=json.loads(row[2]), attempts=row[3])
+            for row in rows
+        ]
+
+    def complete(self, ids: List[int]):
+        """Remove delivered entries"""
+        if not ids:
+            return
+        with self.lock:
+            self.conn.executemany(
+                "DELETE FROM pending WHERE id = ?", [(i,) for i in ids])
+            self.conn.commit()
+
+    def reschedule(self, entries: List[PendingRequest]):
+        """Push failed entries back with exponential backoff and full jitter"""
+        if not entries:
+            return
+        now = time.time()
+        updates = []
+        for entry in entries:
+            attempts = entry.attempts + 1
+            ceiling = min(self.max_delay, self.base_delay * (2 ** attempts))
+            delay = random.uniform(self.base_delay, max(self.base_delay, ceiling))
+            updates.append((attempts, now + delay, entry.id))
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE pending SET attempts = ?, next_attempt = ? WHERE id = ?", updates)
+            self.conn.commit()
+
+    def retry_now(self):
+        """Make every entry due immediately, e.g. once the server is reachable again"""
+        with self.lock:
+            self.conn.execute("UPDATE pending SET next_attempt = ?", (time.time(),))
+            self.conn.commit()
+
+    def next_due_in(self) -> Optional[float]:
+        """Seconds until the next entry becomes due, or None if the queue is empty"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MIN(next_attempt) FROM pending").fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,161 @@
+# risk_aggregates.py
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SENTIMENTS = ("NEGATIVE", "CAUTIONARY", "POSITIVE")
+
+# name -> (bucket width in seconds, number of buckets)
+WINDOWS = {
+    "hour": (60, 60),
+    "day": (3600, 24),
+    "week": (86400, 7),
+}
+
+
+class RollingCounter:
+    """Fixed ring of time buckets; adding is O(1), totals cost O(buckets)"""
+
+    def __init__(self, width: int, size: int):
+        self.width = width
+        self.size = size
+        self.stamps = [-1] * size  # Absolute bucket number held by each slot
+        self.counts = [0] * size
+
+    def add(self, ts: float, n: int = 1):
+        bucket = int(ts // self.width)
+        slot = bucket % self.size
+        if self.stamps[slot] != bucket:
+            if self.stamps[slot] > bucket:
+                return  # Older than anything the ring still covers
+            self.stamps[slot] = bucket
+            self.counts[slot] = 0
+        self.counts[slot] += n
+
+    def _live(self, now: float):
+        current = int(now // self.width)
+        for stamp, count in zip(self.stamps, self.counts):
+            if current - self.size < stamp <= current:
+                yield stamp, count
+
+    def total(self, now: float) -> int:
+        return sum(count for _, count in self._live(now))
+
+    def series(self, now: float) -> List[int]:
+        """Per-bucket counts, oldest first, ending with the current bucket"""
+        current = int(now // self.width)
+        values = [0] * self.size
+        for stamp, count in self._live(now):
+            values[self.size - 1 - (current - stamp)] = count
+        return values
+
+    def to_dict(self) -> Dict:
+        live = [(s, c) for s, c in zip(self.stamps, self.counts) if s >= 0 and c]
+        return {"s": [s for s, _ in live], "c": [c for _, c in live]}
+
+    def load(self, data: Dict):
+        for stamp, count in zip(data.get("s", []), data.get("c", [])):
+            slot = stamp % self.size
+            if stamp > self.stamps[slot]:
+                self.stamps[slot] = stamp
+                self.counts[slot] = count
+
+
+class RiskAggregates:
+    """Rolling alert counts per child and sentiment over the last hour, day and week.
+
+    Each recorded alert touches one bucket per window, so maintenance is
+    constant time regardless of history size. The whole structure
+    serializes to a compact snapshot that is reloaded at startup.
+    """
+
+    def __init__(self):
+        self.counters: Dict[Tuple[str, str], Dict[str, RollingCounter]] = {}
+        self.saved_at = 0.0  # When the snapshot this was loaded from was taken
+
+    def _counters(self, child_name: str, sentiment: str) -> Dict[str, RollingCounter]:
+        key = (child_name, sentiment)
+        counters = self.counters.get(key)
+        if counters is None:
+            counters = {name: RollingCounter(width, size)
+                        for name, (width, size) in WINDOWS.items()}
+            self.counters[key] = counters
+        return counters
+
+    def record(self, child_name: str, sentiment: str, ts: Optional[float] = None):
+        ts = time.time() if ts is None else ts
+        for counter in self._counters(child_name, sentiment.upper()).values():
+            counter.add(ts)
+
+    def add(self, child_name: str, sentiment: str, window: str, ts: float, n: int):
+        """Add `n` alerts to one window's bucket holding `ts`"""
+        self._counters(child_name, sentiment.upper())[window].add(ts, n)
+
+    def counts(self, child_name: str, window: str, now: Optional[float] = None) -> Dict[str, int]:
+        """Alerts per sentiment for one child within `window`"""
+        now = time.time() if now is None else now
+        return {
+            sentiment: self.counters[(child_name, sentiment)][window].total(now)
+            if (child_name, sentiment) in self.counters else 0
+            for sentiment in SENTIMENTS
+        }
+
+    def trend(self, child_name: str, window: str = "day",
+              now: Optional[float] = None) -> Dict[str, List[int]]:
+        """Per-bucket series for each sentiment, oldest bucket first"""
+        now = time.time() if now is None else now
+        size = WINDOWS[window][1]
+        return {
+            sentiment: self.counters[(child_name, sentiment)][window].series(now)
+            if (child_name, sentiment) in self.counters else [0] * size
+            for sentiment in SENTIMENTS
+        }
+
+    def children(self) -> List[str]:
+        return sorted({child for child, _ in self.counters})
+
+    def reset(self):
+        self.counters.clear()
+
+    def to_dict(self) -> Dict:
+        snapshot = {"saved_at": time.time(), "children": {}}
+        for (child_name, sentiment), counters in self.counters.items():
+            snapshot["children"].setdefault(child_name, {})[sentiment] = {
+                name: counter.to_dict() for name, counter in counters.items()
+            }
+        return snapshot
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "RiskAggregates":
+        aggregates = cls()
+        aggregates.saved_at = data.get("saved_at", 0.0)
+        for child_name, sentiments in data.get("children", {}).items():
+            for sentiment, windows in sentiments.items():
+                counters = aggregates._counters(child_name, sentiment)
+                for name, counter_data in windows.items():
+                    if name in counters:
+                        counters[name].load(counter_data)
+        return aggregates
+
+    def save(self, path: str, snapshot: Optional[Dict] = None):
+        """Atomically write a snapshot (pass one taken earlier to save off-thread)"""
+        snapshot = self.to_dict() if snapshot is None else snapshot
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["RiskAggregates"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                return cls.from_dict(json.load(f))
+        except Exception as e:
+            logger.error(f"Could not load risk snapshot {path}: {e}")
+            return None
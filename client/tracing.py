@@ -0,0 +1,8 @@
+# tracing.py
+"""The client's latency tracer; Tracer and the trace summary live in shared/tracing.py"""
+import _shared_path  # noqa: F401
+from shared.tracing import TRACE_HEADER, new_correlation_id, process_tracer
+
+__all__ = ["TRACE_HEADER", "new_correlation_id", "tracer"]
+
+tracer = process_tracer("client")
@@ -0,0 +1,108 @@
+# ui_queue.py
+import logging
+import os
+import queue
+import threading
+import tkinter as tk
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def drain_queue(source: queue.Queue, limit: Optional[int] = None) -> List[Any]:
+    """Take everything currently pending from a queue without blocking"""
+    items = []
+    while limit is None or len(items) < limit:
+        try:
+            items.append(source.get_nowait())
+        except queue.Empty:
+            break
+    return items
+
+
+class WakeupQueue(queue.Queue):
+    """Queue that can wake a Tk event loop when an item is put.
+
+    The first put after the consumer has drained writes one byte to a pipe
+    registered with Tk's file handler, so the UI thread runs exactly when
+    there is work instead of polling.
+    """
+
+    def __init__(self, maxsize: int = 0):
+        super().__init__(maxsize)
+        self._read_fd = None
+        self._write_fd = None
+        self._signaled = threading.Event()
+
+    def enable_wakeup(self) -> int:
+        """Create the wakeup pipe and return its read end"""
+        if self._read_fd is None:
+            self._read_fd, self._write_fd = os.pipe()
+            os.set_blocking(self._read_fd, False)
+            os.set_blocking(self._write_fd, False)
+        return self._read_fd
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        if self._write_fd is not None and not self._signaled.is_set():
+            self._signaled.set()
+            try:
+                os.write(self._write_fd, b"\0")
+            except (BlockingIOError, OSError):
+                pass
+
+    def acknowledge(self):
+        """Clear the pending wakeup; call before draining"""
+        self._signaled.clear()
+        try:
+            while os.read(self._read_fd, 512):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+
+def schedule_drain(widget: tk.Misc, source: queue.Queue,
+                   handle_batch: Callable[[List[Any]], None],
+                   is_running: Callable[[], bool] = lambda: True,
+                   can_drain: Callable[[], bool] = lambda: True,
+                   poll_interval: int = 100) -> Callable[[], None]:
+    """Deliver everything pending in `source` to `handle_batch` on the Tk thread.
+
+    With a WakeupQueue on a platform that supports Tk file handlers the
+    consumer is woken by the producer and never polls; otherwise the queue
+    is polled every `poll_interval` ms, draining all pending items per tick.
+    Returns a function that drains immediately (e.g. after resuming).
+    """
+    def drain_now():
+        if not can_drain():
+            return
+        items = drain_queue(source)
+        if items:
+            try:
+                handle_batch(items)
+            except Exception as e:
+                logger.error(f"Error handling queued batch: {e}")
+
+    if isinstance(source, WakeupQueue) and hasattr(widget.tk, "createfilehandler"):
+        try:
+            read_fd = source.enable_wakeup()
+
+            def on_wakeup(fd, mask):
+                source.acknowledge()
+                if is_running():
+                    drain_now()
+
+            widget.tk.createfilehandler(read_fd, tk.READABLE, on_wakeup)
+            # Items put before the handler existed
+            widget.after_idle(drain_now)
+            return drain_now
+        except Exception as e:
+            logger.warning(f"Wakeup unavailable, falling back to polling: {e}")
+
+    def poll():
+        drain_now()
+        if is_running():
+            widget.after(poll_interval, poll)
+
+    widget.after(poll_interval, poll)
+    return drain_now
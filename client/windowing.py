@@ -0,0 +1,226 @@
+# windowing.py
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+
+from client import Chat
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AnalysisWindow:
+    conversation_id: str
+    chats: List[Chat]
+    start_index: int  # 1-based number of the first message in the window
+    end_index: int    # 1-based number of the last message in the window
+    sender: str       # Sender of the message that closed the window
+
+    @property
+    def message_range(self) -> str:
+        return f"Messages {self.start_index} - {self.end_index} (Window of {len(self.chats)})"
+
+
+@dataclass
+class ConversationState:
+    buffer: Deque[Chat]
+    first_index: int = 1    # 1-based number of buffer[0]
+    total: int = 0          # Messages ever appended to this conversation
+    analyzed_upto: int = 0  # end_index of the last dispatched window
+    in_flight: bool = False
+    stride: int = 0            # Current stride, 0 means the engine default
+    last_message_at: float = 0.0
+    positive_run: int = 0      # Consecutive POSITIVE verdicts
+
+
+class WindowingEngine:
+    """Per-conversation sliding windows with at most one analysis in flight.
+
+    Each conversation buffers every message not yet sent for analysis,
+    plus the few analyzed ones the next window needs as context. A window
+    is released once `stride` new messages have arrived since the last
+    one; consecutive windows share `overlap` messages. While a window is
+    being analyzed, new messages only accumulate and are coalesced into
+    the next window when the analysis completes. A window never exceeds
+    `max_window` messages; any backlog beyond that goes out in the
+    following windows.
+    """
+
+    def __init__(self, window_size: int = 3, stride: Optional[int] = None,
+                 overlap: int = 0, max_window: Optional[int] = None):
+        if stride is None:
+            stride = window_size - overlap
+        if window_size < 1 or stride < 1 or overlap < 0:
+            raise ValueError("window_size and stride must be positive, overlap non-negative")
+
+        self.window_size = window_size
+        self.stride = stride
+        self.overlap = overlap
+        # Largest window produced when messages were coalesced during a call
+        self.max_window = max(max_window or 2 * window_size, window_size)
+        # Analyzed messages kept to give the next window its context
+        self.context = max(window_size, overlap)
+
+        self.conversations: Dict[str, ConversationState] = {}
+        self.lock = threading.Lock()
+        logger.info(f"WindowingEngine initialized: size={window_size}, "
+                     f"stride={stride}, overlap={overlap}")
+
+    def _state(self, conversation_id: str) -> ConversationState:
+        state = self.conversations.get(conversation_id)
+        if state is None:
+            state = ConversationState(buffer=deque())
+            self.conversations[conversation_id] = state
+        return state
+
+    def _is_ready(self, state: ConversationState) -> bool:
+        if state.in_flight:
+            return False
+        if state.analyzed_upto == 0:
+            return state.total >= self.window_size
+        return state.total - state.analyzed_upto >= (state.stride or self.stride)
+
+    def _take_window(self, conversation_id: str, state: ConversationState) -> AnalysisWindow:
+        """Build the next window and mark the conversation as in flight.
+
+        The window starts at the oldest unanalyzed message, so a backlog
+        larger than `max_window` is sent over several windows, oldest first.
+        """
+        overlap = self.overlap if state.analyzed_upto else 0
+        new_messages = min(state.total - state.analyzed_upto,
+                           max(self.max_window - overlap, 1))
+        end_index = state.analyzed_upto + new_messages
+        context = max(self.window_size - new_messages, overlap)
+        start_index = max(end_index - new_messages - context + 1, state.first_index)
+
+        chats = [state.buffer[i - state.first_index] for i in range(start_index, end_index + 1)]
+        state.in_flight = True
+        state.analyzed_upto = end_index
+        # Only analyzed messages are dropped, and only once no window needs them
+        while state.first_index <= end_index - self.context:
+            state.buffer.popleft()
+            state.first_index += 1
+        return AnalysisWindow(
+            conversation_id=conversation_id,
+            chats=chats,
+            start_index=start_index,
+            end_index=end_index,
+            sender=chats[-1].sender
+        )
+
+    def add_message(self, conversation_id: str, chat: Chat) -> Optional[AnalysisWindow]:
+        """Append a message; returns a window if one should be analyzed now"""
+        with self.lock:
+            state = self._state(conversation_id)
+            state.buffer.append(chat)
+            state.total += 1
+            state.last_message_at = time.monotonic()
+            if self._is_ready(state):
+                return self._take_window(conversation_id, state)
+            return None
+
+    def complete(self, conversation_id: str) -> Optional[AnalysisWindow]:
+        """Mark the in-flight analysis as finished.
+
+        Returns the next window if enough messages arrived during the call.
+        """
+        with self.lock:
+            state = self.conversations.get(conversation_id)
+            if state is None:
+                return None
+            state.in_flight = False
+            if self._is_ready(state):
+                return self._take_window(conversation_id, state)
+            return None
+
+    def pending_count(self, conversation_id: str) -> int:
+        """Messages received since the last dispatched window"""
+        with self.lock:
+            state = self.conversations.get(conversation_id)
+            if state is None:
+                return 0
+            return state.total - state.analyzed_upto
+
+    def reset(self, conversation_id: Optional[str] = None):
+        with self.lock:
+            if conversation_id is None:
+                self.conversations.clear()
+            else:
+                self.conversations.pop(conversation_id, None)
+
+
+class AnalysisScheduler(WindowingEngine):
+    """Windowing engine with idle flushes and a risk-adaptive stride.
+
+    A partial window is flushed once a conversation has been quiet for
+    `idle_timeout` seconds, so a single worrying message is never left
+    unanalyzed. After a NEGATIVE or CAUTIONARY verdict the conversation is
+    analyzed on every message; each `backoff_after` consecutive POSITIVE
+    verdicts double the stride, up to `max_stride`. A server short of
+    budget may ask for a larger stride, which applies unless the verdict
+    was NEGATIVE. A conversation with nothing pending that has been quiet
+    for `evict_after` seconds is forgotten; if it resumes, it starts over
+    with the default stride and its message numbers restart at 1.
+    """
+
+    def __init__(self, window_size: int = 3, stride: Optional[int] = None,
+                 overlap: int = 0, max_window: Optional[int] = None,
+                 idle_timeout: float = 10.0, max_stride: Optional[int] = None,
+                 backoff_after: int = 3, evict_after: float = 600.0):
+        base_stride = stride if stride is not None else window_size - overlap
+        max_stride = max(max_stride or 4 * base_stride, base_stride)
+        # Windows must be able to cover every message skipped by the largest stride
+        max_window = max(max_window or 0, max_stride + overlap)
+        super().__init__(window_size, stride, overlap, max_window)
+
+        self.idle_timeout = idle_timeout
+        self.max_stride = max_stride
+        self.backoff_after = max(backoff_after, 1)
+        self.evict_after = evict_after
+
+    def record_verdict(self, conversation_id: str, sentiment: str, stride_hint: int = 0):
+        """Adapt the conversation's stride to the latest verdict and the server's hint"""
+        with self.lock:
+            state = self.conversations.get(conversation_id)
+            if state is None:
+                return
+            if sentiment.upper() in ("NEGATIVE", "CAUTIONARY"):
+                state.positive_run = 0
+                state.stride = 1
+            else:
+                state.positive_run += 1
+                doublings = state.positive_run // self.backoff_after
+                state.stride = min(self.max_stride, self.stride * (2 ** doublings))
+            if stride_hint and sentiment.upper() != "NEGATIVE":
+                state.stride = min(self.max_stride, max(state.stride, stride_hint))
+            logger.debug(f"Stride for {conversation_id} is now {state.stride}")
+
+    def flush_idle(self, now: Optional[float] = None) -> List[AnalysisWindow]:
+        """Release partial windows for conversations that have gone quiet"""
+        now = time.monotonic() if now is None else now
+        windows = []
+        with self.lock:
+            for conversation_id, state in self.conversations.items():
+                if state.in_flight or state.total == state.analyzed_upto:
+                    continue
+                if now - state.last_message_at >= self.idle_timeout:
+                    windows.append(self._take_window(conversation_id, state))
+        if windows:
+            logger.info(f"Idle flush released {len(windows)} partial windows")
+        return windows
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop conversations with nothing pending that have gone quiet"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            idle = [conversation_id for conversation_id, state in self.conversations.items()
+                    if not state.in_flight and state.total == state.analyzed_upto
+                    and now - state.last_message_at >= self.evict_after]
+            for conversation_id in idle:
+                del self.conversations[conversation_id]
+        if idle:
+            logger.debug(f"Evicted {len(idle)} idle conversations")
+        return len(idle)
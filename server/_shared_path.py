@@ -0,0 +1,12 @@
+# _shared_path.py
+"""Puts the repository root on sys.path so the `shared` package imports.
+
+The server runs as scripts from its own directory, which leaves the root off
+the path. Import this module before any `from shared... import`.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
@@ -0,0 +1,212 @@
+# accounts.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Set, Union
+
+from models import ChildAccount, ParentAccount
+from data_dir import data_path
+
+logger = logging.getLogger(__name__)
+
+# Matches the client's demo family (client/family.py)
+DEMO_ACCOUNTS = {
+    "parents": [
+        {"id": 1, "name": "Parent", "email": "parent@example.com", "children": [2, 3]},
+    ],
+    "children": [
+        {"id": 2, "name": "Alice", "email": "alice@example.com", "parent_id": 1},
+        {"id": 3, "name": "Bob", "email": "bob@example.com", "parent_id": 1},
+    ],
+}
+
+
+# Tenant for requests no account could be found for; they share one budget
+ANONYMOUS_TENANT = "anonymous"
+
+
+def _token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class AccountRegistry:
+    """In-memory index of parent and child accounts.
+
+    Loaded once at startup from a JSON file; every lookup (account by id
+    or username, parents of a child, children of a parent, a child's
+    tenant) is a dictionary access. Relationships may be declared on
+    either side (ParentAccount.children or ChildAccount.parent_id) and a
+    child may have several parents. Passwords are not kept: this is a
+    routing index, not an authentication store. A parent entry may carry
+    an API `token` for the history and usage routes (see auth.py).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or data_path("accounts.json")
+        self.parents: Dict[int, ParentAccount] = {}
+        self.children: Dict[int, ChildAccount] = {}
+        self.parents_of_child: Dict[int, Set[int]] = defaultdict(set)
+        self.children_of_parent: Dict[int, Set[int]] = defaultdict(set)
+        self.by_username: Dict[str, int] = {}
+        self.tokens: Dict[int, str] = {}
+        # Looked up by digest so a lookup's timing says nothing about the token
+        self.parent_by_token_digest: Dict[str, int] = {}
+
+    # Loading and saving
+
+    def load(self) -> "AccountRegistry":
+        data = DEMO_ACCOUNTS
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        else:
+            logger.warning(f"No account file at {self.path}, using the demo family")
+        for parent in data.get("parents", []):
+            parent = dict(parent)
+            token = parent.pop("token", None)
+            self.add_parent(ParentAccount(password="", **parent), save=False)
+            if token:
+                self.set_token(parent["id"], token, save=False)
+        for child in data.get("children", []):
+            self.add_child(ChildAccount(password="", **child), save=False)
+        logger.info(f"Loaded {len(self.parents)} parents and {len(self.children)} children")
+        return self
+
+    def save(self):
+        """Atomically write the registry back to its file"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            "parents": [
+                {**account.model_dump(exclude={"password", "account_type"}),
+                 "children": sorted(self.children_of_parent[account.id]),
+                 **({"token": self.tokens[account.id]} if account.id in self.tokens else {})}
+                for account in self.parents.values()
+            ],
+            "children": [
+                account.model_dump(exclude={"password", "account_type"})
+                for account in self.children.values()
+            ],
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    # Registration
+
+    def _index_names(self, account: Union[ParentAccount, ChildAccount]):
+        # The demo client sends "<name>_demo" as its username
+        for key in (account.name, account.email, f"{account.name}_demo"):
+            self.by_username[key.lower()] = account.id
+
+    def link(self, parent_id: int, child_id: int):
+        self.parents_of_child[child_id].add(parent_id)
+        self.children_of_parent[parent_id].add(child_id)
+
+    def add_parent(self, account: ParentAccount, save: bool = True):
+        self.parents[account.id] = account
+        self._index_names(account)
+        for child_id in account.children:
+            self.link(account.id, child_id)
+        if save:
+            self.save()
+
+    def add_child(self, account: ChildAccount, save: bool = True):
+        self.children[account.id] = account
+        self._index_names(account)
+        if account.parent_id is not None:
+            self.link(account.parent_id, account.id)
+        if save:
+            self.save()
+
+    def set_token(self, parent_id: int, token: str, save: bool = True):
+        previous = self.tokens.pop(parent_id, None)
+        if previous:
+            self.parent_by_token_digest.pop(_token_digest(previous), None)
+        self.tokens[parent_id] = token
+        self.parent_by_token_digest[_token_digest(token)] = parent_id
+        if save:
+            self.save()
+
+    # Lookups
+
+    def parent_for_token(self, token: str) -> Optional[int]:
+        return self.parent_by_token_digest.get(_token_digest(token))
+
+    def resolve_child(self, username: str, child_id: Optional[int] = None,
+                      parent_id: Optional[int] = None) -> Optional[int]:
+        """Child account for a request: its explicit id, else its username.
+        With `parent_id`, only that parent's children can be returned."""
+        def allowed(account_id: Optional[int]) -> bool:
+            if account_id not in self.children:
+                return False
+            return parent_id is None or parent_id in self.parents_of_child.get(account_id, ())
+
+        if allowed(child_id):
+            return child_id
+        account_id = self.by_username.get(username.lower())
+        return account_id if allowed(account_id) else None
+
+    def alert_recipients(self, child_id: Optional[int]) -> List[ParentAccount]:
+        """Every parent an alert about `child_id` goes to"""
+        if child_id is None:
+            return []
+        return [self.parents[parent_id] for parent_id in self.parents_of(child_id)
+                if parent_id in self.parents]
+
+    def parents_of(self, child_id: int) -> List[int]:
+        return sorted(self.parents_of_child.get(child_id, ()))
+
+    def children_of(self, parent_id: int) -> List[int]:
+        return sorted(self.children_of_parent.get(parent_id, ()))
+
+    def tenant_of(self, child_id: Optional[int], parent_id: Optional[int] = None) -> str:
+        """The family a request is charged to.
+
+        A request for no known child is charged to the calling parent's
+        family (`parent_id`), or else to the shared anonymous tenant; never
+        to its username, which is free text and would give a fresh budget.
+        """
+        if child_id is None:
+            if parent_id is None:
+                return ANONYMOUS_TENANT
+            children = self.children_of(parent_id)
+            return self.tenant_of(children[0]) if children else f"family:{parent_id}"
+        parents = self.parents_of_child.get(child_id)
+        if not parents:
+            return f"child:{child_id}"
+        return f"family:{min(parents)}"
+
+
+class TenantLimiter:
+    """Caps concurrent analyses per tenant so one busy family cannot starve the rest"""
+
+    def __init__(self, per_tenant: int = 4):
+        self.per_tenant = per_tenant
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.users: Dict[str, int] = {}  # Holders and waiters per tenant
+
+    @asynccontextmanager
+    async def slot(self, tenant: str):
+        semaphore = self.semaphores.get(tenant)
+        if semaphore is None:
+            semaphore = self.semaphores[tenant] = asyncio.Semaphore(self.per_tenant)
+        self.users[tenant] = self.users.get(tenant, 0) + 1
+        try:
+            async with semaphore:
+                yield
+        finally:
+            self.users[tenant] -= 1
+            if not self.users[tenant]:
+                # Idle tenants are forgotten so the map stays small
+                del self.users[tenant]
+                del self.semaphores[tenant]
+
+    def busy(self) -> Dict[str, int]:
+        return dict(self.users)
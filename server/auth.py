@@ -0,0 +1,66 @@
+# auth.py
+"""Bearer-token checks for the analysis, history and usage routes.
+
+A parent account may carry a `token` in accounts.json. The token grants
+access to that parent's own routes and to their children's history, and
+lets their monitoring client submit chats for their children.
+WATCHPOINT_ADMIN_TOKEN grants access to every route, including the
+cross-family /usage and /notifications/stats reports. Without any token,
+these routes answer 401.
+"""
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException, Request
+
+
+def _bearer(authorization: Optional[str]) -> str:
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        raise HTTPException(status_code=401, detail="Missing bearer token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return token.strip()
+
+
+def _is_admin(token: str) -> bool:
+    admin_token = os.getenv("WATCHPOINT_ADMIN_TOKEN")
+    return bool(admin_token) and hmac.compare_digest(token.encode(), admin_token.encode())
+
+
+def authenticate(request: Request, authorization: Optional[str] = Header(None)) -> Optional[int]:
+    """The calling parent's id, or None for the admin token"""
+    token = _bearer(authorization)
+    if _is_admin(token):
+        return None
+    parent_id = request.app.state.accounts.parent_for_token(token)
+    if parent_id is None:
+        raise HTTPException(status_code=403, detail="Unknown token")
+    return parent_id
+
+
+def require_admin(authorization: Optional[str] = Header(None)):
+    if not _is_admin(_bearer(authorization)):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def require_parent(parent_id: int, request: Request,
+                   authorization: Optional[str] = Header(None)):
+    """The caller is `parent_id` or an admin"""
+    token = _bearer(authorization)
+    if _is_admin(token):
+        return
+    if request.app.state.accounts.parent_for_token(token) != parent_id:
+        raise HTTPException(status_code=403, detail="Not this parent's account")
+
+
+def require_child_access(child_id: int, request: Request,
+                         authorization: Optional[str] = Header(None)):
+    """The caller is one of `child_id`'s parents or an admin"""
+    token = _bearer(authorization)
+    if _is_admin(token):
+        return
+    accounts = request.app.state.accounts
+    parent_id = accounts.parent_for_token(token)
+    if parent_id is None or child_id not in accounts.children_of(parent_id):
+        raise HTTPException(status_code=403, detail="Not a parent of this child")
@@ -0,0 +1,243 @@
+# budgets.py
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from models import Chat, SentimentResponse
+from data_dir import data_path
+
+import _shared_path  # noqa: F401
+from shared.lexicon import match_categories, worst_sentiment
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage_daily (
+    day TEXT NOT NULL,
+    tenant TEXT NOT NULL,
+    child_id INTEGER NOT NULL,
+    tier TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    cached INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, tenant, child_id, tier)
+) WITHOUT ROWID;
+"""
+
+NO_CHILD = -1  # child_id stored for requests that resolve to no child account
+
+# (budget left above, tier, stride hint), checked in order; the last step always applies
+DEGRADATION: List[Tuple[float, str, int]] = [
+    (0.50, "full", 0),
+    (0.25, "full", 2),
+    (0.10, "economy", 4),
+    (float("-inf"), "local", 4),
+]
+
+
+@dataclass
+class Budget:
+    tokens: int = 200_000  # Upstream tokens per day
+    calls: int = 2_000  # Upstream model calls per day
+    child_share: float = 1.0  # Share of the family budget one child may use
+
+
+@dataclass
+class Plan:
+    tier: str
+    stride_hint: int
+    remaining: float  # Budget left, 0..1
+    exempt: bool = False
+
+
+@dataclass
+class Usage:
+    calls: int = 0
+    tokens: int = 0
+
+    def left(self, tokens: float, calls: float) -> float:
+        return min(1 - self.tokens / tokens if tokens else 1.0,
+                   1 - self.calls / calls if calls else 1.0)
+
+
+def _today() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+def local_verdict(chats: List[Chat]) -> SentimentResponse:
+    """Lexicon verdict for families whose budget is spent.
+
+    Like the client's offline fallback it is provisional: it is stored and
+    returned, but it never notifies parents (see record_verdict).
+    """
+    matched = match_categories(chat.message for chat in chats)
+    if not matched:
+        return SentimentResponse(sentiment="POSITIVE", alert_needed=False,
+                                 explanation="Local check (analysis budget reached): "
+                                             "no concerning language found.", tier="local",
+                                 provisional=True)
+    sentiment = worst_sentiment(matched)
+    categories = ", ".join(category for category, _ in matched)
+    return SentimentResponse(sentiment=sentiment, alert_needed=sentiment == "NEGATIVE",
+                             explanation=f"Local check (analysis budget reached) matched: "
+                                         f"{categories}.", tier="local", provisional=True)
+
+
+class BudgetLedger:
+    """Daily model usage per family and child, and the tier each request gets.
+
+    Every analysis is charged to its tenant (see AccountRegistry.tenant_of)
+    and child. As the day's budget runs down, requests are degraded step by
+    step (DEGRADATION): first the client is asked for a larger stride, then
+    the cheaper model tier is used, and finally windows are scored with the
+    local lexicon. Windows with NEGATIVE risk are always analyzed in full:
+    those the lexicon flags as NEGATIVE, and any window of a child whose
+    last NEGATIVE verdict is less than `exempt_for` seconds old.
+
+    Today's totals are kept in memory, so planning is a dictionary lookup;
+    usage_daily in SQLite keeps the history for reports.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, budgets_path: Optional[str] = None,
+                 exempt_for: float = 900.0):
+        self.exempt_for = exempt_for
+        self.default = Budget()
+        self.budgets: Dict[str, Budget] = {}
+        if budgets_path and os.path.exists(budgets_path):
+            with open(budgets_path, "r") as f:
+                config = json.load(f)
+            self.default = Budget(**config.pop("default", {}))
+            self.budgets = {tenant: Budget(**budget) for tenant, budget in config.items()}
+
+        db_path = db_path or data_path("usage.db")
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+        self.day = ""
+        self.tenants: Dict[str, Usage] = {}
+        self.children: Dict[Tuple[str, int], Usage] = {}
+        self.last_negative: Dict[int, float] = {}
+        self._roll_over()
+
+    def budget_for(self, tenant: str) -> Budget:
+        return self.budgets.get(tenant, self.default)
+
+    def _roll_over(self):
+        """Start the day's totals, picking up usage recorded earlier today"""
+        self.day = _today()
+        self.tenants.clear()
+        self.children.clear()
+        rows = self.conn.execute(
+            "SELECT tenant, child_id, SUM(calls), SUM(prompt_tokens + completion_tokens) "
+            "FROM usage_daily WHERE day = ? GROUP BY tenant, child_id", (self.day,)).fetchall()
+        for tenant, child_id, calls, tokens in rows:
+            total = self.tenants.setdefault(tenant, Usage())
+            total.calls += calls
+            total.tokens += tokens
+            self.children[(tenant, child_id)] = Usage(calls, tokens)
+
+    # Planning and charging
+
+    def plan(self, tenant: str, child_id: Optional[int], chats: List[Chat]) -> Plan:
+        with self.lock:
+            if _today() != self.day:
+                self._roll_over()
+            budget = self.budget_for(tenant)
+            remaining = self.tenants.get(tenant, Usage()).left(budget.tokens, budget.calls)
+            child = self.children.get((tenant, NO_CHILD if child_id is None else child_id))
+            if child and budget.child_share < 1.0:
+                remaining = min(remaining, child.left(budget.tokens * budget.child_share,
+                                                      budget.calls * budget.child_share))
+            recent_negative = (child_id is not None and
+                               time.time() - self.last_negative.get(child_id, 0) < self.exempt_for)
+
+        tier, stride_hint = next((tier, stride) for floor, tier, stride in DEGRADATION
+                                 if remaining > floor)
+        if tier != "full" or stride_hint:
+            if recent_negative or worst_sentiment(
+                    match_categories(chat.message for chat in chats)) == "NEGATIVE":
+                return Plan("full", 0, remaining, exempt=True)
+        return Plan(tier, stride_hint, remaining)
+
+    def charge(self, tenant: str, child_id: Optional[int], tier: str,
+               usage: Optional[Dict[str, int]], sentiment: str):
+        """Record one analysis; `usage` is None when no model call was made"""
+        child_key = NO_CHILD if child_id is None else child_id
+        tokens = (usage["prompt_tokens"] + usage["completion_tokens"]) if usage else 0
+        # Cache hits report zero tokens and cost no upstream call
+        called = int(bool(usage) and tokens > 0)
+        with self.lock:
+            if _today() != self.day:
+                self._roll_over()
+            if sentiment.upper() == "NEGATIVE" and child_id is not None:
+                self.last_negative[child_id] = time.time()
+            for entry in (self.tenants.setdefault(tenant, Usage()),
+                          self.children.setdefault((tenant, child_key), Usage())):
+                entry.calls += called
+                entry.tokens += tokens
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO usage_daily (day, tenant, child_id, tier, calls, cached, "
+                    "prompt_tokens, completion_tokens) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(day, tenant, child_id, tier) DO UPDATE SET "
+                    "calls = calls + excluded.calls, cached = cached + excluded.cached, "
+                    "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                    "completion_tokens = completion_tokens + excluded.completion_tokens",
+                    (self.day, tenant, child_key, tier, called,
+                     int(tier != "local" and not called),
+                     usage["prompt_tokens"] if usage else 0,
+                     usage["completion_tokens"] if usage else 0))
+
+    # Reporting
+
+    def report(self, days: int = 7, tenants: Optional[List[str]] = None) -> Dict:
+        """Usage per day, tenant, child and tier, plus each tenant's standing today"""
+        since = time.strftime("%Y-%m-%d", time.gmtime(time.time() - (days - 1) * 86400))
+        query = ("SELECT day, tenant, child_id, tier, calls, cached, prompt_tokens, "
+                 "completion_tokens FROM usage_daily WHERE day >= ?")
+        params: list = [since]
+        if tenants is not None:
+            query += f" AND tenant IN ({', '.join('?' * len(tenants))})"
+            params.extend(tenants)
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY day, tenant, child_id, tier",
+                                     params).fetchall()
+            today = {tenant: Usage(u.calls, u.tokens) for tenant, u in self.tenants.items()
+                     if tenants is None or tenant in tenants}
+
+        standing = {}
+        for tenant in sorted(set(today) | set(tenants or ())):
+            usage = today.get(tenant, Usage())
+            budget = self.budget_for(tenant)
+            standing[tenant] = {
+                "calls": usage.calls, "tokens": usage.tokens,
+                "call_budget": budget.calls, "token_budget": budget.tokens,
+                "remaining": round(max(0.0, usage.left(budget.tokens, budget.calls)), 3),
+            }
+        return {
+            "today": standing,
+            "daily": [
+                {"day": day, "tenant": tenant,
+                 "child_id": None if child_id == NO_CHILD else child_id, "tier": tier,
+                 "calls": calls, "cached": cached, "prompt_tokens": prompt_tokens,
+                 "completion_tokens": completion_tokens}
+                for day, tenant, child_id, tier, calls, cached, prompt_tokens, completion_tokens
+                in rows
+            ],
+        }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
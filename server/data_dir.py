@@ -0,0 +1,12 @@
+# data_dir.py
+import os
+
+# Default locations for the server's files. They are resolved relative to this
+# package, not the working directory, so uvicorn finds the same stores wherever it starts.
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.getenv("WATCHPOINT_DATA_DIR", os.path.join(SERVER_DIR, "data"))
+
+
+def data_path(name: str) -> str:
+    """Return the default path of a file in the server data directory."""
+    return os.path.join(DATA_DIR, name)
@@ -1,16 +1,246 @@
-from fastapi import FastAPI
-from sentiment_analyzer import analyze_sentiment
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from sentiment_analyzer import analyze_metered, cached_verdict, warm_up
 from models import *
+from verdict_store import StoredVerdict, VerdictStore
+from accounts import AccountRegistry, TenantLimiter
+from auth import authenticate, require_admin, require_child_access, require_parent
+from notifications import NotificationDispatcher, build_channels
+from budgets import BudgetLedger, local_verdict
+from structured_output import parse_stats
+from data_dir import data_path
+import _shared_path  # noqa: F401
+from shared.tracing import TRACE_HEADER, header_trace_ids, process_tracer
+from typing import List, Optional
+import asyncio
+import logging
+import os
+import time
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The analyzer is built, and the model API connected, while the server
+    # starts serving; a request that arrives first waits for the client build
+    app.state.warmup = asyncio.create_task(asyncio.to_thread(
+        warm_up, os.getenv("WATCHPOINT_PRECONNECT", "1") != "0"))
+    app.state.verdicts = VerdictStore(os.getenv("WATCHPOINT_VERDICT_DB", data_path("verdicts.db")))
+    app.state.accounts = AccountRegistry(
+        os.getenv("WATCHPOINT_ACCOUNTS", data_path("accounts.json"))).load()
+    app.state.limiter = TenantLimiter(int(os.getenv("WATCHPOINT_TENANT_CONCURRENCY", "4")))
+    app.state.notifier = NotificationDispatcher(
+        app.state.accounts,
+        build_channels(os.getenv("WATCHPOINT_NOTIFY_CHANNELS", "mail,push"),
+                       os.getenv("WATCHPOINT_WEBHOOK_URL")),
+        db_path=os.getenv("WATCHPOINT_OUTBOX_DB", data_path("outbox.db")),
+        digest_interval=float(os.getenv("WATCHPOINT_DIGEST_INTERVAL", "300")))
+    app.state.budgets = BudgetLedger(os.getenv("WATCHPOINT_USAGE_DB", data_path("usage.db")),
+                                     os.getenv("WATCHPOINT_BUDGETS", data_path("budgets.json")))
+    await app.state.notifier.start()
+    yield
+    await app.state.notifier.stop()
+    app.state.budgets.close()
+    app.state.verdicts.close()
+
+
+app = FastAPI(lifespan=lifespan)
+tracer = process_tracer("server")
+
+
+def route(request: ChatAnalysisRequest, caller: Optional[int]):
+    """Resolve the request's child account and stamp it on the request; returns the tenant.
+
+    A parent (`caller`) may only submit chats for their own children; the
+    admin token (None) may submit for any child.
+    """
+    accounts = app.state.accounts
+    if caller is not None and request.child_id is not None \
+            and caller not in accounts.parents_of(request.child_id):
+        raise HTTPException(status_code=403, detail="Not a parent of this child")
+    request.child_id = accounts.resolve_child(request.username, request.child_id, caller)
+    return accounts.tenant_of(request.child_id, caller)
+
+
+def analyze_within_budget(request: ChatAnalysisRequest, tenant: str) -> SentimentResponse:
+    """Analyze at the tier the tenant's budget allows and charge it; runs in a worker thread"""
+    ledger = app.state.budgets
+    plan = ledger.plan(tenant, request.child_id, request.chats)
+    if plan.tier == "local":
+        # A verdict already cached costs nothing and beats the lexicon
+        response, usage = cached_verdict(request.chats) or local_verdict(request.chats), None
+    else:
+        response, usage = analyze_metered(request.chats, plan.tier)
+    ledger.charge(tenant, request.child_id, plan.tier, usage, response.sentiment)
+    response.stride_hint = plan.stride_hint
+    return response
+
+
+def record_verdict(request: ChatAnalysisRequest, response: SentimentResponse):
+    created_at = time.time()
+    # Provisional (lexicon) verdicts flag too much to send to parents
+    if response.alert_needed and not response.provisional:
+        try:
+            app.state.notifier.notify(request.child_id, request.username, response.sentiment,
+                                      response.explanation, created_at)
+        except Exception as e:
+            # The verdict is still returned and stored
+            logging.error(f"Queueing the alert for {request.username} failed: {e}")
+    app.state.verdicts.record(StoredVerdict(
+        created_at=created_at,
+        child_id=request.child_id,
+        username=request.username,
+        sentiment=response.sentiment,
+        alert_needed=response.alert_needed,
+        explanation=response.explanation,
+        chats=[chat.model_dump() for chat in request.chats]
+    ))
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    trace_ids = header_trace_ids(request.headers.get(TRACE_HEADER))
+    tracer.mark(trace_ids, "server.received", path=request.url.path)
+    response = await call_next(request)
+    tracer.mark(trace_ids, "server.responded", status=response.status_code)
+    return response
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "warm": app.state.warmup.done()}
+
+
+@app.get("/analyzer/stats")
+def analyzer_stats():
+    """How model replies were parsed: clean, repaired, salvaged or failed, and re-asks"""
+    return {"parsing": parse_stats.snapshot()}
 
 
 @app.post("/analyze_chats", response_model=SentimentResponse)
-async def analyze_chats(request: ChatAnalysisRequest):
-    sentiment_response = analyze_sentiment(request.chats)
+async def analyze_chats(request: ChatAnalysisRequest, http_request: Request,
+                        caller: Optional[int] = Depends(authenticate)):
+    trace_ids = request.trace_ids or header_trace_ids(http_request.headers.get(TRACE_HEADER))
+    tenant = route(request, caller)
+    async with app.state.limiter.slot(tenant):
+        tracer.mark(trace_ids, "llm.start")
+        sentiment_response = await asyncio.to_thread(analyze_within_budget, request, tenant)
+        tracer.mark(trace_ids, "llm.end")
+    record_verdict(request, sentiment_response)
 
     return sentiment_response
 
+
+@app.post("/analyze_chats/batch", response_model=List[Optional[SentimentResponse]])
+async def analyze_chats_batch(requests: List[ChatAnalysisRequest],
+                              caller: Optional[int] = Depends(authenticate)):
+    """Analyze several windows in one round trip; failed items come back as null"""
+    # Every item is checked before any is analyzed, so a refused batch leaves no verdicts
+    tenants = [route(request, caller) for request in requests]
+
+    async def analyze_one(request: ChatAnalysisRequest, tenant: str) -> Optional[SentimentResponse]:
+        # Each item waits for a slot of its own family
+        async with app.state.limiter.slot(tenant):
+            tracer.mark(request.trace_ids, "llm.start")
+            try:
+                response = await asyncio.to_thread(analyze_within_budget, request, tenant)
+                record_verdict(request, response)
+                return response
+            except Exception as e:
+                logging.error(f"Batch item for {request.username} failed: {e}")
+                return None
+            finally:
+                tracer.mark(request.trace_ids, "llm.end")
+
+    return await asyncio.gather(*(analyze_one(request, tenant)
+                                  for request, tenant in zip(requests, tenants)))
+
+
+@app.get("/children/{child_id}/alerts", response_model=VerdictPage,
+         dependencies=[Depends(require_child_access)])
+def child_alerts(child_id: int,
+                 since: Optional[float] = None,
+                 until: Optional[float] = None,
+                 sentiment: Optional[str] = Query(None, pattern="(?i)^(negative|cautionary|positive)$"),
+                 alerts_only: bool = False,
+                 cursor: Optional[str] = None,
+                 limit: int = Query(50, ge=1, le=500)):
+    """A child's verdict history, newest first; follow `next_cursor` for older pages"""
+    try:
+        verdicts, next_cursor = app.state.verdicts.page(
+            child_id, since, until, sentiment, alerts_only, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return VerdictPage(items=[VerdictRecord(**asdict(v)) for v in verdicts],
+                       next_cursor=next_cursor)
+
+
+@app.get("/children/{child_id}/aggregates", response_model=VerdictAggregates,
+         dependencies=[Depends(require_child_access)])
+def child_aggregates(child_id: int,
+                     bucket: str = Query("day", pattern="^(hour|day|week)$"),
+                     since: Optional[float] = None,
+                     until: Optional[float] = None):
+    """Verdict counts per sentiment and alert count per hour, day or week"""
+    buckets = app.state.verdicts.aggregates(child_id, bucket, since, until)
+    return VerdictAggregates(child_id=child_id, bucket=bucket,
+                             buckets=[VerdictBucket(**b) for b in buckets])
+
+@app.get("/parents/{parent_id}/children", response_model=List[AccountSummary],
+         dependencies=[Depends(require_parent)])
+def parent_children(parent_id: int):
+    accounts = app.state.accounts
+    if parent_id not in accounts.parents:
+        raise HTTPException(status_code=404, detail="Unknown parent")
+    return [AccountSummary(id=child.id, name=child.name, account_type=child.account_type)
+            for child in (accounts.children.get(i) for i in accounts.children_of(parent_id))
+            if child]
+
+
+@app.get("/parents/{parent_id}/alerts", response_model=VerdictPage,
+         dependencies=[Depends(require_parent)])
+def parent_alerts(parent_id: int,
+                  since: Optional[float] = None,
+                  until: Optional[float] = None,
+                  alerts_only: bool = True,
+                  cursor: Optional[str] = None,
+                  limit: int = Query(50, ge=1, le=500)):
+    """Alerts for all of a parent's children in one feed, newest first"""
+    accounts = app.state.accounts
+    if parent_id not in accounts.parents:
+        raise HTTPException(status_code=404, detail="Unknown parent")
+    try:
+        verdicts, next_cursor = app.state.verdicts.page(
+            accounts.children_of(parent_id), since, until, None, alerts_only, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return VerdictPage(items=[VerdictRecord(**asdict(v)) for v in verdicts],
+                       next_cursor=next_cursor)
+
+
+@app.get("/notifications/stats", dependencies=[Depends(require_admin)])
+def notification_stats():
+    """Outbox entries by status, alerts held for the next digest and send counters"""
+    notifier = app.state.notifier
+    return {"outbox": notifier.counts(), "dispatched": notifier.stats}
+
+
+@app.get("/usage", dependencies=[Depends(require_admin)])
+def usage_report(days: int = Query(7, ge=1, le=90)):
+    """Model usage per day, family, child and tier, and every family's budget standing"""
+    return app.state.budgets.report(days)
+
+
+@app.get("/parents/{parent_id}/usage", dependencies=[Depends(require_parent)])
+def parent_usage(parent_id: int, days: int = Query(7, ge=1, le=90)):
+    accounts = app.state.accounts
+    if parent_id not in accounts.parents:
+        raise HTTPException(status_code=404, detail="Unknown parent")
+    tenants = sorted({accounts.tenant_of(child_id) for child_id in accounts.children_of(parent_id)}
+                     | {accounts.tenant_of(None, parent_id)})
+    return app.state.budgets.report(days, tenants)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
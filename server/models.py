@@ -28,9 +28,50 @@ class Chat(BaseModel):
 class ChatAnalysisRequest(BaseModel):
     username: str
     chats: List[Chat]
+    child_id: Optional[int] = None  # ChildAccount the chats belong to, when known
+    trace_ids: List[str] = []  # Correlation ids of the traced messages in `chats`
 
 
 class SentimentResponse(BaseModel):
     sentiment: str
     alert_needed: bool
     explanation: str
+    tier: str = "full"  # full, economy or local (see budgets.py)
+    provisional: bool = False  # A lexicon verdict (local tier); parents are not notified
+    stride_hint: int = 0  # Smallest stride the client should use; 0 means no limit
+
+
+class VerdictRecord(BaseModel):
+    id: int
+    created_at: float
+    child_id: Optional[int] = None
+    username: str
+    sentiment: str
+    alert_needed: bool
+    explanation: str
+    chats: List[Chat] = []
+
+
+class VerdictPage(BaseModel):
+    items: List[VerdictRecord]
+    next_cursor: Optional[str] = None  # Pass back as `cursor` for the next (older) page
+
+
+class VerdictBucket(BaseModel):
+    bucket_start: int  # Unix time the bucket starts at
+    NEGATIVE: int = 0
+    CAUTIONARY: int = 0
+    POSITIVE: int = 0
+    alerts: int = 0
+
+
+class VerdictAggregates(BaseModel):
+    child_id: int
+    bucket: str
+    buckets: List[VerdictBucket]
+
+
+class AccountSummary(BaseModel):
+    id: int
+    name: str
+    account_type: str
@@ -0,0 +1,485 @@
+# notifications.py
+import asyncio
+import json
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from email.message import EmailMessage
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from accounts import AccountRegistry
+from models import ParentAccount
+from data_dir import data_path
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    parent_id INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt);
+CREATE TABLE IF NOT EXISTS digest_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    parent_id INTEGER NOT NULL,
+    payload TEXT NOT NULL
+);
+"""
+
+DIGEST_MAX_ALERTS = 50  # Alerts listed in full in one digest; the rest are counted
+
+
+def render(notification: Dict) -> Tuple[str, str]:
+    """Subject and plain-text body for a notification"""
+    if notification["kind"] == "alert":
+        subject = f"WatchPoint alert: {notification['child_name']} ({notification['sentiment']})"
+        body = (f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(notification['created_at']))} "
+                f"{notification['child_name']}: {notification['explanation']}")
+        return subject, body
+
+    alerts = notification["alerts"]
+    total = notification["total"]
+    subject = f"WatchPoint digest: {total} alert{'s' if total != 1 else ''}"
+    lines = [f"{time.strftime('%H:%M', time.localtime(alert['created_at']))} "
+             f"{alert['child_name']} [{alert['sentiment']}] {alert['explanation']}"
+             for alert in alerts]
+    if total > len(alerts):
+        lines.append(f"... and {total - len(alerts)} more")
+    return subject, "\n".join(lines)
+
+
+class Channel:
+    """A way of reaching a parent; `send` raises on failure"""
+    name = ""
+
+    async def send(self, parent: ParentAccount, notification: Dict):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class WebhookChannel(Channel):
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self.client = httpx.AsyncClient(timeout=timeout)
+
+    async def send(self, parent: ParentAccount, notification: Dict):
+        response = await self.client.post(
+            self.url, json={"parent_id": parent.id, "email": parent.email, **notification})
+        response.raise_for_status()
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class MailSpoolChannel(Channel):
+    """Writes one .eml file per message for a local mail agent to pick up"""
+    name = "mail"
+
+    def __init__(self, spool_dir: Optional[str] = None,
+                 sender: str = "alerts@watchpoint.local"):
+        spool_dir = spool_dir or data_path("mail_spool")
+        self.spool_dir = spool_dir
+        self.sender = sender
+        os.makedirs(spool_dir, exist_ok=True)
+
+    async def send(self, parent: ParentAccount, notification: Dict):
+        subject, body = render(notification)
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = parent.email
+        message["Subject"] = subject
+        message.set_content(body)
+        await asyncio.to_thread(self._write, message.as_bytes())
+
+    def _write(self, data: bytes):
+        name = f"{time.time_ns()}_{random.getrandbits(32):08x}.eml"
+        tmp_path = os.path.join(self.spool_dir, name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        # The mail agent only sees complete files
+        os.replace(tmp_path, os.path.join(self.spool_dir, name))
+
+
+class PushChannel(Channel):
+    """Stand-in for a push service: appends each push to a JSON lines file"""
+    name = "push"
+
+    def __init__(self, path: Optional[str] = None):
+        path = path or data_path("push.jsonl")
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+
+    async def send(self, parent: ParentAccount, notification: Dict):
+        title, body = render(notification)
+        line = json.dumps({"parent_id": parent.id, "title": title, "body": body[:240],
+                           "ts": time.time()})
+        await asyncio.to_thread(self._append, line)
+
+    def _append(self, line: str):
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def build_channels(names: str = "mail,push",
+                   webhook_url: Optional[str] = None) -> Dict[str, Channel]:
+    """Channels from a comma-separated list of names"""
+    channels: Dict[str, Channel] = {}
+    for name in filter(None, (n.strip() for n in names.split(","))):
+        if name == "webhook":
+            if not webhook_url:
+                logger.warning("Webhook channel requested without a URL; skipped")
+                continue
+            channels[name] = WebhookChannel(webhook_url)
+        elif name == "mail":
+            channels[name] = MailSpoolChannel()
+        elif name == "push":
+            channels[name] = PushChannel()
+        else:
+            logger.warning(f"Unknown notification channel '{name}'")
+    return channels
+
+
+class NotificationDispatcher:
+    """Sends alerts to every parent of the child they concern.
+
+    NEGATIVE alerts go to the outbox at once, one entry per parent and
+    channel; other alerts are held and sent as one digest per parent every
+    `digest_interval` seconds. The outbox is a SQLite table, so nothing
+    queued is lost on restart. A scheduler hands due entries to a pool of
+    async workers; a failed send is retried with exponential backoff and
+    jitter, and given up (status 'dead') after `max_attempts`. Each
+    channel has its own entries, so a failing webhook never holds up mail.
+    Dead entries are kept for `dead_retention` seconds for inspection.
+
+    notify() is called on the event loop, so it only queues the alert; a
+    writer thread inserts everything queued in one transaction.
+    """
+
+    def __init__(self, accounts: AccountRegistry, channels: Dict[str, Channel],
+                 db_path: Optional[str] = None, workers: int = 4,
+                 digest_interval: float = 300.0, max_attempts: int = 8,
+                 base_delay: float = 2.0, max_delay: float = 600.0,
+                 send_timeout: float = 30.0, dead_retention: float = 7 * 86400):
+        self.accounts = accounts
+        self.channels = channels
+        self.workers = workers
+        self.digest_interval = digest_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.send_timeout = send_timeout
+        self.dead_retention = dead_retention
+
+        db_path = db_path or data_path("outbox.db")
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+        self.queue: Optional[asyncio.Queue] = None
+        self.wake: Optional[asyncio.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.tasks: List[asyncio.Task] = []
+        self.stats = {"sent": 0, "failed": 0, "dead": 0, "digests": 0}
+
+        self.pending = queue.Queue()
+        self.closed = False
+        self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer_thread.start()
+
+    # Enqueueing
+
+    def notify(self, child_id: Optional[int], username: str, sentiment: str,
+               explanation: str, created_at: Optional[float] = None):
+        """Queue an alert for the child's parents; never waits on the network or disk"""
+        parents = self.accounts.alert_recipients(child_id)
+        if not parents or not self.channels or self.closed:
+            return
+        child = self.accounts.children.get(child_id)
+        notification = {
+            "kind": "alert",
+            "child_id": child_id,
+            "child_name": child.name if child else username,
+            "sentiment": sentiment.upper(),
+            "explanation": explanation,
+            "created_at": created_at or time.time(),
+        }
+        self.pending.put(("notify", (notification, [parent.id for parent in parents])))
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until every alert queued so far is in the outbox or held for a digest"""
+        if self.closed:
+            return True
+        done = threading.Event()
+        self.pending.put(("barrier", done))
+        return done.wait(timeout)
+
+    def _writer_loop(self):
+        running = True
+        while running:
+            ops = [self.pending.get()]
+            while True:
+                try:
+                    ops.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Control ops are taken out first so a failed write cannot hide them
+            barriers = [arg for op, arg in ops if op == "barrier"]
+            running = not any(op == "stop" for op, _ in ops)
+            alerts = [arg for op, arg in ops if op == "notify"]
+            urgent = False
+            try:
+                with self.lock, self.conn:
+                    self.conn.execute("BEGIN")
+                    for alert in alerts:
+                        # One savepoint per alert: a bad one is dropped, not the batch
+                        self.conn.execute("SAVEPOINT write")
+                        try:
+                            urgent = self._insert(*alert) or urgent
+                        except Exception as e:
+                            self.conn.execute("ROLLBACK TO write")
+                            logger.error(f"Queueing a notification failed: {e}")
+                        self.conn.execute("RELEASE write")
+            except Exception as e:
+                logger.error(f"Queueing {len(alerts)} notifications failed: {e}")
+            finally:
+                for barrier in barriers:
+                    barrier.set()
+            if urgent and running:
+                self._wake()
+
+    def _insert(self, notification: Dict, parent_ids: List[int]) -> bool:
+        """Store one alert; returns True when it went straight to the outbox"""
+        payload = json.dumps(notification)
+        if notification["sentiment"] == "NEGATIVE":
+            now = time.time()
+            self.conn.executemany(
+                "INSERT INTO outbox (parent_id, channel, payload, created_at, next_attempt) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(parent_id, channel, payload, now, now)
+                 for parent_id in parent_ids for channel in self.channels])
+            return True
+        self.conn.executemany(
+            "INSERT INTO digest_items (parent_id, payload) VALUES (?, ?)",
+            [(parent_id, payload) for parent_id in parent_ids])
+        return False
+
+    def build_digests(self) -> int:
+        """Turn held alerts into one outbox entry per parent and channel"""
+        with self.lock, self.conn:
+            rows = self.conn.execute(
+                "SELECT id, parent_id, payload FROM digest_items ORDER BY id").fetchall()
+            if not rows:
+                return 0
+            by_parent: Dict[int, List[Dict]] = {}
+            for _, parent_id, payload in rows:
+                by_parent.setdefault(parent_id, []).append(json.loads(payload))
+            now = time.time()
+            entries = []
+            for parent_id, alerts in by_parent.items():
+                digest = json.dumps({
+                    "kind": "digest",
+                    "total": len(alerts),
+                    "alerts": alerts[-DIGEST_MAX_ALERTS:],
+                    "period_start": alerts[0]["created_at"],
+                    "period_end": alerts[-1]["created_at"],
+                })
+                entries.extend((parent_id, channel, digest, now, now) for channel in self.channels)
+            self.conn.executemany(
+                "INSERT INTO outbox (parent_id, channel, payload, created_at, next_attempt) "
+                "VALUES (?, ?, ?, ?, ?)", entries)
+            self.conn.execute("DELETE FROM digest_items WHERE id <= ?", (rows[-1][0],))
+        self.stats["digests"] += len(by_parent)
+        self._wake()
+        return len(by_parent)
+
+    def _wake(self):
+        if self.wake is None or self.loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.wake.set()
+        else:
+            self.loop.call_soon_threadsafe(self.wake.set)
+
+    # Outbox access (run in worker threads)
+
+    def _claim_due(self, limit: int) -> Tuple[List[Tuple], Optional[float]]:
+        """Mark up to `limit` due entries as sending; also return when the next one is due"""
+        now = time.time()
+        with self.lock, self.conn:
+            rows = self.conn.execute(
+                "SELECT id, parent_id, channel, payload, attempts FROM outbox "
+                "WHERE status = 'pending' AND next_attempt <= ? ORDER BY next_attempt LIMIT ?",
+                (now, limit)).fetchall()
+            if rows:
+                self.conn.executemany("UPDATE outbox SET status = 'sending' WHERE id = ?",
+                                      [(row[0],) for row in rows])
+            next_due = self.conn.execute(
+                "SELECT MIN(next_attempt) FROM outbox WHERE status = 'pending'").fetchone()[0]
+        return rows, next_due
+
+    def _mark_sent(self, entry_id: int):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+
+    def _mark_failed(self, entry_id: int, attempts: int, error: str, permanent: bool):
+        if permanent or attempts >= self.max_attempts:
+            # A dead entry's next_attempt records when it was given up
+            status, next_attempt = "dead", time.time()
+        else:
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+            status, next_attempt = "pending", time.time() + delay * random.uniform(0.5, 1.0)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt = ?, last_error = ? "
+                "WHERE id = ?", (status, attempts, next_attempt, error[:500], entry_id))
+        return status
+
+    def purge_dead(self, now: Optional[float] = None) -> int:
+        """Delete entries given up more than `dead_retention` seconds ago"""
+        now = time.time() if now is None else now
+        with self.lock, self.conn:
+            deleted = self.conn.execute(
+                "DELETE FROM outbox WHERE status = 'dead' AND next_attempt < ?",
+                (now - self.dead_retention,)).rowcount
+        if deleted:
+            logger.info(f"Purged {deleted} dead notifications")
+        return deleted
+
+    def counts(self) -> Dict[str, int]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+            held = self.conn.execute("SELECT COUNT(*) FROM digest_items").fetchone()[0]
+        return {**dict(rows), "held_for_digest": held}
+
+    # Workers
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.workers * 4)
+        self.wake = asyncio.Event()
+        # Entries that were being sent when the server stopped go out again
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending'")
+        self.tasks = [asyncio.create_task(self._schedule()),
+                      asyncio.create_task(self._digest_loop())]
+        self.tasks += [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        logger.info(f"NotificationDispatcher started with channels {list(self.channels)}")
+
+    async def _schedule(self):
+        while True:
+            self.wake.clear()
+            try:
+                rows, next_due = await asyncio.to_thread(self._claim_due, self.queue.maxsize)
+            except Exception as e:
+                logger.error(f"Reading the outbox failed: {e}")
+                rows, next_due = [], time.time() + 5.0
+            for row in rows:
+                await self.queue.put(row)
+            if rows:
+                continue
+            timeout = 60.0 if next_due is None else max(0.0, next_due - time.time())
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _digest_loop(self):
+        while True:
+            await asyncio.sleep(self.digest_interval)
+            try:
+                await asyncio.to_thread(self.build_digests)
+                await asyncio.to_thread(self.purge_dead)
+            except Exception as e:
+                logger.error(f"Building digests failed: {e}")
+
+    async def _work(self):
+        while True:
+            entry = await self.queue.get()
+            try:
+                await self._deliver(*entry)
+            except Exception as e:
+                # The entry stays 'sending' and goes out again after a restart
+                logger.error(f"Delivering notification {entry[0]} failed: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, entry_id: int, parent_id: int, channel_name: str,
+                       payload: str, attempts: int):
+        channel = self.channels.get(channel_name)
+        parent = self.accounts.parents.get(parent_id)
+        if channel is None or parent is None:
+            await asyncio.to_thread(self._mark_failed, entry_id, attempts + 1,
+                                    f"No {'channel' if channel is None else 'parent'}", True)
+            self.stats["dead"] += 1
+            return
+        try:
+            await asyncio.wait_for(channel.send(parent, json.loads(payload)), self.send_timeout)
+        except Exception as e:
+            # Client errors will not get better with retries; rate limits will
+            permanent = (isinstance(e, httpx.HTTPStatusError)
+                         and 400 <= e.response.status_code < 500
+                         and e.response.status_code != 429)
+            status = await asyncio.to_thread(
+                self._mark_failed, entry_id, attempts + 1, repr(e), permanent)
+            self.stats["dead" if status == "dead" else "failed"] += 1
+            if status == "pending":
+                self._wake()  # The scheduler may be sleeping past the retry time
+            logger.warning(f"Notification {entry_id} via {channel_name} to parent {parent_id} "
+                           f"failed (attempt {attempts + 1}, now {status}): {e}")
+            return
+        await asyncio.to_thread(self._mark_sent, entry_id)
+        self.stats["sent"] += 1
+
+    async def stop(self, grace: float = 5.0):
+        """Let in-flight sends finish, then stop; held digest items wait for the next start"""
+        scheduling, workers = self.tasks[:2], self.tasks[2:]
+        for task in scheduling:
+            task.cancel()
+        await asyncio.gather(*scheduling, return_exceptions=True)
+        if self.queue is not None:
+            try:
+                await asyncio.wait_for(self.queue.join(), grace)
+            except asyncio.TimeoutError:
+                logger.warning("Stopping with notifications still in flight")
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self.tasks = []
+        for channel in self.channels.values():
+            await channel.close()
+        self.closed = True
+        self.pending.put(("stop", None))
+        await asyncio.to_thread(self.writer_thread.join, 5)
+        self.conn.close()
+        logger.info(f"NotificationDispatcher stopped: {self.stats}")
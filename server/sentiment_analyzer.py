@@ -1,20 +1,121 @@
-from openai import OpenAI
-import json
-from typing import List
-from dotenv import load_dotenv
+import logging
+from typing import Dict, List, Optional, Tuple
 from models import *
+from collections import OrderedDict
+import threading
+import time
 import os
 
+import _shared_path  # noqa: F401
+from shared.text_normalizer import canonical_key
+from structured_output import parse_stats, parse_verdict
+
+# Verdicts by canonical window text, so obfuscated repeats skip the LLM
+VERDICT_CACHE_SIZE = 4096
+_verdict_cache: "OrderedDict[str, SentimentResponse]" = OrderedDict()
+_verdict_lock = threading.Lock()
+
+
+logger = logging.getLogger(__name__)
+
+# Model tiers; "economy" trims long messages and caps the reply for budget-limited families.
+# A reply cut off by max_tokens is repaired by structured_output.parse_verdict.
+# Model names are read from the environment when the client is built, after .env is loaded.
+TIERS: Dict[str, Dict] = {
+    "full": {
+        "model_env": "WATCHPOINT_MODEL",
+        "max_tokens": None,
+        "max_message_chars": None,
+        "brief": False,
+    },
+    "economy": {
+        "model_env": "WATCHPOINT_ECONOMY_MODEL",
+        "max_tokens": 120,
+        "max_message_chars": 300,
+        "brief": True,
+    },
+}
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+SYSTEM_PROMPT = "You are an AI assistant that analyzes chat messages for sentiment and potential issues."
+# Sent, once, after a reply nothing could be parsed from
+REASK_PROMPT = ('Reply again with only a JSON object of the form {"sentiment": '
+                '"NEGATIVE" | "CAUTIONARY" | "POSITIVE", "alert_needed": true | false, '
+                '"explanation": "..."} and no other text.')
+
+# The OpenAI SDK takes over half a second to import, so it is loaded with the
+# first analysis (or by warm_up) and its client, with its connection pool, is reused
+_openai_client = None
+_openai_lock = threading.Lock()
+
+
+def get_openai_client():
+    global _openai_client
+    if _openai_client is None:
+        with _openai_lock:
+            if _openai_client is None:
+                from dotenv import load_dotenv
+                from openai import OpenAI
+                load_dotenv()
+                _openai_client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                )
+    return _openai_client
+
+
+def warm_up(preconnect: bool = True):
+    """Build the OpenAI client and, optionally, open a connection to the API"""
+    started = time.perf_counter()
+    try:
+        client = get_openai_client()
+        if preconnect:
+            client.with_options(timeout=5.0, max_retries=0).models.list()
+    except Exception as e:
+        # Requests still work (or fail with the real error) without warm-up
+        logger.warning(f"Analyzer warm-up incomplete: {e}")
+    logger.info(f"Analyzer warmed up in {time.perf_counter() - started:.2f}s")
+
 
 def analyze_sentiment(chats: List[Chat]) -> SentimentResponse:
+    return analyze_metered(chats)[0]
+
+
+def cached_verdict(chats: List[Chat], tier: str = "full") -> Optional[SentimentResponse]:
+    key = canonical_key(chats)
+    # A full-tier verdict is good enough for any tier, not the other way round
+    with _verdict_lock:
+        for cache_key in ([key] if tier == "full" else [key, f"{tier}|{key}"]):
+            cached = _verdict_cache.get(cache_key)
+            if cached is not None:
+                _verdict_cache.move_to_end(cache_key)
+                return cached.model_copy()
+    return None
+
+
+def analyze_metered(chats: List[Chat], tier: str = "full") -> Tuple[SentimentResponse, Dict[str, int]]:
+    """Verdict plus the tokens it cost upstream (zero for cache hits)"""
+    cached = cached_verdict(chats, tier)
+    if cached is not None:
+        return cached, {"prompt_tokens": 0, "completion_tokens": 0}
 
-    load_dotenv()
+    result, usage = _analyze_with_llm(chats, tier)
+    key = canonical_key(chats)
 
-    client = OpenAI(
-        api_key=os.getenv("OPENAI_API_KEY"),
-    )
+    with _verdict_lock:
+        _verdict_cache[key if tier == "full" else f"{tier}|{key}"] = result
+        if len(_verdict_cache) > VERDICT_CACHE_SIZE:
+            _verdict_cache.popitem(last=False)
+    return result.model_copy(), usage
 
-    chat_text = "\n".join([f"{chat.sender}: {chat.message}" for chat in chats])
+
+def _analyze_with_llm(chats: List[Chat], tier: str = "full") -> Tuple[SentimentResponse, Dict[str, int]]:
+
+    client = get_openai_client()
+
+    settings = TIERS[tier]
+    limit = settings["max_message_chars"]
+    chat_text = "\n".join([f"{chat.sender}: {chat.message[:limit] if limit else chat.message}"
+                           for chat in chats])
 
     prompt = f"""Analyze the following chat messages and classify the overall sentiment as either NEGATIVE, CAUTIONARY, or POSITIVE.
     If the sentiment is NEGATIVE or CAUTIONARY, determine if an alert should be sent to a parent.
@@ -25,15 +126,41 @@ def analyze_sentiment(chats: List[Chat]) -> SentimentResponse:
     {chat_text}
     """
 
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are an AI assistant that analyzes chat messages for sentiment and potential issues."},
-            {"role": "user", "content": prompt}
-        ]
-    )
+    if settings["brief"]:
+        prompt += "\nKeep the explanation under 30 words.\n"
+    options = {"max_tokens": settings["max_tokens"]} if settings["max_tokens"] else {}
+    # JSON mode keeps prose out of the reply; WATCHPOINT_JSON_MODE=0 for models without it
+    if os.getenv("WATCHPOINT_JSON_MODE", "1") != "0":
+        options["response_format"] = {"type": "json_object"}
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+    model = os.getenv(settings["model_env"], DEFAULT_MODEL)
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
+
+    def ask() -> str:
+        response = client.chat.completions.create(model=model, messages=messages, **options)
+        if response.usage:
+            usage["prompt_tokens"] += response.usage.prompt_tokens
+            usage["completion_tokens"] += response.usage.completion_tokens
+        return response.choices[0].message.content or ""
 
-    result = response.choices[0].message.content
-    parsed_result = json.loads(result)
+    # Replies are extracted, repaired and normalized (structured_output.py), so
+    # prose around the JSON or a lowercase label no longer fails the window
+    reply = ask()
+    fields, outcome = parse_verdict(reply)
+    parse_stats.count(outcome)
+    if fields is None:
+        # Asking once more here is cheaper than the client resending the whole window
+        parse_stats.count("retried")
+        logger.warning(f"Unparseable model reply, asking again: {reply[:200]!r}")
+        messages += [{"role": "assistant", "content": reply},
+                     {"role": "user", "content": REASK_PROMPT}]
+        options["temperature"] = 0
+        fields, _ = parse_verdict(ask())
+        if fields is None:
+            parse_stats.count("retry_failed")
+            raise ValueError("Model reply could not be parsed as a verdict")
 
-    return SentimentResponse(**parsed_result)
+    return SentimentResponse(**fields, tier=tier), usage
@@ -0,0 +1,279 @@
+# structured_output.py
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+SENTIMENTS = ("NEGATIVE", "CAUTIONARY", "POSITIVE")
+
+# Other spellings models use for the three labels
+SENTIMENT_ALIASES = {
+    "NEG": "NEGATIVE", "BAD": "NEGATIVE", "HARMFUL": "NEGATIVE", "DANGEROUS": "NEGATIVE",
+    "CAUTION": "CAUTIONARY", "CAUTIOUS": "CAUTIONARY", "WARNING": "CAUTIONARY",
+    "CONCERNING": "CAUTIONARY", "MIXED": "CAUTIONARY",
+    "POS": "POSITIVE", "SAFE": "POSITIVE", "NEUTRAL": "POSITIVE", "OK": "POSITIVE",
+}
+
+# Normalized key -> field; keys are lowercased with spaces and hyphens as underscores
+FIELD_ALIASES = {
+    "sentiment": "sentiment", "overall_sentiment": "sentiment", "classification": "sentiment",
+    "label": "sentiment",
+    "alert_needed": "alert_needed", "alertneeded": "alert_needed", "alert": "alert_needed",
+    "needs_alert": "alert_needed", "alert_required": "alert_needed",
+    "send_alert": "alert_needed", "should_alert": "alert_needed",
+    "explanation": "explanation", "reason": "explanation", "reasoning": "explanation",
+    "rationale": "explanation", "explanations": "explanation", "details": "explanation",
+}
+
+TRUE_WORDS = {"true", "yes", "y", "1", "required", "needed"}
+FALSE_WORDS = {"false", "no", "n", "0", "none", "not needed", "null"}
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*[}\]]")
+_UNQUOTED_KEY = re.compile(r"\s*([A-Za-z_][\w \-]*?)\s*:(?!//)")
+_BARE_WORD = re.compile(r"[A-Za-z_]\w*")
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+# Last resort when no JSON object can be recovered
+_FIELD_PATTERNS = {
+    "sentiment": re.compile(r"sentiment[\"']?\s*[:=\-]\s*[\"']?([A-Za-z]+)", re.IGNORECASE),
+    "alert_needed": re.compile(r"alert[_ ]?needed[\"']?\s*[:=\-]\s*[\"']?([A-Za-z]+)",
+                               re.IGNORECASE),
+    "explanation": re.compile(r"explanation[\"']?\s*[:=\-]\s*[\"']?(.+?)[\"']?\s*(?:[,}]|$)",
+                              re.IGNORECASE | re.DOTALL),
+}
+_LABEL_WORDS = re.compile(r"\b(" + "|".join(SENTIMENTS) + r")\b", re.IGNORECASE)
+
+
+class ParseStats:
+    """How model replies were turned into verdicts.
+
+    clean: valid JSON as returned; repaired: JSON after extraction or
+    repair; salvaged: fields picked out of text that is not JSON;
+    failed: nothing usable (the model is asked again once); retried and
+    retry_failed count those second attempts.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = dict.fromkeys(
+            ("clean", "repaired", "salvaged", "failed", "retried", "retry_failed"), 0)
+
+    def count(self, outcome: str):
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            counts = dict(self.counts)
+        parsed = counts["clean"] + counts["repaired"] + counts["salvaged"]
+        total = parsed + counts["failed"]
+        # First replies that could not be parsed, and requests that failed even after re-asking
+        counts["failure_rate"] = round(counts["failed"] / total, 4) if total else 0.0
+        counts["request_failure_rate"] = round(counts["retry_failed"] / total, 4) if total else 0.0
+        return counts
+
+
+parse_stats = ParseStats()
+
+
+def _scan(text: str) -> Tuple[Optional[int], List[str], bool]:
+    """End index of the first complete object (None if truncated), the
+    brackets still open and whether a string is still open"""
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return i + 1, [], False
+    return None, stack, in_string
+
+
+def _loads_object(text: str) -> Optional[Dict]:
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def _fix_syntax(text: str) -> str:
+    """Quote bare keys, turn Python literals into JSON and drop trailing
+    commas. Like _scan, it tracks strings, so their contents are never touched."""
+    out: List[str] = []
+    in_string = False
+    escaped = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "," and _TRAILING_COMMA.match(text, i):
+            i += 1
+            continue
+        elif ch in "{,":
+            key = _UNQUOTED_KEY.match(text, i + 1)
+            if key:
+                out.append(f'{ch}"{key.group(1).strip()}":')
+                i = key.end()
+                continue
+        elif ch.isalpha() or ch == "_":
+            word = _BARE_WORD.match(text, i).group()
+            out.append(_PY_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _repair(candidate: str) -> Optional[Dict]:
+    text = candidate.translate(_SMART_QUOTES)
+    if '"' not in text:
+        text = text.replace("'", '"')
+    text = _fix_syntax(text)
+    parsed = _loads_object(text)
+    if parsed is not None:
+        return parsed
+
+    # A reply cut off by max_tokens: close the open string and brackets
+    end, stack, in_string = _scan(text)
+    if end is None and stack:
+        closed = text.rstrip().rstrip(",") + ('"' if in_string else "") + "".join(reversed(stack))
+        return _loads_object(_fix_syntax(closed))
+    return None
+
+
+def extract_object(text: str) -> Tuple[Optional[Dict], str]:
+    """The JSON object in a model reply and how it was found: clean, repaired or failed"""
+    parsed = _loads_object(text.strip())
+    if parsed is not None:
+        return parsed, "clean"
+
+    fenced = _FENCE.search(text)
+    body = fenced.group(1) if fenced else text
+    start = body.find("{")
+    if start < 0:
+        return None, "failed"
+    end, _, _ = _scan(body[start:])
+    candidate = body[start:start + end] if end else body[start:]
+    parsed = _loads_object(candidate) or _repair(candidate)
+    return (parsed, "repaired") if parsed is not None else (None, "failed")
+
+
+def salvage_fields(text: str) -> Dict[str, str]:
+    """Field values picked out of prose.
+
+    The label is only taken from an explicit "sentiment: X", and only when
+    no other label is named anywhere in the text ("not POSITIVE, clearly
+    NEGATIVE"). Otherwise no sentiment is returned and the model is asked
+    again, so prose can never downgrade a NEGATIVE verdict.
+    """
+    found = {}
+    for field, pattern in _FIELD_PATTERNS.items():
+        match = pattern.search(text)
+        if match:
+            found[field] = match.group(1).strip()
+    named = {normalize_sentiment(word) for word in _LABEL_WORDS.findall(text)}
+    if "sentiment" in found:
+        named.add(normalize_sentiment(found["sentiment"]))
+    if len(named) > 1 or None in named:
+        found.pop("sentiment", None)
+    return found
+
+
+def normalize_sentiment(value: Any) -> Optional[str]:
+    label = re.sub(r"[^A-Z]", "", str(value).upper())
+    if label in SENTIMENTS:
+        return label
+    if label in SENTIMENT_ALIASES:
+        return SENTIMENT_ALIASES[label]
+    # "NEGATIVESENTIMENT", "CAUTIONARYBORDERLINE"
+    return next((sentiment for sentiment in SENTIMENTS if label.startswith(sentiment)), None)
+
+
+def normalize_bool(value: Any) -> Optional[bool]:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    word = str(value).strip().strip(".").lower()
+    if word in TRUE_WORDS:
+        return True
+    if word in FALSE_WORDS:
+        return False
+    return None
+
+
+def normalize_fields(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """SentimentResponse fields from loosely shaped model output, or None
+    when no sentiment can be read"""
+    fields: Dict[str, Any] = {}
+    for key, value in data.items():
+        name = FIELD_ALIASES.get(re.sub(r"[\s\-]+", "_", str(key).strip().lower()))
+        if name and name not in fields:
+            fields[name] = value
+    # Some models nest the verdict one level down ({"result": {...}})
+    if "sentiment" not in fields:
+        nested = next((v for v in data.values() if isinstance(v, dict)), None)
+        if nested is not None:
+            return normalize_fields(nested)
+
+    sentiment = normalize_sentiment(fields.get("sentiment", ""))
+    if sentiment is None:
+        return None
+    alert_needed = normalize_bool(fields.get("alert_needed"))
+    if alert_needed is None:
+        alert_needed = sentiment == "NEGATIVE"
+    explanation = fields.get("explanation") or ""
+    if isinstance(explanation, (list, tuple)):
+        explanation = "; ".join(str(part) for part in explanation)
+    elif not isinstance(explanation, str):
+        explanation = json.dumps(explanation)
+    return {
+        "sentiment": sentiment,
+        "alert_needed": alert_needed,
+        "explanation": explanation.strip() or "No explanation given.",
+    }
+
+
+def parse_verdict(text: Optional[str]) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Fields for a SentimentResponse and the outcome: clean, repaired,
+    salvaged or failed. Valid JSON replies take a single json.loads."""
+    if not text:
+        return None, "failed"
+    data, outcome = extract_object(text)
+    fields = normalize_fields(data) if data is not None else None
+    if fields is not None:
+        # Valid JSON that needed its values fixed still counts as repaired
+        if outcome == "clean" and any(data.get(k) != v for k, v in fields.items()):
+            outcome = "repaired"
+        return fields, outcome
+    fields = normalize_fields(salvage_fields(text))
+    if fields is not None:
+        return fields, "salvaged"
+    return None, "failed"
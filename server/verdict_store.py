@@ -0,0 +1,265 @@
+# verdict_store.py
+import base64
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+
+from data_dir import data_path
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    child_id INTEGER,
+    username TEXT NOT NULL,
+    sentiment TEXT NOT NULL,
+    alert_needed INTEGER NOT NULL,
+    explanation TEXT NOT NULL,
+    chats TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS idx_verdicts_child ON verdicts(child_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_verdicts_child_sentiment
+    ON verdicts(child_id, sentiment, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_verdicts_username ON verdicts(username, created_at);
+CREATE TABLE IF NOT EXISTS verdict_hourly (
+    child_id INTEGER NOT NULL,
+    hour INTEGER NOT NULL,
+    sentiment TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    alerts INTEGER NOT NULL,
+    PRIMARY KEY (child_id, hour, sentiment)
+) WITHOUT ROWID;
+"""
+
+_COLUMNS = "id, created_at, child_id, username, sentiment, alert_needed, explanation, chats"
+
+# bucket name -> width in seconds; aggregates are summed from the hourly rollup
+BUCKETS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+
+
+@dataclass
+class StoredVerdict:
+    created_at: float
+    username: str
+    sentiment: str
+    alert_needed: bool
+    explanation: str
+    child_id: Optional[int] = None
+    chats: List[Dict[str, str]] = field(default_factory=list)
+    id: Optional[int] = None
+
+
+def _row_to_verdict(row) -> StoredVerdict:
+    return StoredVerdict(
+        id=row[0],
+        created_at=row[1],
+        child_id=row[2],
+        username=row[3],
+        sentiment=row[4],
+        alert_needed=bool(row[5]),
+        explanation=row[6],
+        chats=json.loads(row[7]) if row[7] else []
+    )
+
+
+def encode_cursor(created_at: float, verdict_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at!r}:{verdict_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """Raises ValueError for malformed cursors"""
+    created_at, _, verdict_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition(":")
+    return float(created_at), int(verdict_id)
+
+
+class VerdictStore:
+    """Every verdict the server produces, in SQLite (WAL).
+
+    Requests never wait on disk: verdicts are queued to a writer thread
+    that commits everything pending in one transaction and keeps an
+    hourly per-child rollup current, so aggregates never scan history.
+    History is paged newest first with a (created_at, id) keyset cursor.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        db_path = db_path or data_path("verdicts.db")
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        writer = self._connect()
+        writer.executescript(SCHEMA)
+        writer.commit()
+
+        self.local = threading.local()  # One read connection per request thread
+        self.pending = queue.Queue()
+        self.closed = False
+        self.writer_thread = threading.Thread(
+            target=self._writer_loop, args=(writer,), daemon=True)
+        self.writer_thread.start()
+        logger.info(f"VerdictStore opened at {db_path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL, unlike the client's AlertStore (FULL): in WAL mode a crash of the
+        # server process loses nothing, only a power loss can drop the last commits.
+        # The AlertStore is the parent's own record of alerts; this is server-side
+        # history, and FULL would add an fsync to every batch commit.
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self.local.conn = conn
+        return conn
+
+    # Writing
+
+    def record(self, verdict: StoredVerdict):
+        """Queue a verdict for storage; never blocks"""
+        if not self.closed:
+            self.pending.put(("insert", verdict))
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything queued so far has been committed"""
+        if self.closed:
+            return True
+        done = threading.Event()
+        self.pending.put(("barrier", done))
+        return done.wait(timeout)
+
+    def _writer_loop(self, conn: sqlite3.Connection):
+        running = True
+        while running:
+            ops = [self.pending.get()]
+            while True:
+                try:
+                    ops.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Control ops are taken out first so a failed write cannot hide them
+            barriers = [arg for op, arg in ops if op == "barrier"]
+            running = not any(op == "stop" for op, _ in ops)
+            verdicts = [arg for op, arg in ops if op == "insert"]
+            try:
+                with conn:
+                    conn.execute("BEGIN")
+                    for verdict in verdicts:
+                        # One savepoint per verdict: a bad row is dropped, not the batch
+                        conn.execute("SAVEPOINT write")
+                        try:
+                            self._insert(conn, verdict)
+                        except Exception as e:
+                            conn.execute("ROLLBACK TO write")
+                            verdict.id = None
+                            logger.error(f"VerdictStore insert failed: {e}")
+                        conn.execute("RELEASE write")
+            except Exception as e:
+                logger.error(f"VerdictStore write failed for {len(verdicts)} verdicts: {e}")
+            finally:
+                for barrier in barriers:
+                    barrier.set()
+        conn.close()
+
+    def _insert(self, conn: sqlite3.Connection, verdict: StoredVerdict):
+        sentiment = verdict.sentiment.upper()
+        cursor = conn.execute(
+            f"INSERT INTO verdicts ({_COLUMNS.replace('id, ', '', 1)}) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (verdict.created_at, verdict.child_id, verdict.username, sentiment,
+             int(verdict.alert_needed), verdict.explanation, json.dumps(verdict.chats))
+        )
+        verdict.id = cursor.lastrowid
+        if verdict.child_id is not None:
+            conn.execute(
+                "INSERT INTO verdict_hourly (child_id, hour, sentiment, count, alerts) "
+                "VALUES (?, ?, ?, 1, ?) ON CONFLICT(child_id, hour, sentiment) DO UPDATE SET "
+                "count = count + 1, alerts = alerts + excluded.alerts",
+                (verdict.child_id, int(verdict.created_at // 3600), sentiment,
+                 int(verdict.alert_needed))
+            )
+
+    # Reading
+
+    def page(self, child_id: Union[int, List[int]], since: Optional[float] = None,
+             until: Optional[float] = None, sentiment: Optional[str] = None,
+             alerts_only: bool = False, cursor: Optional[str] = None,
+             limit: int = 50) -> Tuple[List[StoredVerdict], Optional[str]]:
+        """One page of verdicts for one child (or several), newest first,
+        and the cursor for the next page"""
+        child_ids = child_id if isinstance(child_id, list) else [child_id]
+        if not child_ids:
+            return [], None
+        clauses = [f"child_id IN ({', '.join('?' * len(child_ids))})"]
+        params: list = list(child_ids)
+        if sentiment:
+            clauses.append("sentiment = ?")
+            params.append(sentiment.upper())
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if alerts_only:
+            clauses.append("alert_needed = 1")
+        if cursor:
+            created_at, verdict_id = decode_cursor(cursor)
+            clauses.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            params.extend([created_at, created_at, verdict_id])
+
+        # One extra row tells whether another page exists
+        rows = self._reader().execute(
+            f"SELECT {_COLUMNS} FROM verdicts WHERE {' AND '.join(clauses)} "
+            "ORDER BY created_at DESC, id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+        verdicts = [_row_to_verdict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = verdicts[-1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+        return verdicts, next_cursor
+
+    def aggregates(self, child_id: int, bucket: str = "day",
+                   since: Optional[float] = None,
+                   until: Optional[float] = None) -> List[Dict]:
+        """Verdict and alert counts per time bucket, oldest first"""
+        width = BUCKETS[bucket]
+        until = time.time() if until is None else until
+        since = until - 30 * width if since is None else since
+        rows = self._reader().execute(
+            "SELECT (hour * 3600 / ?) * ? AS bucket, sentiment, SUM(count), SUM(alerts) "
+            "FROM verdict_hourly WHERE child_id = ? AND hour >= ? AND hour < ? "
+            "GROUP BY bucket, sentiment ORDER BY bucket",
+            (width, width, child_id, int(since // 3600), int(-(-until // 3600)))
+        ).fetchall()
+
+        buckets: Dict[int, Dict] = {}
+        for start, sentiment, count, alerts in rows:
+            entry = buckets.setdefault(start, {
+                "bucket_start": start, "NEGATIVE": 0, "CAUTIONARY": 0, "POSITIVE": 0, "alerts": 0
+            })
+            entry[sentiment] = entry.get(sentiment, 0) + count
+            entry["alerts"] += alerts
+        return list(buckets.values())
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.pending.put(("stop", None))
+        self.writer_thread.join(timeout=5)
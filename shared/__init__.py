@@ -0,0 +1,2 @@
+# __init__.py
+"""Code used by both the client and the server."""
@@ -0,0 +1,79 @@
+# lexicon.py
+"""Keyword lexicon for scoring chats without the model.
+
+The client uses it while the analysis server is unreachable and the
+server uses it for families that have used up their analysis budget.
+Categories follow the ones the server's model is asked to name.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+from .text_normalizer import canonical
+
+# category -> (sentiment, phrases); phrases are matched, as whole words, against
+# the canonical form of the text, so "k y s" and "k1ll mys3lf" match too
+LEXICON: Dict[str, Tuple[str, List[str]]] = {
+    "Self Harm": ("NEGATIVE", [
+        "kill myself", "killing myself", "hurt myself", "hurting myself", "cut myself",
+        "cutting myself", "want to die", "wanna die", "end it all", "suicide", "suicidal",
+        "self harm", "self-harm", "no reason to live",
+    ]),
+    "Sexual": ("NEGATIVE", [
+        "send nudes", "nudes", "naked pics", "sext", "sexting", "take your clothes off",
+    ]),
+    "Harassment": ("NEGATIVE", [
+        "i know where you live", "watch your back", "you're dead", "youre dead",
+        "i'll hurt you", "ill hurt you", "kill you", "threaten",
+    ]),
+    "Bullying": ("NEGATIVE", [
+        "loser", "nobody likes you", "everyone hates you", "kill yourself", "kys",
+        "you're worthless", "youre worthless", "fat pig", "ugly",
+    ]),
+    "Profanity": ("CAUTIONARY", [
+        "fuck", "fucking", "shit", "bitch", "asshole", "bastard", "damn",
+    ]),
+    "Teasing": ("CAUTIONARY", [
+        "stupid", "idiot", "dumb", "weirdo", "freak", "shut up",
+    ]),
+    "Inappropriate": ("CAUTIONARY", [
+        "don't tell your parents", "dont tell your parents", "our secret",
+        "delete this chat", "meet me alone", "how old are you",
+    ]),
+}
+
+SEVERITY = {"POSITIVE": 0, "CAUTIONARY": 1, "NEGATIVE": 2}
+
+
+def _compile(phrases: List[str]) -> Pattern:
+    alternatives = sorted({re.escape(canonical(phrase)) for phrase in phrases},
+                          key=len, reverse=True)
+    return re.compile(r"\b(?:" + "|".join(alternatives) + r")\b")
+
+
+PATTERNS: List[Tuple[str, str, Pattern]] = [
+    (category, sentiment, _compile(phrases))
+    for category, (sentiment, phrases) in LEXICON.items()
+]
+
+
+def match_categories(messages: Iterable[str]) -> List[Tuple[str, str]]:
+    """(category, sentiment) for every category any message matches"""
+    text = "\n".join(canonical(message) for message in messages)
+    return [(category, sentiment) for category, sentiment, pattern in PATTERNS
+            if pattern.search(text)]
+
+
+def matching_messages(messages: Iterable[str],
+                      categories: Optional[Iterable[str]] = None) -> List[int]:
+    """Indexes of the messages that match any of `categories` (any category when None)"""
+    wanted = None if categories is None else set(categories)
+    patterns = [pattern for category, _, pattern in PATTERNS
+                if wanted is None or category in wanted]
+    return [i for i, message in enumerate(messages)
+            if any(pattern.search(canonical(message)) for pattern in patterns)]
+
+
+def worst_sentiment(matched: List[Tuple[str, str]]) -> Optional[str]:
+    if not matched:
+        return None
+    return max((sentiment for _, sentiment in matched), key=SEVERITY.__getitem__)
@@ -0,0 +1,135 @@
+# text_normalizer.py
+"""Canonical form of chat text, shared by the client and the server.
+
+Obfuscated messages ("k y s", "k1ll mys3lf", Cyrillic look-alikes,
+"diiiie", emoji) are reduced to one canonical string so exact-match
+caches and keyword filters see through them. The canonical form is for
+keys and matching only, never for display: it is lowercase, has no
+punctuation and collapses every run of a repeated letter.
+
+Every stage is a precompiled table or regex, and results are memoized per
+message, so repeated messages cost a dictionary lookup.
+
+    python text_normalizer.py --messages 200000
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable
+
+# Characters removed outright: zero-width joiners, variation selectors, soft hyphen
+INVISIBLE = dict.fromkeys(
+    [0x00AD, 0x034F, 0x180E, 0x200B, 0x200C, 0x200D, 0x2060, 0xFE0E, 0xFE0F, 0xFEFF],
+    None
+)
+# Combining marks left behind by NFKD ("é" -> "e")
+COMBINING = dict.fromkeys(range(0x0300, 0x0370), None)
+
+# Look-alike letters from other scripts; NFKC already folds full-width forms
+CONFUSABLES = {
+    # Cyrillic
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h", "о": "o",
+    "р": "p", "с": "c", "т": "t", "у": "y", "х": "x", "ѕ": "s", "і": "i", "ї": "i",
+    "ј": "j", "ԁ": "d", "ԛ": "q", "ԝ": "w", "һ": "h", "ӏ": "l",
+    # Greek
+    "α": "a", "β": "b", "γ": "y", "ε": "e", "η": "n", "ι": "i", "κ": "k", "ν": "v",
+    "ο": "o", "ρ": "p", "σ": "o", "ς": "c", "τ": "t", "υ": "u", "χ": "x", "ω": "w",
+    # Latin variants
+    "ɡ": "g", "ı": "i", "ȷ": "j", "ł": "l", "ø": "o", "đ": "d", "ħ": "h", "ß": "ss",
+    "æ": "ae", "œ": "oe",
+}
+
+# Emoji that carry meaning for the analyzers become words
+EMOJI = {
+    "🔪": " knife ", "🗡": " knife ", "🔫": " gun ", "💣": " bomb ", "💀": " dead ",
+    "☠": " dead ", "⚰": " coffin ", "🩸": " blood ", "💊": " pills ", "🪢": " rope ",
+    "😭": " crying ", "😢": " crying ", "😡": " angry ", "🤬": " cursing ", "🖕": " fuck you ",
+    "🍆": " eggplant ", "🍑": " peach ", "💦": " splash ", "👅": " tongue ",
+    "❤": " heart ", "💔": " broken heart ", "🙂": " smile ", "😂": " laughing ",
+}
+
+# Digits and symbols used as letters; applied only inside words that contain letters
+LEET = str.maketrans({
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b", "9": "g",
+    "@": "a", "$": "s", "!": "i", "|": "l", "+": "t", "€": "e",
+})
+
+_BASE_TABLE: Dict[int, object] = {**INVISIBLE, **COMBINING}
+_BASE_TABLE.update({ord(k): v for k, v in CONFUSABLES.items()})
+_BASE_TABLE.update({ord(k): v for k, v in EMOJI.items()})
+
+_leet_word = re.compile(r"[a-z0-9@$!|+€]*[a-z][a-z0-9@$!|+€]*|[0-9@$!|+€]+[a-z][a-z0-9@$!|+€]*")
+_number_with_unit = re.compile(r"\d+[a-z]+")  # "3pm", "2nd", "10k"
+_spaced_letters = re.compile(r"\b(?:[a-z][\s.\-_*,/]+){2,}[a-z]\b")
+_separators = re.compile(r"[\s.\-_*,/]+")
+_repeats = re.compile(r"([a-z])\1+")
+_non_word = re.compile(r"[^a-z0-9 ]+")
+_whitespace = re.compile(r"\s+")
+
+
+def _unleet(match: "re.Match") -> str:
+    word = match.group(0)
+    if _number_with_unit.fullmatch(word):
+        return word
+    # "!" ends sentences far more often than it stands for "i"
+    stem = word.rstrip("!")
+    return stem.translate(LEET) + word[len(stem):]
+
+
+@lru_cache(maxsize=65536)
+def canonical(text: str) -> str:
+    """Canonical form of one message"""
+    if text.isascii():
+        text = text.lower()
+    else:
+        text = unicodedata.normalize("NFKD", text).casefold().translate(_BASE_TABLE)
+    text = _leet_word.sub(_unleet, text)
+    text = _spaced_letters.sub(lambda m: _separators.sub("", m.group(0)), text)
+    text = _repeats.sub(r"\1", text)
+    text = _non_word.sub(" ", text)
+    return _whitespace.sub(" ", text).strip()
+
+
+def canonical_key(chats: Iterable) -> str:
+    """Cache key for a window of chats (anything with .sender and .message)"""
+    return "\n".join(f"{chat.sender.lower()}:{canonical(chat.message)}" for chat in chats)
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import time
+
+    parser = argparse.ArgumentParser(description="Benchmark text normalization")
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--unique", type=int, default=5000,
+                        help="Distinct messages in the warm run")
+    args = parser.parse_args()
+
+    samples = ["k y s", "k1ll y0urs3lf", "nobody likes you loooser", "see you at 3pm",
+               "I want to d i e 💀", "ѕеnd nudеs", "lol that was sooo funny 😂",
+               "can we meet after school?", "ur such an 1d10t", "👍 ok"]
+    rng = random.Random(0)
+
+    def make(i: int) -> str:
+        return f"{samples[i % len(samples)]} {i}"
+
+    for sample in samples:
+        print(f"{sample!r:32} -> {canonical(sample)!r}")
+
+    cold = [make(i) for i in range(args.messages)]
+    canonical.cache_clear()
+    started = time.perf_counter()
+    for message in cold:
+        canonical(message)
+    elapsed = time.perf_counter() - started
+    print(f"cold: {args.messages} distinct messages, {args.messages / elapsed:,.0f} messages/s")
+
+    warm = [make(rng.randrange(args.unique)) for _ in range(args.messages)]
+    canonical.cache_clear()
+    started = time.perf_counter()
+    for message in warm:
+        canonical(message)
+    elapsed = time.perf_counter() - started
+    print(f"warm: {args.messages} messages ({args.unique} distinct), "
+          f"{args.messages / elapsed:,.0f} messages/s, {canonical.cache_info()}")
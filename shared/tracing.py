@@ -0,0 +1,224 @@
+# tracing.py
+"""Keystroke-to-alert latency tracing, shared by the client and the server.
+
+Every message sent from a chat window gets a correlation id. Each stage it
+passes through records a hop (correlation id, hop name, wall-clock time) in
+traces/<process>_trace.jsonl; the client and the server each write their
+own file. The summary lines hops up per message and shows where the time
+between sending and the dashboard alert is spent.
+
+Tracing is off unless WATCHPOINT_TRACE is set (to 1 or a directory) or the
+tracer is enabled. Run the summary from the repository root:
+
+    WATCHPOINT_TRACE=1 python messenger_chat.py
+    python -m shared.tracing client/traces server/traces
+"""
+import argparse
+import atexit
+import glob
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+# Hops in the order a message passes them
+HOPS = (
+    "send",               # ChatWindow.send_message
+    "routed",             # MessengerChat.handle_message
+    "engine.received",    # MonitoringEngine.submit
+    "window.dispatched",  # Window containing the message released for analysis
+    "client.sent",        # Batch POST started
+    "server.received",    # Server middleware
+    "llm.start",
+    "llm.end",
+    "server.responded",
+    "client.received",    # Batch response arrived
+    "alert.emitted",      # MonitoringEngine.emit
+    "alert.displayed",    # ParentMonitorWindow.add_alerts
+)
+
+TRACE_HEADER = "X-Correlation-ID"
+
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def header_trace_ids(value: Optional[str]) -> List[str]:
+    """Correlation ids from a comma-separated TRACE_HEADER value"""
+    return [trace_id for trace_id in (value or "").split(",") if trace_id]
+
+
+class Tracer:
+    """Appends hop records as JSON lines; a no-op until enabled.
+
+    mark() only queues the records. A writer thread serializes and writes
+    them, so the Tk thread and the event loop never wait on the trace file.
+    """
+
+    def __init__(self, process: str):
+        self.process = process
+        self.records = queue.SimpleQueue()
+        self.writer: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.writer is not None
+
+    def enable(self, trace_dir: str = "traces"):
+        with self.lock:
+            if self.writer is not None:
+                return
+            os.makedirs(trace_dir, exist_ok=True)
+            path = os.path.join(trace_dir, f"{self.process}_trace.jsonl")
+            self.writer = threading.Thread(
+                target=self._write_loop, args=(open(path, "a", encoding="utf-8"),),
+                name=f"{self.process}-tracer", daemon=True)
+            self.writer.start()
+        atexit.register(self.close)
+
+    def mark(self, trace_ids: Union[str, Iterable[Optional[str]], None], hop: str,
+             ts: Optional[float] = None, **attrs: Any):
+        """Record `hop` for one correlation id or several (e.g. a whole window)"""
+        if self.writer is None or not trace_ids:
+            return
+        ts = time.time() if ts is None else ts
+        if isinstance(trace_ids, str):
+            trace_ids = (trace_ids,)
+        records = []
+        for trace_id in trace_ids:
+            if trace_id:
+                record = {"trace": trace_id, "hop": hop, "ts": ts, "proc": self.process}
+                record.update(attrs)
+                records.append(record)
+        if records:
+            self.records.put(records)
+
+    def _write_loop(self, f):
+        with f:
+            while True:
+                batches = [self.records.get()]
+                # Write everything queued meanwhile with a single flush
+                while batches[-1] is not None:
+                    try:
+                        batches.append(self.records.get_nowait())
+                    except queue.Empty:
+                        break
+                lines = [json.dumps(record) for records in batches if records
+                         for record in records]
+                if lines:
+                    f.write("\n".join(lines) + "\n")
+                    f.flush()
+                if batches[-1] is None:
+                    return
+
+    def close(self):
+        """Write out queued records and stop the writer thread"""
+        with self.lock:
+            writer, self.writer = self.writer, None
+        if writer is not None:
+            self.records.put(None)
+            writer.join(timeout=5.0)
+
+
+def process_tracer(process: str) -> Tracer:
+    """Tracer for this process, enabled when WATCHPOINT_TRACE is set"""
+    tracer = Tracer(process)
+    env = os.environ.get("WATCHPOINT_TRACE")
+    if env:
+        tracer.enable("traces" if env in ("1", "true", "yes") else env)
+    return tracer
+
+
+# Summary
+
+def _percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def load_traces(paths: List[str]) -> Dict[str, Dict[str, float]]:
+    """trace id -> {hop: first time seen}, read from files or trace directories"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*_trace.jsonl"))))
+        else:
+            files.append(path)
+
+    traces: Dict[str, Dict[str, float]] = {}
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                hops = traces.setdefault(record["trace"], {})
+                # Overlapping windows repeat hops; the first occurrence counts
+                if record["hop"] not in hops or record["ts"] < hops[record["hop"]]:
+                    hops[record["hop"]] = record["ts"]
+    return traces
+
+
+def summarize(traces: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+    """Per-stage and end-to-end latency statistics in milliseconds"""
+    stages: Dict[str, List[float]] = {}
+    totals = []
+    for hops in traces.values():
+        seen = [hop for hop in HOPS if hop in hops]
+        for previous, current in zip(seen, seen[1:]):
+            stages.setdefault(f"{previous} -> {current}", []).append(
+                (hops[current] - hops[previous]) * 1000)
+        # Headless input has no "send" hop; it starts at the engine
+        if seen and "alert.displayed" in hops:
+            totals.append((hops["alert.displayed"] - hops[seen[0]]) * 1000)
+
+    def stats(values: List[float]) -> Dict[str, float]:
+        return {
+            "count": len(values),
+            "mean": round(sum(values) / len(values), 1),
+            "p50": round(_percentile(values, 50), 1),
+            "p95": round(_percentile(values, 95), 1),
+            "max": round(max(values), 1),
+        }
+
+    ordered = sorted(stages.items(), key=lambda item: HOPS.index(item[0].split(" -> ")[1]))
+    return {
+        "messages": len(traces),
+        "complete": len(totals),
+        "time_to_alert": stats(totals) if totals else None,
+        "stages": {name: stats(values) for name, values in ordered},
+    }
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    lines = [f"{summary['messages']} traced messages, {summary['complete']} reached the dashboard"]
+    total = summary["time_to_alert"]
+    if total:
+        lines.append(f"Time to alert: mean {total['mean']} ms, p50 {total['p50']} ms, "
+                     f"p95 {total['p95']} ms, max {total['max']} ms")
+    lines.append("")
+    lines.append(f"{'stage':<42}{'count':>7}{'mean':>10}{'p50':>10}{'p95':>10}  share")
+    stage_sum = sum(s["mean"] * s["count"] for s in summary["stages"].values()) or 1
+    for name, s in summary["stages"].items():
+        share = s["mean"] * s["count"] / stage_sum * 100
+        lines.append(f"{name:<42}{s['count']:>7}{s['mean']:>10}{s['p50']:>10}{s['p95']:>10}"
+                     f"  {share:4.1f}%")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize WatchPoint latency traces")
+    parser.add_argument("paths", nargs="*", default=["traces"],
+                        help="Trace files or directories (client and server)")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = summarize(load_traces(args.paths))
+    print(json.dumps(summary, indent=2) if args.json else format_summary(summary))
@@ -0,0 +1,14 @@
+# conftest.py
+import os
+import sys
+
+# The client and server are run as scripts from their own directories and
+# import their modules by bare name; the tests do the same. `shared` is a
+# package imported from the repository root.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("client", "server"):
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
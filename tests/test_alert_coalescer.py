@@ -0,0 +1,52 @@
+# test_alert_coalescer.py
+import asyncio
+
+from alert_coalescer import AlertCoalescer
+from alert_store import MonitoringAlert
+
+
+def window_alert(messages):
+    return MonitoringAlert(timestamp="14:37:09", child_name="Alice", sentiment="NEGATIVE",
+                           explanation="Bullying: name-calling.", alert_needed=True,
+                           chats=[{"sender": "bob", "message": text} for text in messages])
+
+
+def test_new_offending_message_in_an_overlapping_window_raises_a_new_alert():
+    now = [0.0]
+    sent = []
+    coalescer = AlertCoalescer(sent.append, clock=lambda: now[0])
+    chat = ["hi", "you are a loser", "lol", "ok", "whatever", "nobody likes you", "bye"]
+
+    # Windows of four messages overlapping by two
+    for start in (0, 2, 4):
+        now[0] += 1
+        coalescer.push(window_alert(chat[start:start + 4]))
+    coalescer.close()
+
+    fingerprints = {alert.fingerprint for alert in sent}
+    assert len(fingerprints) == 2
+    first, second = (next(a for a in sent if a.fingerprint == f) for f in fingerprints)
+    assert {first.repeat_count, second.repeat_count} == {1}
+    # The last window only repeats the second message, so it is merged into that group
+    assert max(alert.repeat_count for alert in sent) == 2
+    assert coalescer.stats["merged"] == 1
+
+
+def test_flush_from_push_does_not_leave_a_second_timer():
+    async def scenario():
+        now = [0.0]
+        coalescer = AlertCoalescer(lambda alert: None, window=10, update_interval=60,
+                                   clock=lambda: now[0])
+        coalescer.push(window_alert(["you are a loser"]))
+        coalescer.push(window_alert(["you are a loser"]))
+        pending = coalescer.flush_handle
+        assert pending is not None
+
+        now[0] = 11  # Past the window: the next push prunes
+        coalescer.push(window_alert(["nobody likes you"]))
+        coalescer.push(window_alert(["nobody likes you"]))
+        assert coalescer.flush_handle is pending
+        coalescer.close()
+        assert pending.cancelled()
+
+    asyncio.run(scenario())
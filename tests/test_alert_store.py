@@ -0,0 +1,98 @@
+# test_alert_store.py
+import json
+import queue
+import threading
+import time
+
+from alert_store import AlertStore, MonitoringAlert
+
+
+def make_alert(i, created_at):
+    return MonitoringAlert(timestamp="2024-11-09 14:37:09", child_name="Alice",
+                           sentiment="NEGATIVE", explanation=f"alert {i}",
+                           alert_needed=True, created_at=created_at)
+
+
+def test_paging_does_not_skip_alerts_with_the_same_timestamp(tmp_path):
+    store = AlertStore(str(tmp_path / "alerts.db"))
+    try:
+        # A burst stored within one clock tick shares created_at
+        store.append_many([make_alert(i, 100.0 if i < 7 else 50.0) for i in range(10)])
+        assert store.flush()
+
+        seen = []
+        page = store.query(limit=3)
+        while page:
+            seen.extend(alert.explanation for alert in page)
+            oldest = page[-1]
+            assert store.key_of(oldest.alert_id) == (oldest.created_at, oldest.alert_id)
+            page = store.query(before=(oldest.created_at, oldest.alert_id), limit=3)
+        assert sorted(seen) == sorted(f"alert {i}" for i in range(10))
+        assert len(seen) == 10
+    finally:
+        store.close()
+
+
+def test_a_bad_alert_does_not_drop_its_batch_or_the_ops_after_it(tmp_path):
+    store = AlertStore(str(tmp_path / "alerts.db"))
+    done = threading.Event()
+    batch = queue.Queue()
+    bad = make_alert(1, 100.0)
+    bad.chats = [{"message": object()}]  # Not JSON serializable
+    for op in [("insert", make_alert(0, 100.0)), ("insert", bad),
+               ("insert_many", [make_alert(2, 100.0)]), ("barrier", done), ("stop", None)]:
+        batch.put(op)
+
+    # The writer is waiting on the old queue; waking it makes it take the whole batch at once
+    idle, store.pending = store.pending, batch
+    idle.put(("barrier", threading.Event()))
+    store.writer_thread.join(timeout=5)
+    try:
+        assert not store.writer_thread.is_alive()
+        assert done.is_set()
+        assert sorted(alert.explanation for alert in store.query()) == ["alert 0", "alert 2"]
+        assert bad.alert_id is None
+    finally:
+        store.close()
+
+
+def test_bucket_counts_rebuild_the_same_risk_counters(tmp_path):
+    from risk_aggregates import WINDOWS, RiskAggregates
+
+    now = time.time()
+    alerts = [make_alert(i, now - i * 1800) for i in range(40)]  # Every half hour
+    store = AlertStore(str(tmp_path / "alerts.db"))
+    try:
+        store.append_many(alerts)
+        assert store.flush()
+        replayed, counted = RiskAggregates(), RiskAggregates()
+        for alert in alerts:
+            replayed.record(alert.child_name, alert.sentiment, alert.created_at)
+        for window, (width, size) in WINDOWS.items():
+            for child, sentiment, bucket, n in store.bucket_counts(width, now - width * size):
+                counted.add(child, sentiment, window, bucket * width, n)
+        for window in WINDOWS:
+            assert counted.counts("Alice", window, now) == replayed.counts("Alice", window, now)
+            assert counted.trend("Alice", window, now) == replayed.trend("Alice", window, now)
+    finally:
+        store.close()
+
+
+def test_legacy_files_are_imported_once_and_kept_until_committed(tmp_path):
+    legacy = tmp_path / "alerts_20241109.json"
+    legacy.write_text(json.dumps([make_alert(i, 100.0 + i).to_dict() for i in range(3)]))
+    store = AlertStore(str(tmp_path / "alerts.db"))
+    try:
+        # A flush that times out leaves the file in place
+        flush, store.flush = store.flush, lambda timeout=5.0: False
+        assert store.import_legacy_json(str(tmp_path)) == 0
+        assert legacy.exists()
+
+        # The retry finds the alerts committed meanwhile and only renames the file
+        store.flush = flush
+        assert store.flush()
+        assert store.import_legacy_json(str(tmp_path)) == 0
+        assert not legacy.exists()
+        assert store.count() == 3
+    finally:
+        store.close()
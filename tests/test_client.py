@@ -0,0 +1,58 @@
+# test_client.py
+import asyncio
+
+import httpx
+
+from circuit_breaker import CLOSED, HALF_OPEN, CircuitBreaker
+from client import Chat, ChatMonitorClient
+from retry_queue import OfflineRetryQueue
+
+
+def make_client(tmp_path, handler, breaker=None):
+    client = ChatMonitorClient(retry_queue=OfflineRetryQueue(str(tmp_path / "retry.db")),
+                               breaker=breaker)
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client.flush_interval = 0.01
+    return client
+
+
+def test_rejected_batch_is_not_queued_for_replay(tmp_path):
+    client = make_client(tmp_path, lambda request: httpx.Response(422, json={}))
+
+    async def run():
+        return await client.analyze_chats("alice", [Chat("Alice", "hi")])
+
+    result = asyncio.run(run())
+    assert result.provisional  # Still scored locally
+    assert len(client.retry_queue) == 0
+
+
+def test_server_error_is_queued_for_replay(tmp_path):
+    client = make_client(tmp_path, lambda request: httpx.Response(503))
+    asyncio.run(client.analyze_chats("alice", [Chat("Alice", "hi")]))
+    assert len(client.retry_queue) == 1
+
+
+def test_cancelled_probe_is_released(tmp_path):
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1.0, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 2.0
+
+    async def slow(request):
+        await asyncio.sleep(10)
+
+    client = make_client(tmp_path, slow, breaker)
+
+    async def run():
+        task = asyncio.create_task(client._post_batch([{"username": "alice", "chats": []}]))
+        await asyncio.sleep(0.05)
+        assert breaker.state == HALF_OPEN and breaker.probe_in_flight
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    assert not breaker.probe_in_flight
+    assert breaker.allow_request()  # The next request becomes the probe
+    breaker.record_success()
+    assert breaker.state == CLOSED
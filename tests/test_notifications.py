@@ -0,0 +1,65 @@
+# test_notifications.py
+import asyncio
+
+from accounts import AccountRegistry
+from notifications import Channel, NotificationDispatcher
+
+
+class RecordingChannel(Channel):
+    name = "record"
+
+    def __init__(self, failures: int = 0):
+        self.sent = []
+        self.failures = failures
+
+    async def send(self, parent, notification):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("down")
+        self.sent.append((parent.id, notification))
+
+
+def make_dispatcher(tmp_path, channel, **options):
+    accounts = AccountRegistry(str(tmp_path / "missing.json")).load()  # Demo family
+    return NotificationDispatcher(accounts, {"record": channel},
+                                  db_path=str(tmp_path / "outbox.db"), **options)
+
+
+def test_alerts_are_delivered_after_a_retry(tmp_path):
+    channel = RecordingChannel(failures=1)
+    dispatcher = make_dispatcher(tmp_path, channel, base_delay=0.01)
+
+    async def run():
+        await dispatcher.start()
+        dispatcher.notify(2, "Alice_demo", "NEGATIVE", "Bullying")
+        for _ in range(100):
+            if channel.sent:
+                break
+            await asyncio.sleep(0.02)
+        await dispatcher.stop()
+
+    asyncio.run(run())
+    assert [(parent_id, n["child_name"]) for parent_id, n in channel.sent] == [(1, "Alice")]
+    assert dispatcher.stats["failed"] == 1
+
+
+def test_notify_only_queues_and_digests_hold_non_urgent_alerts(tmp_path):
+    dispatcher = make_dispatcher(tmp_path, RecordingChannel())
+    dispatcher.notify(3, "Bob_demo", "CAUTIONARY", "Teasing")
+    dispatcher.notify(2, "Alice_demo", "NEGATIVE", "Bullying")
+    assert dispatcher.flush()
+    assert dispatcher.counts() == {"pending": 1, "held_for_digest": 1}
+    assert dispatcher.build_digests() == 1
+    assert dispatcher.counts() == {"pending": 2, "held_for_digest": 0}
+
+
+def test_dead_entries_are_purged_after_retention(tmp_path):
+    dispatcher = make_dispatcher(tmp_path, RecordingChannel(), dead_retention=60.0)
+    dispatcher.notify(2, "Alice_demo", "NEGATIVE", "Bullying")
+    assert dispatcher.flush()
+    (entry_id, *_), = dispatcher._claim_due(10)[0]
+    dispatcher._mark_failed(entry_id, 1, "refused", permanent=True)
+    assert dispatcher.purge_dead() == 0
+    assert dispatcher.purge_dead(now=dispatcher.conn.execute(
+        "SELECT next_attempt FROM outbox").fetchone()[0] + 61.0) == 1
+    assert dispatcher.counts() == {"held_for_digest": 0}
@@ -0,0 +1,26 @@
+# test_rescore.py
+import json
+
+from rescore import iter_log_items, plan_shards
+
+
+def test_log_shards_cover_every_message_once_and_ignore_worker_count(tmp_path):
+    log = tmp_path / "chats.jsonl"
+    with open(log, "w") as f:
+        for i in range(200):
+            conversation = f"c{i % 3}"
+            f.write(json.dumps({"sender": conversation, "conversation": conversation,
+                                "message": f"message {i}"}) + "\n")
+
+    shards = plan_shards([str(log)], shard_size=1000, log_shard_bytes=1000)
+    assert len(shards) > 5
+    assert [shard.shard_id for shard in shards] == [
+        shard.shard_id for shard in plan_shards([str(log)], 1000, 1000)]
+
+    items = [item for shard in shards for item in iter_log_items(shard, window_size=3)]
+    assert len({item.key for item in items}) == len(items)
+    # No window is scored by two shards: each closes on a different message
+    closing = [item.chats[-1]["message"] for item in items]
+    seen = {chat["message"] for item in items for chat in item.chats}
+    assert seen == {f"message {i}" for i in range(200)}
+    assert len(closing) == len(set(closing))
@@ -0,0 +1,117 @@
+# test_server_auth.py
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+ACCOUNTS = {
+    "parents": [
+        {"id": 1, "name": "Parent", "email": "parent@example.com", "children": [2],
+         "token": "parent-one"},
+        {"id": 4, "name": "Other", "email": "other@example.com", "children": [5],
+         "token": "parent-four"},
+    ],
+    "children": [
+        {"id": 2, "name": "Alice", "email": "alice@example.com", "parent_id": 1},
+        {"id": 5, "name": "Carol", "email": "carol@example.com", "parent_id": 4},
+    ],
+}
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    accounts_path = tmp_path / "accounts.json"
+    accounts_path.write_text(json.dumps(ACCOUNTS))
+    monkeypatch.setenv("WATCHPOINT_DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("WATCHPOINT_ACCOUNTS", str(accounts_path))
+    monkeypatch.setenv("WATCHPOINT_VERDICT_DB", str(tmp_path / "verdicts.db"))
+    monkeypatch.setenv("WATCHPOINT_OUTBOX_DB", str(tmp_path / "outbox.db"))
+    monkeypatch.setenv("WATCHPOINT_USAGE_DB", str(tmp_path / "usage.db"))
+    monkeypatch.setenv("WATCHPOINT_NOTIFY_CHANNELS", "")
+    monkeypatch.setenv("WATCHPOINT_PRECONNECT", "0")
+    monkeypatch.setenv("WATCHPOINT_ADMIN_TOKEN", "admin")
+    from main import app
+    with TestClient(app) as client:
+        yield client
+
+
+def get(api, path, token=None):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    return api.get(path, headers=headers).status_code
+
+
+def test_history_needs_a_token(api):
+    assert get(api, "/children/2/alerts") == 401
+    assert get(api, "/parents/1/alerts") == 401
+    assert get(api, "/usage") == 401
+
+
+def test_parents_only_see_their_own_children(api):
+    assert get(api, "/children/2/alerts", "parent-one") == 200
+    assert get(api, "/children/2/aggregates", "parent-one") == 200
+    assert get(api, "/parents/1/alerts", "parent-one") == 200
+    assert get(api, "/parents/1/usage", "parent-one") == 200
+    assert get(api, "/children/5/alerts", "parent-one") == 403
+    assert get(api, "/parents/4/alerts", "parent-one") == 403
+    assert get(api, "/children/2/alerts", "wrong") == 403
+
+
+def test_cross_family_reports_need_the_admin_token(api):
+    assert get(api, "/usage", "parent-one") == 403
+    assert get(api, "/notifications/stats", "parent-one") == 403
+    assert get(api, "/usage", "admin") == 200
+    assert get(api, "/children/5/alerts", "admin") == 200
+
+
+def post(api, path, body, token=None):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    return api.post(path, json=body, headers=headers).status_code
+
+
+def test_analysis_needs_a_token_for_the_callers_own_children(api):
+    item = {"username": "Carol_demo", "child_id": 5,
+            "chats": [{"sender": "Carol", "message": "hi"}]}
+    assert post(api, "/analyze_chats", item) == 401
+    assert post(api, "/analyze_chats/batch", [item]) == 401
+    assert post(api, "/analyze_chats", item, "wrong") == 403
+    assert post(api, "/analyze_chats", item, "parent-one") == 403
+    assert post(api, "/analyze_chats/batch", [item], "parent-one") == 403
+
+
+def test_usernames_only_resolve_within_the_callers_family(tmp_path):
+    from accounts import AccountRegistry
+
+    path = tmp_path / "accounts.json"
+    path.write_text(json.dumps(ACCOUNTS))
+    accounts = AccountRegistry(str(path)).load()
+    assert accounts.resolve_child("Carol_demo") == 5
+    assert accounts.resolve_child("Carol_demo", parent_id=4) == 5
+    assert accounts.resolve_child("Carol_demo", parent_id=1) is None
+    assert accounts.resolve_child("Alice_demo", 5, parent_id=1) == 2
+
+
+def test_unresolved_requests_are_not_charged_to_their_username(tmp_path):
+    from accounts import ANONYMOUS_TENANT, AccountRegistry
+
+    path = tmp_path / "accounts.json"
+    path.write_text(json.dumps(ACCOUNTS))
+    accounts = AccountRegistry(str(path)).load()
+    assert accounts.tenant_of(None) == ANONYMOUS_TENANT
+    assert accounts.tenant_of(None, 1) == accounts.tenant_of(2) == "family:1"
+
+
+def test_provisional_verdicts_do_not_notify_parents(api, monkeypatch):
+    import main
+
+    sent = []
+    monkeypatch.setattr(main.app.state.notifier, "notify", lambda *args: sent.append(args))
+    request = main.ChatAnalysisRequest(
+        username="Alice_demo", child_id=2,
+        chats=[main.Chat(sender="Bob", message="you are a loser")])
+    lexicon = main.local_verdict(request.chats)
+    assert lexicon.alert_needed and lexicon.provisional
+    main.record_verdict(request, lexicon)
+    assert not sent
+    main.record_verdict(request, main.SentimentResponse(
+        sentiment="NEGATIVE", alert_needed=True, explanation="Bullying."))
+    assert len(sent) == 1
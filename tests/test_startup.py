@@ -0,0 +1,24 @@
+# test_startup.py
+import pytest
+
+from tools.startup_time import ENTRY_POINTS, measure
+
+
+def test_lazy_module_lists():
+    assert ENTRY_POINTS["server"] == ("server", "main", ["openai", "dotenv"])
+    assert ENTRY_POINTS["client"] == ("client", "messenger_chat", ["httpx"])
+
+
+@pytest.mark.parametrize("name", sorted(ENTRY_POINTS))
+def test_entry_point_does_not_import_lazy_modules(name):
+    directory, module, lazy = ENTRY_POINTS[name]
+    for dependency in lazy:
+        # A module that is not installed cannot be imported eagerly either
+        pytest.importorskip(dependency)
+    if name == "client":
+        pytest.importorskip("tkinter")
+        pytest.importorskip("nest_asyncio")
+    else:
+        pytest.importorskip("fastapi")
+    result = measure(directory, module, lazy, runs=1)
+    assert result["eager"] == []
@@ -0,0 +1,74 @@
+# test_structured_output.py
+from structured_output import extract_object, parse_verdict, salvage_fields
+
+
+def test_clean_json():
+    fields, outcome = parse_verdict(
+        '{"sentiment": "NEGATIVE", "alert_needed": true, "explanation": "Threat."}')
+    assert outcome == "clean"
+    assert fields == {"sentiment": "NEGATIVE", "alert_needed": True, "explanation": "Threat."}
+
+
+def test_fenced_and_surrounded_json():
+    reply = ('Here is my answer:\n```json\n{"sentiment": "POSITIVE", "alert_needed": false, '
+             '"explanation": "Friendly."}\n```\nHope that helps.')
+    fields, outcome = parse_verdict(reply)
+    assert outcome == "repaired"
+    assert fields["sentiment"] == "POSITIVE"
+    assert fields["alert_needed"] is False
+
+
+def test_single_quotes_and_python_literals():
+    fields, outcome = parse_verdict(
+        "{'sentiment': 'CAUTIONARY', 'alert_needed': False, 'explanation': 'Odd ask.'}")
+    assert outcome == "repaired"
+    assert fields["sentiment"] == "CAUTIONARY"
+    assert fields["alert_needed"] is False
+
+
+def test_unquoted_keys_and_trailing_comma():
+    fields, outcome = parse_verdict(
+        '{sentiment: "NEGATIVE", alert needed: True, explanation: "Insult.",}')
+    assert outcome == "repaired"
+    assert fields == {"sentiment": "NEGATIVE", "alert_needed": True, "explanation": "Insult."}
+
+
+def test_string_contents_are_not_rewritten():
+    data, outcome = extract_object(
+        '{"explanation": "Tone, note: rude, True story ,}", sentiment: "x",}')
+    assert outcome == "repaired"
+    assert data == {"explanation": "Tone, note: rude, True story ,}", "sentiment": "x"}
+
+
+def test_truncated_reply_keeps_the_whole_explanation():
+    fields, outcome = parse_verdict(
+        '{"sentiment": "negative", "alert_needed": "yes", "explanation": "Tone, note: rude"')
+    assert outcome == "repaired"
+    assert fields["explanation"] == "Tone, note: rude"
+
+
+def test_truncated_inside_a_string():
+    fields, outcome = parse_verdict('{"sentiment": "NEGATIVE", "alert_needed": true, '
+                                    '"explanation": "Asks for their addr')
+    assert outcome == "repaired"
+    assert fields["explanation"] == "Asks for their addr"
+
+
+def test_explicit_label_in_prose_is_salvaged():
+    fields, outcome = parse_verdict("sentiment: negative\nalert needed: yes\n"
+                                    "explanation: repeated name-calling")
+    assert outcome == "salvaged"
+    assert fields["sentiment"] == "NEGATIVE"
+    assert fields["alert_needed"] is True
+
+
+def test_bare_labels_in_prose_are_not_trusted():
+    assert parse_verdict("This is not POSITIVE. It is clearly NEGATIVE bullying.") == (
+        None, "failed")
+    assert parse_verdict("Overall this reads as POSITIVE.") == (None, "failed")
+
+
+def test_conflicting_labels_never_downgrade_negative():
+    assert "sentiment" not in salvage_fields("sentiment: POSITIVE, though parts are NEGATIVE")
+    assert "sentiment" not in salvage_fields("sentiment: safe. Earlier messages were negative.")
+    assert parse_verdict("sentiment: POSITIVE, though parts are NEGATIVE") == (None, "failed")
@@ -0,0 +1,22 @@
+# test_tracing.py
+import json
+
+from shared.tracing import Tracer, load_traces, summarize
+
+
+def test_marks_are_written_by_the_writer_thread(tmp_path):
+    tracer = Tracer("client")
+    tracer.mark("abc", "send")  # Disabled: dropped
+    tracer.enable(str(tmp_path))
+    tracer.mark("abc", "send", ts=1.0)
+    tracer.mark(["abc", None, "def"], "alert.displayed", ts=1.25)
+    tracer.close()
+
+    lines = (tmp_path / "client_trace.jsonl").read_text().splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [(r["trace"], r["hop"]) for r in records] == [
+        ("abc", "send"), ("abc", "alert.displayed"), ("def", "alert.displayed")]
+
+    summary = summarize(load_traces([str(tmp_path)]))
+    assert summary["messages"] == 2
+    assert summary["stages"]["send -> alert.displayed"]["mean"] == 250.0
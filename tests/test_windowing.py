@@ -0,0 +1,87 @@
+# test_windowing.py
+from client import Chat
+from windowing import AnalysisScheduler, WindowingEngine
+
+
+def send(engine, conversation_id, count, start=1):
+    return [engine.add_message(conversation_id, Chat("kid", f"m{i}"))
+            for i in range(start, start + count)]
+
+
+def finish(engine, conversation_id, window):
+    """Complete `window` and every window released after it"""
+    windows = []
+    while window:
+        windows.append(window)
+        window = engine.complete(conversation_id)
+    return windows
+
+
+def test_first_window_after_window_size_messages():
+    engine = WindowingEngine(window_size=3)
+    windows = send(engine, "c", 3)
+    assert windows[:2] == [None, None]
+    assert [chat.message for chat in windows[2].chats] == ["m1", "m2", "m3"]
+
+
+def test_backlog_during_call_is_sent_in_full():
+    engine = WindowingEngine(window_size=3)
+    window = send(engine, "c", 3)[-1]
+    # Far more than max_window messages arrive while the first call is in flight
+    assert not any(send(engine, "c", 16, start=4))
+
+    seen = []
+    while window:
+        assert len(window.chats) <= engine.max_window
+        assert window.start_index == int(window.chats[0].message[1:])
+        assert window.end_index == int(window.chats[-1].message[1:])
+        seen.extend(chat.message for chat in window.chats)
+        window = engine.complete("c")
+    assert [f"m{i}" for i in range(1, 20)] == sorted(set(seen), key=lambda m: int(m[1:]))
+    assert engine.pending_count("c") == 0
+
+
+def test_analyzed_upto_never_passes_the_last_sent_message():
+    engine = WindowingEngine(window_size=2, max_window=4)
+    send(engine, "c", 2)
+    send(engine, "c", 10, start=3)
+    window = engine.complete("c")
+    assert (window.start_index, window.end_index) == (3, 6)
+    assert engine.pending_count("c") == 6
+
+
+def test_overlap_is_shared_between_windows():
+    scheduler = AnalysisScheduler(window_size=3, overlap=1)
+    ranges = []
+    for i in range(1, 10):
+        window = scheduler.add_message("c", Chat("kid", f"m{i}"))
+        ranges.extend((w.start_index, w.end_index) for w in finish(scheduler, "c", window))
+    assert ranges == [(1, 3), (3, 5), (5, 7), (7, 9)]
+
+
+def test_idle_flush_releases_partial_window():
+    scheduler = AnalysisScheduler(window_size=3, idle_timeout=5.0)
+    window = send(scheduler, "c", 3)[-1]
+    scheduler.complete("c")
+    send(scheduler, "c", 1, start=4)
+    assert scheduler.flush_idle(now=0.0) == []
+    (window,) = scheduler.flush_idle(now=float("inf"))
+    assert [chat.message for chat in window.chats] == ["m2", "m3", "m4"]
+    assert (window.start_index, window.end_index) == (2, 4)
+
+
+def test_buffer_keeps_only_needed_context():
+    engine = WindowingEngine(window_size=3)
+    for i in range(1, 31):
+        finish(engine, "c", engine.add_message("c", Chat("kid", f"m{i}")))
+    assert len(engine.conversations["c"].buffer) <= engine.context
+
+
+def test_quiet_conversations_are_evicted_once_analyzed():
+    scheduler = AnalysisScheduler(window_size=3, evict_after=60.0)
+    finish(scheduler, "done", send(scheduler, "done", 3)[-1])
+    send(scheduler, "pending", 2)
+    quiet = scheduler.conversations["done"].last_message_at + 61.0
+    assert scheduler.evict_idle(now=quiet - 30.0) == 0
+    assert scheduler.evict_idle(now=quiet) == 1
+    assert list(scheduler.conversations) == ["pending"]
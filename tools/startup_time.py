@@ -0,0 +1,77 @@
+# startup_time.py
+"""Cold-start import time of the server and client.
+
+Each entry point is imported in a fresh interpreter several times and the
+median is reported. The run fails if an entry point is slower than its
+budget or pulls in a module that should load lazily (the OpenAI SDK,
+dotenv, httpx), so a stray top-level import shows up at once.
+
+    python tools/startup_time.py
+    python tools/startup_time.py --runs 9 --server-ms 1200 --client-ms 150
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# name -> (directory, module, modules that must not be imported yet).
+# email_validator is not listed: models.py uses pydantic's EmailStr, which imports it.
+ENTRY_POINTS = {
+    "server": ("server", "main", ["openai", "dotenv"]),
+    "client": ("client", "messenger_chat", ["httpx"]),
+}
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"ms": elapsed * 1000, "eager": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(directory: str, module: str, lazy: List[str], runs: int) -> Dict:
+    timings = []
+    eager = set()
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, lazy=lazy)],
+            cwd=os.path.join(ROOT, directory), capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        result = json.loads(output)
+        timings.append(result["ms"])
+        eager.update(result["eager"])
+    return {
+        "median_ms": round(statistics.median(timings), 1),
+        "min_ms": round(min(timings), 1),
+        "eager": sorted(eager),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure WatchPoint cold-start import time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--server-ms", type=float, default=None,
+                        help="Fail if the server import median exceeds this")
+    parser.add_argument("--client-ms", type=float, default=None,
+                        help="Fail if the client import median exceeds this")
+    args = parser.parse_args()
+
+    budgets = {"server": args.server_ms, "client": args.client_ms}
+    failed = False
+    for name, (directory, module, lazy) in ENTRY_POINTS.items():
+        result = measure(directory, module, lazy, args.runs)
+        status = "ok"
+        if result["eager"]:
+            status = f"FAIL: imported eagerly: {', '.join(result['eager'])}"
+        elif budgets[name] is not None and result["median_ms"] > budgets[name]:
+            status = f"FAIL: over {budgets[name]:.0f} ms"
+        failed |= status != "ok"
+        print(f"{name:<8}{module:<16}median {result['median_ms']:>7} ms  "
+              f"min {result['min_ms']:>7} ms  {status}")
+    sys.exit(1 if failed else 0)